@@ -5,3 +5,5 @@ class PagWebConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Aplicaciones.pag_web'
     verbose_name = 'Página Web Pública'
+    def ready(self):
+        import Aplicaciones.pag_web.signals
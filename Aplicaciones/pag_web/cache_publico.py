@@ -0,0 +1,103 @@
+"""
+Caché de la página web pública (pag_web).
+
+Las páginas públicas cambian pocas veces al mes, así que las respuestas a
+visitantes anónimos se guardan completas por URL. Todas las claves incluyen una
+"generación" que cambian las señales de Lote, Servicio, Testimonio y
+ConfiguracionSistema (ver signals.py): al publicar un cambio las entradas viejas
+quedan huérfanas y expiran solas, sin tener que borrarlas.
+
+- Páginas sin formularios: se guarda la respuesta completa (cache_publico).
+- Páginas con {% csrf_token %} (index): el token es propio de cada visitante, así
+  que solo se cachean los fragmentos pesados con {% cache %} y la generación.
+"""
+import hashlib
+import uuid
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIJO = 'web'
+CLAVE_GENERACION = f'{PREFIJO}:gen'
+TIMEOUT_PAGINA = 60 * 60 * 24
+
+
+# ==========================================
+# GENERACIÓN E INVALIDACIÓN
+# ==========================================
+def generacion_web():
+    """Generación vigente del contenido público (se crea si no existe)."""
+    generacion = cache.get(CLAVE_GENERACION)
+    if generacion is None:
+        generacion = uuid.uuid4().hex
+        if not cache.add(CLAVE_GENERACION, generacion, timeout=None):
+            generacion = cache.get(CLAVE_GENERACION, generacion)
+    return generacion
+
+
+def _nueva_generacion():
+    cache.set(CLAVE_GENERACION, uuid.uuid4().hex, timeout=None)
+
+
+def invalidar_web():
+    """Descarta las páginas públicas cacheadas al confirmar la transacción."""
+    transaction.on_commit(_nueva_generacion)
+
+
+# ==========================================
+# DATOS COMPARTIDOS
+# ==========================================
+def configuracion_publica():
+    """ConfiguracionSistema para las páginas públicas, sin consultar la BD en cada visita."""
+    from Aplicaciones.sbr_app.models import ConfiguracionSistema
+
+    clave = f'{PREFIJO}:config:{generacion_web()}'
+    config = cache.get(clave)
+    if config is None:
+        # Se guarda una tupla para distinguir "sin configuración" de "no cacheado"
+        config = (ConfiguracionSistema.objects.first(),)
+        cache.set(clave, config, timeout=TIMEOUT_PAGINA)
+    return config[0]
+
+
+# ==========================================
+# CACHÉ DE PÁGINA COMPLETA
+# ==========================================
+def _clave_pagina(request):
+    url = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'{PREFIJO}:pagina:{generacion_web()}:{url}'
+
+
+def _se_puede_cachear(request, response):
+    # Nada personal: sin token CSRF en el HTML, sin cookies nuevas y solo respuestas 200
+    return (
+        response.status_code == 200
+        and not getattr(response, 'streaming', False)
+        and not request.META.get('CSRF_COOKIE_USED')
+        and not response.cookies
+    )
+
+
+def cache_publico(vista):
+    """
+    Sirve la vista desde la caché para visitantes anónimos (GET/HEAD).
+    Los usuarios autenticados siempre ven la página recién generada.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            return vista(request, *args, **kwargs)
+
+        clave = _clave_pagina(request)
+        response = cache.get(clave)
+        if response is not None:
+            return response
+
+        response = vista(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        if _se_puede_cachear(request, response):
+            cache.set(clave, response, timeout=TIMEOUT_PAGINA)
+        return response
+    return envoltura
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pag_web', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoteEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lote_id', models.PositiveBigIntegerField(verbose_name='Lote')),
+                ('eliminado_en', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Fecha de Eliminación')),
+            ],
+            options={
+                'verbose_name': 'Lote Eliminado',
+                'verbose_name_plural': 'Lotes Eliminados',
+            },
+        ),
+    ]
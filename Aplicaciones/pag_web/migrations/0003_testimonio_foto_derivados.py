@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:17
+
+import os
+
+from django.db import migrations, models
+
+
+def marcar_derivados_existentes(apps, schema_editor):
+    """
+    Marca las imágenes cuyos derivados ya se generaron (se comprueba una sola vez el
+    derivado 'full' en JPEG; desde aquí las URLs ya no consultan el storage).
+    """
+    for modelo, campos in (('Testimonio', ('foto',)),):
+        Modelo = apps.get_model('pag_web', modelo)
+        for campo in campos:
+            storage = Modelo._meta.get_field(campo).storage
+            con_derivados = []
+            for pk, nombre in Modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True}).values_list('pk', campo):
+                base, _ = os.path.splitext(nombre)
+                if storage.exists(f'{base}_full.jpg'):
+                    con_derivados.append(pk)
+            Modelo.objects.filter(pk__in=con_derivados).update(**{f'{campo}_derivados': True})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pag_web', '0002_lote_eliminado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testimonio',
+            name='foto_derivados',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(marcar_derivados_existentes, migrations.RunPython.noop),
+    ]
@@ -43,6 +43,8 @@ class Testimonio(models.Model):
         null=True, 
         verbose_name='Foto del Cliente'
     )
+    # Versiones reducidas generadas (ver sbr_app/imagenes.py)
+    foto_derivados = models.BooleanField(default=False, editable=False)
     calificacion = models.PositiveIntegerField(
         default=5, 
         choices=[(i, f'{i} estrellas') for i in range(1, 6)],
@@ -78,3 +80,19 @@ class ContactoMensaje(models.Model):
     
     def __str__(self):
         return f'{self.nombre} - {self.fecha_envio.strftime("%d/%m/%Y")}'
+
+
+class LoteEliminado(models.Model):
+    """
+    Lote borrado del inventario. El feed con ?since= lo informa en 'eliminados' para
+    que los clientes lo quiten: un lote borrado ya no aparece entre los modificados.
+    """
+    lote_id = models.PositiveBigIntegerField(verbose_name='Lote')
+    eliminado_en = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Fecha de Eliminación')
+
+    class Meta:
+        verbose_name = 'Lote Eliminado'
+        verbose_name_plural = 'Lotes Eliminados'
+
+    def __str__(self):
+        return f'Lote #{self.lote_id} ({self.eliminado_en:%d/%m/%Y})'
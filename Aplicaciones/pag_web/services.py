@@ -0,0 +1,228 @@
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import Q, Min, Max, Count
+from django.urls import reverse
+
+from Aplicaciones.sbr_app.models import Lote
+from Aplicaciones.sbr_app.imagenes import TAMANOS, url_derivado
+from .cache_publico import PREFIJO, TIMEOUT_PAGINA, generacion_web
+from .models import LoteEliminado
+
+LOTES_POR_PAGINA = 12
+
+# Orden del catálogo -> campos del cursor (cada uno respaldado por un índice con estado).
+# numero_lote_orden ordena los lotes como números ('2' antes que '10'); numero_lote
+# desempata los que comparten número ('3A', '3B')
+ORDENES_CATALOGO = {
+    'ubicacion': ('manzana', 'numero_lote_orden', 'numero_lote', 'id'),
+    'precio': ('precio_contado', 'id'),
+}
+# Campos del cursor que se leen como enteros
+CAMPOS_ENTEROS_CURSOR = {'id', 'numero_lote_orden'}
+
+
+# ==========================================
+# CATÁLOGO PÚBLICO DE LOTES
+# ==========================================
+def _decimal(valor):
+    try:
+        numero = Decimal(str(valor).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    return numero if numero.is_finite() and numero >= 0 else None
+
+
+def filtros_catalogo(params):
+    """Lee los filtros del catálogo desde request.GET (valores inválidos se ignoran)."""
+    orden = params.get('orden', '')
+    return {
+        'manzana': params.get('manzana', '').strip(),
+        'ubicacion': params.get('ubicacion', '').strip(),
+        'precio_min': _decimal(params.get('precio_min', '')),
+        'precio_max': _decimal(params.get('precio_max', '')),
+        'orden': orden if orden in ORDENES_CATALOGO else 'ubicacion',
+    }
+
+
+def _lotes_filtrados(filtros):
+    lotes = Lote.objects.filter(estado='DISPONIBLE')
+    if filtros['manzana']:
+        lotes = lotes.filter(manzana=filtros['manzana'])
+    if filtros['ubicacion']:
+        lotes = lotes.filter(Q(canton=filtros['ubicacion']) | Q(ciudad=filtros['ubicacion']))
+    if filtros['precio_min'] is not None:
+        lotes = lotes.filter(precio_contado__gte=filtros['precio_min'])
+    if filtros['precio_max'] is not None:
+        lotes = lotes.filter(precio_contado__lte=filtros['precio_max'])
+    return lotes
+
+
+def _codificar_cursor(valores):
+    texto = json.dumps([str(v) for v in valores])
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def _leer_cursor(cursor, campos):
+    """Cursor opaco -> tupla de valores del último lote mostrado, o None si no es válido."""
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        valores = json.loads(texto)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(valores, list) or len(valores) != len(campos):
+        return None
+    try:
+        return tuple(
+            int(v) if campo in CAMPOS_ENTEROS_CURSOR else Decimal(v) if campo == 'precio_contado' else str(v)
+            for campo, v in zip(campos, valores)
+        )
+    except (ValueError, TypeError, InvalidOperation):
+        return None
+
+
+def _despues_de(campos, valores):
+    """Lotes estrictamente posteriores a `valores` en el orden ascendente de `campos`."""
+    condicion = None
+    iguales = Q()
+    for campo, valor in zip(campos, valores):
+        mayor = iguales & Q(**{f'{campo}__gt': valor})
+        condicion = mayor if condicion is None else condicion | mayor
+        iguales &= Q(**{campo: valor})
+    return condicion
+
+
+def pagina_catalogo(filtros, cursor=None, por_pagina=LOTES_POR_PAGINA):
+    """
+    Una página del catálogo de lotes disponibles con paginación por cursor (keyset):
+    no usa OFFSET, así las páginas siguientes cuestan lo mismo que la primera.
+    Devuelve (lotes, cursor_siguiente).
+    """
+    campos = ORDENES_CATALOGO[filtros['orden']]
+    lotes = _lotes_filtrados(filtros).order_by(*campos)
+
+    valores = _leer_cursor(cursor, campos) if cursor else None
+    if valores:
+        lotes = lotes.filter(_despues_de(campos, valores))
+
+    pagina = list(lotes[:por_pagina + 1])
+    siguiente = None
+    if len(pagina) > por_pagina:
+        pagina = pagina[:por_pagina]
+        ultimo = pagina[-1]
+        siguiente = _codificar_cursor([getattr(ultimo, campo) for campo in campos])
+    return pagina, siguiente
+
+
+def opciones_catalogo():
+    """Valores para los selectores de filtro (manzanas, ubicaciones y rango de precios)."""
+    disponibles = Lote.objects.filter(estado='DISPONIBLE')
+    manzanas = disponibles.order_by('manzana').values_list('manzana', flat=True).distinct()
+    ubicaciones = set()
+    for canton, ciudad in disponibles.values_list('canton', 'ciudad').distinct():
+        ubicaciones.update(v for v in (canton, ciudad) if v)
+    return {
+        'manzanas': list(manzanas),
+        'ubicaciones': sorted(ubicaciones),
+        'precios': disponibles.aggregate(minimo=Min('precio_contado'), maximo=Max('precio_contado')),
+    }
+
+
+# ==========================================
+# FEED JSON DE DISPONIBILIDAD
+# ==========================================
+CAMPOS_FEED = (
+    'id', 'manzana', 'numero_lote', 'dimensiones', 'precio_contado', 'estado',
+    'ciudad', 'parroquia', 'canton', 'provincia', 'foto_lista', 'plano', 'actualizado_en',
+    'foto_lista_derivados', 'plano_derivados',
+)
+
+
+def estado_feed_lotes():
+    """
+    {'ultima': último cambio (lote modificado o eliminado), 'total': cantidad de lotes}
+    para ETag/Last-Modified.
+    Se cachea por generación pública: solo se consulta la BD tras un cambio visible.
+    """
+    clave = f'{PREFIJO}:feed:estado:{generacion_web()}'
+    estado = cache.get(clave)
+    if estado is None:
+        estado = Lote.objects.aggregate(ultima=Max('actualizado_en'), total=Count('id'))
+        ultima_baja = LoteEliminado.objects.aggregate(ultima=Max('eliminado_en'))['ultima']
+        if ultima_baja and (estado['ultima'] is None or ultima_baja > estado['ultima']):
+            estado['ultima'] = ultima_baja
+        cache.set(clave, estado, timeout=TIMEOUT_PAGINA)
+    return estado
+
+
+def _imagenes_feed(archivo):
+    if not archivo:
+        return None
+    return {
+        tamano: {'jpg': url_derivado(archivo, tamano, 'jpg'), 'webp': url_derivado(archivo, tamano, 'webp')}
+        for tamano in TAMANOS
+    }
+
+
+def _lote_feed(lote):
+    return {
+        'id': lote.id,
+        'manzana': lote.manzana,
+        'numero_lote': lote.numero_lote,
+        'dimensiones': lote.dimensiones,
+        'precio_contado': f"{lote.precio_contado:.2f}",
+        'estado': lote.estado,
+        'disponible': lote.estado == 'DISPONIBLE',
+        'ubicacion': {
+            'ciudad': lote.ciudad, 'parroquia': lote.parroquia,
+            'canton': lote.canton, 'provincia': lote.provincia,
+        },
+        'url': reverse('pag_web:lote_detalle', args=[lote.id]) if lote.estado == 'DISPONIBLE' else None,
+        'foto': _imagenes_feed(lote.foto_lista),
+        'plano': _imagenes_feed(lote.plano),
+        'actualizado_en': lote.actualizado_en.isoformat(),
+    }
+
+
+def feed_lotes(desde=None):
+    """
+    Datos del feed público (URLs relativas).
+    - Sin `desde`: todos los lotes disponibles, cacheados por generación.
+    - Con `desde` (datetime): los lotes modificados después, en cualquier estado, para
+      que el cliente quite los que dejaron de estar disponibles, y en 'eliminados' los
+      ids de los lotes borrados después. No se cachea: cada cliente envía su propio
+      since y habría una entrada por valor; son consultas por índice de pocas filas,
+      y sin cambios desde `desde` ni llegan a la base.
+    """
+    estado = estado_feed_lotes()
+    datos = {
+        'completo': desde is None,
+        'desde': desde.isoformat() if desde else None,
+        # El cliente envía este valor como ?since= en la siguiente consulta
+        'actualizado_hasta': estado['ultima'].isoformat() if estado['ultima'] else None,
+        'lotes': [],
+        'eliminados': [],
+    }
+
+    if desde is None:
+        clave = f"{PREFIJO}:feed:lotes:{generacion_web()}"
+        lotes = cache.get(clave)
+        if lotes is None:
+            lotes = [
+                _lote_feed(lote) for lote in
+                Lote.objects.only(*CAMPOS_FEED).filter(estado='DISPONIBLE').order_by(*ORDENES_CATALOGO['ubicacion'])
+            ]
+            cache.set(clave, lotes, timeout=TIMEOUT_PAGINA)
+        datos['lotes'] = lotes
+    elif estado['ultima'] and desde < estado['ultima']:
+        datos['lotes'] = [
+            _lote_feed(lote) for lote in
+            Lote.objects.only(*CAMPOS_FEED).filter(actualizado_en__gt=desde).order_by('actualizado_en', 'id')
+        ]
+        datos['eliminados'] = list(
+            LoteEliminado.objects.filter(eliminado_en__gt=desde)
+            .order_by('eliminado_en', 'id').values_list('lote_id', flat=True)
+        )
+    return datos
@@ -0,0 +1,67 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from Aplicaciones.sbr_app.models import Lote, ConfiguracionSistema
+from Aplicaciones.sbr_app.imagenes import marcar_imagenes_nuevas, procesar_imagenes_nuevas, borrar_derivados_eliminados
+from .models import Servicio, Testimonio, LoteEliminado
+from .cache_publico import invalidar_web
+
+# Campos del lote que se muestran en la web pública
+CAMPOS_PUBLICOS_LOTE = (
+    'manzana', 'numero_lote', 'dimensiones', 'precio_contado', 'estado',
+    'plano', 'foto_lista', 'ciudad', 'parroquia', 'provincia', 'canton',
+)
+
+
+# ==========================================
+# INVALIDACIÓN DE LA CACHÉ PÚBLICA
+# ==========================================
+@receiver(pre_save, sender=Lote)
+def recordar_lote_publico(sender, instance, update_fields=None, **kwargs):
+    # Solo los cambios visibles en la web (estado, precio, fotos...) invalidan la caché
+    campos = CAMPOS_PUBLICOS_LOTE
+    if update_fields is not None:
+        campos = [c for c in CAMPOS_PUBLICOS_LOTE if c in update_fields]
+    instance._cambio_publico = bool(campos)
+    if instance.pk and campos:
+        anterior = Lote.objects.filter(pk=instance.pk).values(*campos).first()
+        if anterior is not None:
+            instance._cambio_publico = any(
+                anterior[c] != getattr(instance, c) for c in campos
+            )
+
+@receiver(post_save, sender=Lote)
+def invalidar_web_lote(sender, instance, created, **kwargs):
+    if created or getattr(instance, '_cambio_publico', True):
+        invalidar_web()
+
+@receiver(post_delete, sender=Lote)
+def registrar_lote_eliminado(sender, instance, **kwargs):
+    # Para el feed incremental (?since=): avisa a los clientes que quiten el lote
+    LoteEliminado.objects.create(lote_id=instance.pk)
+    invalidar_web()
+
+@receiver(post_save, sender=Servicio)
+@receiver(post_delete, sender=Servicio)
+@receiver(post_save, sender=Testimonio)
+@receiver(post_delete, sender=Testimonio)
+@receiver(post_save, sender=ConfiguracionSistema)
+@receiver(post_delete, sender=ConfiguracionSistema)
+def invalidar_web_contenido(sender, instance, **kwargs):
+    invalidar_web()
+
+
+# ==========================================
+# DERIVADOS DE LA FOTO DEL TESTIMONIO
+# ==========================================
+@receiver(pre_save, sender=Testimonio)
+def recordar_foto_testimonio(sender, instance, **kwargs):
+    marcar_imagenes_nuevas(instance)
+
+@receiver(post_save, sender=Testimonio)
+def generar_derivados_testimonio(sender, instance, **kwargs):
+    procesar_imagenes_nuevas(instance)
+
+@receiver(post_delete, sender=Testimonio)
+def borrar_derivados_testimonio(sender, instance, **kwargs):
+    borrar_derivados_eliminados(instance)
@@ -0,0 +1,102 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils.dateparse import parse_datetime
+
+from Aplicaciones.sbr_app.models import Lote
+from .services import _codificar_cursor, feed_lotes, filtros_catalogo, pagina_catalogo
+
+
+def crear_lote(manzana, numero_lote, precio='10000.00', estado='DISPONIBLE'):
+    return Lote.objects.create(
+        manzana=manzana, numero_lote=numero_lote, dimensiones='10x20m',
+        precio_contado=Decimal(precio), estado=estado,
+    )
+
+
+# ==========================================
+# CATÁLOGO PÚBLICO: PAGINACIÓN POR CURSOR
+# ==========================================
+class PaginaCatalogoTests(TestCase):
+    def setUp(self):
+        for numero in ('10', '2', '1', '3B', '3A', '11', '20'):
+            crear_lote('A', numero)
+        for numero in ('2', '1'):
+            crear_lote('B', numero, precio='8000.00')
+        crear_lote('A', '4', estado='VENDIDO')
+
+    def recorrer(self, orden, por_pagina):
+        filtros = filtros_catalogo({'orden': orden})
+        lotes, cursor = pagina_catalogo(filtros, por_pagina=por_pagina)
+        while cursor:
+            pagina, cursor = pagina_catalogo(filtros, cursor=cursor, por_pagina=por_pagina)
+            lotes += pagina
+        return lotes
+
+    def test_ubicacion_ordena_numero_lote_como_numero(self):
+        lotes = self.recorrer('ubicacion', por_pagina=50)
+        self.assertEqual(
+            [(lote.manzana, lote.numero_lote) for lote in lotes],
+            [('A', '1'), ('A', '2'), ('A', '3A'), ('A', '3B'), ('A', '10'), ('A', '11'), ('A', '20'),
+             ('B', '1'), ('B', '2')],
+        )
+
+    def test_paginas_sin_repetidos_ni_faltantes(self):
+        # Páginas que cortan dentro de la misma manzana, del mismo número ('3A'/'3B') y del mismo precio
+        for orden in ('ubicacion', 'precio'):
+            completo = self.recorrer(orden, por_pagina=50)
+            for por_pagina in (1, 2, 3, 4):
+                with self.subTest(orden=orden, por_pagina=por_pagina):
+                    self.assertEqual(self.recorrer(orden, por_pagina), completo)
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        filtros = filtros_catalogo({})
+        primera, _ = pagina_catalogo(filtros, por_pagina=3)
+        for cursor in ('no-es-un-cursor', _codificar_cursor(['A', '2', '5']), _codificar_cursor(['A', 'x', '2', '5'])):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(pagina_catalogo(filtros, cursor=cursor, por_pagina=3)[0], primera)
+
+
+# ==========================================
+# FEED JSON: CAMBIOS DESDE ?since=
+# ==========================================
+class FeedLotesTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.disponible = crear_lote('A', '1')
+            self.borrado = crear_lote('A', '2')
+            crear_lote('A', '3', estado='VENDIDO')
+
+    def test_completo_solo_disponibles(self):
+        datos = feed_lotes()
+        self.assertTrue(datos['completo'])
+        self.assertEqual([lote['id'] for lote in datos['lotes']], [self.disponible.id, self.borrado.id])
+        self.assertEqual(datos['eliminados'], [])
+
+    def test_cambios_incluyen_lotes_eliminados(self):
+        desde = parse_datetime(feed_lotes()['actualizado_hasta'])
+        with self.captureOnCommitCallbacks(execute=True):
+            lote_id = self.borrado.id
+            self.borrado.delete()
+
+        datos = feed_lotes(desde)
+        self.assertEqual(datos['lotes'], [])
+        self.assertEqual(datos['eliminados'], [lote_id])
+        self.assertGreater(parse_datetime(datos['actualizado_hasta']), desde)
+        self.assertNotIn(lote_id, [lote['id'] for lote in feed_lotes()['lotes']])
+
+        # Con el actualizado_hasta recibido ya no hay cambios
+        siguiente = feed_lotes(parse_datetime(datos['actualizado_hasta']))
+        self.assertEqual((siguiente['lotes'], siguiente['eliminados']), ([], []))
+
+    def test_cambios_en_cualquier_estado(self):
+        desde = parse_datetime(feed_lotes()['actualizado_hasta']) - timedelta(microseconds=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.disponible.estado = 'RESERVADO'
+            self.disponible.save()
+
+        datos = feed_lotes(desde)
+        self.assertFalse(datos['completo'])
+        self.assertEqual([(lote['id'], lote['disponible']) for lote in datos['lotes']][-1],
+                         (self.disponible.id, False))
@@ -14,4 +14,7 @@ urlpatterns = [
     path('nosotros/', views.nosotros_view, name='nosotros'),
     path('testimonios/', views.testimonios_view, name='testimonios'),
     path('contacto/', views.contacto_view, name='contacto'),
+
+    # API pública (JSON)
+    path('api/lotes/', views.api_lotes_view, name='api_lotes'),
 ]
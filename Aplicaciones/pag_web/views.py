@@ -1,16 +1,26 @@
+import hashlib
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition, require_GET
 from .models import Servicio, Testimonio, ContactoMensaje
+from .cache_publico import cache_publico, configuracion_publica, generacion_web, TIMEOUT_PAGINA
+from .services import filtros_catalogo, pagina_catalogo, opciones_catalogo, estado_feed_lotes, feed_lotes
 
 # Importamos el modelo Lote de sbr_app
-from Aplicaciones.sbr_app.models import Lote, ConfiguracionSistema
+from Aplicaciones.sbr_app.models import Lote
 
 
 def get_context_base():
     """
     Contexto base compartido por todas las vistas.
+    La configuración sale de la caché pública (se invalida al editarla).
     """
-    config = ConfiguracionSistema.objects.first()
+    config = configuracion_publica()
     return {
         'config': config,
     }
@@ -19,8 +29,13 @@ def get_context_base():
 def index_view(request):
     """
     Landing page principal con todas las secciones.
+    Tiene el formulario de contacto (token CSRF por visitante), así que no se cachea
+    completa: las secciones pesadas usan {% cache %} con la generación pública y los
+    querysets (perezosos) solo se evalúan cuando el fragmento no está en caché.
     """
     context = get_context_base()
+    context['generacion_web'] = generacion_web()
+    context['timeout_web'] = TIMEOUT_PAGINA
     
     # Lotes disponibles para la sección de propiedades
     context['lotes'] = Lote.objects.filter(estado='DISPONIBLE').order_by('-id')[:6]
@@ -34,15 +49,33 @@ def index_view(request):
     return render(request, 'pag_web/index.html', context)
 
 
+@cache_publico
 def lotes_view(request):
     """
-    Página de todos los lotes disponibles.
+    Catálogo de lotes disponibles: filtros en el servidor (manzana, ubicación y
+    rango de precio) y paginación por cursor (?desde=...).
     """
     context = get_context_base()
-    context['lotes'] = Lote.objects.filter(estado='DISPONIBLE').order_by('numero_lote')
+    filtros = filtros_catalogo(request.GET)
+    cursor = request.GET.get('desde')
+    lotes, siguiente = pagina_catalogo(filtros, cursor=cursor)
+
+    # Query string de los filtros, para conservarlos al pasar de página
+    params = request.GET.copy()
+    params.pop('desde', None)
+
+    context.update({
+        'lotes': lotes,
+        'filtros': filtros,
+        'opciones': opciones_catalogo(),
+        'es_primera_pagina': not cursor,
+        'cursor_siguiente': siguiente,
+        'query_filtros': params.urlencode(),
+    })
     return render(request, 'pag_web/pages/lotes.html', context)
 
 
+@cache_publico
 def lote_detalle_view(request, pk):
     """
     Página de detalle de un lote específico.
@@ -52,6 +85,7 @@ def lote_detalle_view(request, pk):
     return render(request, 'pag_web/pages/lote_detalle.html', context)
 
 
+@cache_publico
 def servicios_view(request):
     """
     Página de servicios.
@@ -61,6 +95,7 @@ def servicios_view(request):
     return render(request, 'pag_web/pages/servicios.html', context)
 
 
+@cache_publico
 def nosotros_view(request):
     """
     Página de información de la empresa.
@@ -69,6 +104,7 @@ def nosotros_view(request):
     return render(request, 'pag_web/pages/nosotros.html', context)
 
 
+@cache_publico
 def testimonios_view(request):
     """
     Página de todos los testimonios.
@@ -103,3 +139,64 @@ def contacto_view(request):
             messages.error(request, 'Por favor complete todos los campos requeridos.')
     
     return render(request, 'pag_web/pages/contacto.html', context)
+
+
+# ==========================================
+# API PÚBLICA: DISPONIBILIDAD DE LOTES (JSON)
+# ==========================================
+def _since_feed(request):
+    """?since=<ISO 8601> → datetime con zona horaria; None si no viene; ValueError si es inválido."""
+    valor = request.GET.get('since', '').strip()
+    if not valor:
+        return None
+    fecha = parse_datetime(valor.replace(' ', '+'))  # '+' llega como espacio si no se codificó
+    if fecha is None:
+        raise ValueError(valor)
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+def _etag_feed(request):
+    estado = estado_feed_lotes()
+    base = f"{estado['ultima']}|{estado['total']}|{request.GET.get('since', '')}"
+    return hashlib.md5(base.encode()).hexdigest()
+
+def _last_modified_feed(request):
+    return estado_feed_lotes()['ultima']
+
+@require_GET
+@condition(etag_func=_etag_feed, last_modified_func=_last_modified_feed)
+def api_lotes_view(request):
+    """
+    Feed de disponibilidad para agentes y widgets (solo lectura).
+    - GET /web/api/lotes/ → todos los lotes disponibles.
+    - GET /web/api/lotes/?since=<actualizado_hasta anterior> → solo los cambios.
+    Si nada cambió, @condition responde 304 sin llegar aquí.
+    """
+    try:
+        desde = _since_feed(request)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetro since inválido (use ISO 8601).'}, status=400)
+
+    datos = feed_lotes(desde)
+
+    # Las URLs se guardan relativas en caché: aquí se completan con el dominio de la petición
+    raiz = request.build_absolute_uri('/')[:-1]
+    def absoluta(url):
+        return raiz + url if url and url.startswith('/') else url
+
+    lotes = []
+    for lote in datos['lotes']:
+        lote = dict(lote, url=absoluta(lote['url']))
+        for campo in ('foto', 'plano'):
+            if lote[campo]:
+                lote[campo] = {
+                    tamano: {formato: absoluta(url) for formato, url in formatos.items()}
+                    for tamano, formatos in lote[campo].items()
+                }
+        lotes.append(lote)
+
+    response = JsonResponse(dict(datos, lotes=lotes))
+    # Caché compartida corta; luego se revalida con If-None-Match / If-Modified-Since
+    patch_cache_control(response, public=True, max_age=60)
+    return response
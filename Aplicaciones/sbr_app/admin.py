@@ -18,8 +18,8 @@ admin.site.register(User, UserAdmin)
 # 1. Configuración del Sistema (Para las reglas de Mora)
 @admin.register(ConfiguracionSistema)
 class ConfiguracionAdmin(admin.ModelAdmin):
-    list_display = ('nombre_empresa', 'ruc_empresa', 'mora_porcentaje')
-    list_editable = ('mora_porcentaje',)
+    list_display = ('nombre_empresa', 'ruc_empresa', 'mora_porcentaje', 'comision_porcentaje')
+    list_editable = ('mora_porcentaje', 'comision_porcentaje')
     # Esto evita que creen más de una configuración (Solo debe haber 1)
     def has_add_permission(self, request):
         if self.model.objects.exists():
@@ -72,12 +72,20 @@ def resetear_pagos_contrato(modeladmin, request, queryset):
 
 @admin.register(Contrato)
 class ContratoAdmin(admin.ModelAdmin):
-    list_display = ('id', 'cliente', 'lote', 'fecha_contrato', 'saldo_a_financiar', 'esta_en_mora')
+    list_display = ('id', 'cliente', 'lote', 'fecha_contrato', 'saldo_a_financiar', 'saldo_pendiente', 'cuotas_vencidas', 'esta_en_mora')
     list_filter = ('esta_en_mora', 'fecha_contrato')
     search_fields = ('cliente__cedula', 'cliente__apellidos')
+    # Calculados desde las cuotas (ver services.actualizar_saldos_contratos)
+    readonly_fields = ('saldo_pendiente', 'total_pagado', 'proximo_vencimiento', 'cuotas_vencidas')
     inlines = [CuotaInline] # Muestra las cuotas ahí mismo
     actions = [resetear_pagos_contrato]
 
+    def save_related(self, request, form, formsets, change):
+        # Las cuotas editadas en línea cambian los saldos guardados del contrato
+        super().save_related(request, form, formsets, change)
+        from .services import actualizar_saldos_contrato
+        actualizar_saldos_contrato(form.instance.id)
+
 # 6. Cuotas (Standalone Registration for Deep Intervention)
 @admin.register(Cuota)
 class CuotaAdmin(admin.ModelAdmin):
@@ -166,3 +174,16 @@ class LogActividadAdmin(admin.ModelAdmin):
         
     def has_delete_permission(self, request, obj=None):
         return False # Nadie puede borrar logs (Integridad)
+
+@admin.register(CierreMensual)
+class CierreMensualAdmin(admin.ModelAdmin):
+    list_display = ('anio', 'mes', 'total_cobrado', 'total_mora_historica', 'ingresos_lotes', 'fecha_cierre')
+    list_filter = ('anio',)
+    readonly_fields = ('anio', 'mes', 'fecha_cierre', 'total_cobrado', 'total_entradas',
+                       'total_ingresos', 'total_mora_historica', 'ingresos_lotes')
+
+    def has_add_permission(self, request):
+        return False # Los cierres solo se generan con: python manage.py cierre_mensual
+
+    def has_change_permission(self, request, obj=None):
+        return False # Un cierre no se edita (borrarlo reabre el mes)
@@ -0,0 +1,195 @@
+"""
+Derivados de imágenes subidas (planos y portadas de lotes, fotos de testimonios y logo).
+
+Al subir una imagen se generan versiones reducidas con Pillow, guardadas junto al
+original con el tamaño y el formato en el nombre:
+
+    lotes/portadas/foto.jpg  ->  lotes/portadas/foto_thumb.webp, foto_card.jpg, ...
+
+- thumb: listados y miniaturas del panel.
+- card: tarjetas de la web pública.
+- full: detalle del lote y PDFs (JPEG comprimido en vez de la foto original del celular).
+
+Cada campo tiene al lado un booleano `<campo>_derivados` que indica si sus derivados
+se generaron: las URLs se arman sin preguntar al storage si el archivo existe. Sin
+derivados (archivo anterior al proceso o que no es imagen, p. ej. un plano en PDF)
+se usa el original. Los existentes se generan con el comando
+`generar_derivados_imagenes`.
+
+Al reemplazar o quitar una imagen, y al borrar el objeto, los derivados del archivo
+anterior se borran del storage cuando se confirma la transacción.
+"""
+import os
+from functools import partial
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+# Ancho/alto máximo de cada derivado (nunca se agranda el original)
+TAMANOS = {
+    'thumb': 320,
+    'card': 800,
+    'full': 1600,
+}
+FORMATOS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'jpg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+# Campos con derivados por modelo (app_label.Modelo -> campos)
+CAMPOS_IMAGEN = {
+    'sbr_app.Lote': ('plano', 'foto_lista'),
+    'sbr_app.ConfiguracionSistema': ('logo',),
+    'pag_web.Testimonio': ('foto',),
+}
+
+
+def ruta_derivado(nombre, tamano, formato):
+    """Nombre en el storage del derivado de `nombre` (junto al original)."""
+    base, _ = os.path.splitext(nombre)
+    return f'{base}_{tamano}.{formato}'
+
+
+def _convertir(imagen, formato):
+    if formato == 'jpg' and imagen.mode != 'RGB':
+        # JPEG no tiene transparencia: se aplana sobre fondo blanco (logos PNG)
+        if imagen.mode in ('RGBA', 'LA', 'P'):
+            imagen = imagen.convert('RGBA')
+            fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+            fondo.paste(imagen, mask=imagen.getchannel('A'))
+            return fondo
+        return imagen.convert('RGB')
+    if formato == 'webp' and imagen.mode not in ('RGB', 'RGBA'):
+        return imagen.convert('RGBA' if 'A' in imagen.getbands() or imagen.mode == 'P' else 'RGB')
+    return imagen
+
+
+def generar_derivados(archivo):
+    """
+    Genera (o reemplaza) los derivados de un FieldFile de imagen.
+    Devuelve la cantidad de archivos escritos (0 si no es una imagen legible).
+    """
+    if not archivo:
+        return 0
+    storage = archivo.storage
+
+    try:
+        with storage.open(archivo.name, 'rb') as f:
+            original = Image.open(f)
+            original = ImageOps.exif_transpose(original)
+            original.load()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return 0
+
+    escritos = 0
+    for tamano, lado in TAMANOS.items():
+        reducida = original.copy()
+        reducida.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        for formato, opciones in FORMATOS.items():
+            buffer = BytesIO()
+            _convertir(reducida, formato).save(buffer, **opciones)
+            ruta = ruta_derivado(archivo.name, tamano, formato)
+            if storage.exists(ruta):
+                storage.delete(ruta)
+            storage.save(ruta, ContentFile(buffer.getvalue()))
+            escritos += 1
+    return escritos
+
+
+def borrar_derivados(storage, nombre):
+    """Borra todos los derivados de `nombre` (los que no existen se ignoran)."""
+    for tamano in TAMANOS:
+        for formato in FORMATOS:
+            storage.delete(ruta_derivado(nombre, tamano, formato))
+
+
+def campo_derivados(campo):
+    """Nombre del booleano que indica si `campo` tiene derivados."""
+    return f'{campo}_derivados'
+
+
+def tiene_derivados(archivo):
+    """True si los derivados del FieldFile están generados (según su modelo, sin ir al storage)."""
+    return bool(getattr(archivo.instance, campo_derivados(archivo.field.name), False))
+
+
+def url_derivado(archivo, tamano='card', formato='jpg'):
+    """URL del derivado pedido, o la del original si no tiene derivados."""
+    if not archivo:
+        return ''
+    if tiene_derivados(archivo):
+        return archivo.storage.url(ruta_derivado(archivo.name, tamano, formato))
+    return archivo.url
+
+
+def srcset_derivados(archivo, formato='jpg'):
+    """Valor para el atributo `srcset` con los derivados ('' si no hay)."""
+    if not archivo or not tiene_derivados(archivo):
+        return ''
+    return ', '.join(
+        f'{archivo.storage.url(ruta_derivado(archivo.name, tamano, formato))} {lado}w'
+        for tamano, lado in TAMANOS.items()
+    )
+
+
+def registrar_derivados(instance, campo, generados):
+    """Guarda en el objeto si `campo` tiene derivados (update directo, sin señales)."""
+    setattr(instance, campo_derivados(campo), generados)
+    type(instance)._default_manager.filter(pk=instance.pk).update(**{campo_derivados(campo): generados})
+
+
+# ==========================================
+# USO DESDE SIGNALS
+# ==========================================
+def marcar_imagenes_nuevas(instance):
+    """
+    (pre_save) Recuerda qué campos de imagen traen un archivo recién subido y, de los
+    que cambian (nuevos o quitados con derivados), el archivo anterior.
+    Django guarda el archivo después de este punto, por eso se mira `_committed`.
+    """
+    campos = CAMPOS_IMAGEN.get(instance._meta.label, ())
+    instance._imagenes_nuevas = [
+        campo for campo in campos
+        if getattr(instance, campo) and not getattr(instance, campo)._committed
+    ]
+
+    instance._imagenes_anteriores = {}
+    cambian = [
+        campo for campo in campos
+        if campo in instance._imagenes_nuevas
+        or (not getattr(instance, campo) and getattr(instance, campo_derivados(campo), False))
+    ]
+    if instance.pk and cambian:
+        anteriores = type(instance)._default_manager.filter(pk=instance.pk).values(*cambian).first() or {}
+        instance._imagenes_anteriores = {campo: nombre for campo, nombre in anteriores.items() if nombre}
+
+
+def procesar_imagenes_nuevas(instance):
+    """
+    (post_save) Genera los derivados de los archivos marcados en pre_save y borra
+    los del archivo reemplazado o quitado.
+    """
+    for campo in getattr(instance, '_imagenes_nuevas', ()):
+        registrar_derivados(instance, campo, generar_derivados(getattr(instance, campo)) > 0)
+
+    for campo, nombre in getattr(instance, '_imagenes_anteriores', {}).items():
+        archivo = getattr(instance, campo)
+        if archivo and archivo.name == nombre:
+            continue
+        if not archivo:
+            registrar_derivados(instance, campo, False)
+        storage = instance._meta.get_field(campo).storage
+        transaction.on_commit(partial(borrar_derivados, storage, nombre))
+
+    instance._imagenes_nuevas = []
+    instance._imagenes_anteriores = {}
+
+
+def borrar_derivados_eliminados(instance):
+    """(post_delete) Borra los derivados de las imágenes del objeto eliminado."""
+    for campo in CAMPOS_IMAGEN.get(instance._meta.label, ()):
+        archivo = getattr(instance, campo)
+        if archivo and tiene_derivados(archivo):
+            transaction.on_commit(partial(borrar_derivados, archivo.storage, archivo.name))
@@ -0,0 +1,46 @@
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+from Aplicaciones.sbr_app.models import CierreMensual
+from Aplicaciones.sbr_app.services import cerrar_mes
+
+class Command(BaseCommand):
+    help = 'Cierra el mes recién terminado: congela cobros, mora, proyección y saldos para los reportes históricos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help='Mes a cerrar (YYYY-MM). Por defecto: el mes recién terminado, si no tiene cierre')
+        parser.add_argument('--rehacer', action='store_true', help='Vuelve a generar el cierre aunque ya exista')
+
+    def handle(self, *args, **options):
+        if options['mes']:
+            try:
+                anio, mes = map(int, options['mes'].split('-'))
+                meses = [date(anio, mes, 1)]
+            except ValueError:
+                raise CommandError("Formato de --mes inválido, use YYYY-MM.")
+        else:
+            meses = self._meses_pendientes()
+
+        if not meses:
+            self.stdout.write("No hay meses pendientes de cierre.")
+            return
+
+        for inicio in meses:
+            try:
+                cierre, creado = cerrar_mes(inicio.year, inicio.month, rehacer=options['rehacer'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            estado = "cerrado" if creado else "ya estaba cerrado"
+            self.stdout.write(f"  {inicio.month:02d}/{inicio.year}: {estado} (cobrado ${cierre.total_cobrado})")
+
+        self.stdout.write(self.style.SUCCESS("Cierre mensual completado."))
+
+    def _meses_pendientes(self):
+        """
+        Solo el mes anterior al actual, si no tiene cierre. Los meses más antiguos
+        no se rellenan: su cierre tomaría el estado de hoy (ver cerrar_mes).
+        """
+        anterior = date.today().replace(day=1) - relativedelta(months=1)
+        if CierreMensual.objects.filter(anio=anterior.year, mes=anterior.month).exists():
+            return []
+        return [anterior]
@@ -0,0 +1,30 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from Aplicaciones.sbr_app.imagenes import CAMPOS_IMAGEN, campo_derivados, generar_derivados, registrar_derivados
+
+class Command(BaseCommand):
+    help = 'Genera los derivados (thumb/card/full en WebP y JPEG) de las imágenes ya subidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rehacer', action='store_true', help='Vuelve a generar aunque el objeto ya tenga derivados')
+
+    def handle(self, *args, **options):
+        total = 0
+        for etiqueta, campos in CAMPOS_IMAGEN.items():
+            modelo = apps.get_model(etiqueta)
+            for campo in campos:
+                consulta = modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                if not options['rehacer']:
+                    consulta = consulta.filter(**{campo_derivados(campo): False})
+                for objeto in consulta.only('pk', campo, campo_derivados(campo)).iterator():
+                    archivo = getattr(objeto, campo)
+                    if not archivo.storage.exists(archivo.name):
+                        self.stdout.write(self.style.WARNING(f"  No existe: {archivo.name}"))
+                        continue
+                    generados = generar_derivados(archivo) > 0
+                    registrar_derivados(objeto, campo, generados)
+                    if generados:
+                        total += 1
+                        self.stdout.write(f"  {etiqueta}.{campo}: {archivo.name}")
+
+        self.stdout.write(self.style.SUCCESS(f"Derivados generados para {total} imagen(es)."))
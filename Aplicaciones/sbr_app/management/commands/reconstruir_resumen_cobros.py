@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from Aplicaciones.sbr_app.models import Contrato
+from Aplicaciones.sbr_app.services import actualizar_resumen_cobros_contrato
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla ResumenCobroMensual (cobros por contrato y mes) desde los pagos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contrato', type=int, help='Reconstruir solo este contrato (ID)')
+
+    def handle(self, *args, **options):
+        contratos = Contrato.objects.all()
+        if options['contrato']:
+            contratos = contratos.filter(id=options['contrato'])
+
+        ids = list(contratos.order_by('id').values_list('id', flat=True))
+        self.stdout.write(f"Reconstruyendo resumen mensual de {len(ids)} contrato(s)...")
+
+        for i, contrato_id in enumerate(ids, start=1):
+            # Cada contrato en su propia transacción (ver actualizar_resumen_cobros_contrato)
+            actualizar_resumen_cobros_contrato(contrato_id)
+            if i % 500 == 0:
+                self.stdout.write(f"  {i}/{len(ids)}")
+
+        self.stdout.write(self.style.SUCCESS("Resumen mensual de cobros reconstruido."))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from Aplicaciones.sbr_app.models import Contrato
+from Aplicaciones.sbr_app.services import diferencias_saldos_contratos, guardar_saldos_contratos
+
+class Command(BaseCommand):
+    help = 'Verifica los saldos guardados en Contrato (saldo, total pagado, próximo vencimiento, cuotas vencidas) contra sus cuotas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contrato', type=int, help='Verificar solo este contrato (ID)')
+        parser.add_argument('--corregir', action='store_true', help='Guarda los valores calculados en los contratos con diferencias')
+        parser.add_argument('--bloque', type=int, default=500, help='Contratos por consulta (por defecto 500)')
+
+    def handle(self, *args, **options):
+        contratos = Contrato.objects.all()
+        if options['contrato']:
+            contratos = contratos.filter(id=options['contrato'])
+
+        ids = list(contratos.order_by('id').values_list('id', flat=True))
+        self.stdout.write(f"Verificando saldos de {len(ids)} contrato(s)...")
+
+        con_diferencias = 0
+        for i in range(0, len(ids), options['bloque']):
+            bloque = Contrato.objects.filter(id__in=ids[i:i + options['bloque']])
+            # Cada bloque en su propia transacción: lo leído es lo que se corrige
+            with transaction.atomic():
+                diferencias = diferencias_saldos_contratos(bloque)
+                for contrato, distintos in diferencias:
+                    detalle = ", ".join(
+                        f"{campo}: {guardado} (calculado {calculado})"
+                        for campo, (guardado, calculado) in distintos.items()
+                    )
+                    self.stdout.write(f"  Contrato #{contrato.id}: {detalle}")
+                if diferencias and options['corregir']:
+                    guardar_saldos_contratos(diferencias)
+            con_diferencias += len(diferencias)
+
+        if not con_diferencias:
+            self.stdout.write(self.style.SUCCESS("Los saldos de los contratos coinciden con sus cuotas."))
+        elif options['corregir']:
+            self.stdout.write(self.style.SUCCESS(f"Saldos corregidos en {con_diferencias} contrato(s)."))
+        else:
+            raise CommandError(f"{con_diferencias} contrato(s) con saldos desactualizados. Use --corregir para guardarlos.")
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-19 08:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_app', '0031_lote_unique_manzana_numero'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCobroMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('anio', models.PositiveSmallIntegerField()),
+                ('mes', models.PositiveSmallIntegerField()),
+                ('total_entrada', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_capital', models.DecimalField(decimal_places=2, default=0, help_text='Incluye pagos legacy sin detalle', max_digits=12)),
+                ('total_mora', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_cobrado', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('contrato', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_cobro', to='sbr_app.contrato')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Cobro Mensual',
+                'verbose_name_plural': 'Resúmenes de Cobro Mensual',
+                'indexes': [models.Index(fields=['anio', 'mes'], name='sbr_app_res_anio_171acf_idx')],
+                'unique_together': {('contrato', 'anio', 'mes')},
+            },
+        ),
+    ]
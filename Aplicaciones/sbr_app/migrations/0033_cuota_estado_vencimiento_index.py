@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_app', '0032_resumencobromensual'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cuota',
+            index=models.Index(fields=['estado', 'fecha_vencimiento'], name='sbr_app_cuo_estado_331a6b_idx'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_app', '0033_cuota_estado_vencimiento_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierreMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('anio', models.PositiveSmallIntegerField()),
+                ('mes', models.PositiveSmallIntegerField()),
+                ('fecha_cierre', models.DateTimeField(auto_now_add=True)),
+                ('total_cobrado', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_entradas', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_mora_historica', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ingresos_lotes', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Cierre Mensual',
+                'verbose_name_plural': 'Cierres Mensuales',
+                'ordering': ['-anio', '-mes'],
+                'unique_together': {('anio', 'mes')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CierreMensualCobro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orden', models.PositiveIntegerField()),
+                ('apellidos', models.CharField(max_length=100)),
+                ('nombres', models.CharField(max_length=100)),
+                ('cedula', models.CharField(max_length=10)),
+                ('manzana', models.CharField(blank=True, max_length=10)),
+                ('numero_lote', models.CharField(blank=True, max_length=30)),
+                ('fecha_pago', models.DateField()),
+                ('metodo_pago', models.CharField(max_length=20)),
+                ('cuotas_cubiertas', models.CharField(max_length=255)),
+                ('es_entrada', models.BooleanField(default=False)),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('cierre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cobros', to='sbr_app.cierremensual')),
+                ('contrato', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sbr_app.contrato')),
+                ('vendedor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Cobro de Cierre Mensual',
+                'verbose_name_plural': 'Cobros de Cierre Mensual',
+                'ordering': ['cierre', 'orden'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CierreMensualContrato',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('apellidos', models.CharField(max_length=100)),
+                ('nombres', models.CharField(max_length=100)),
+                ('cedula', models.CharField(max_length=10)),
+                ('manzana', models.CharField(blank=True, max_length=10)),
+                ('numero_lote', models.CharField(blank=True, max_length=30)),
+                ('estado_contrato', models.CharField(max_length=20)),
+                ('cobrado_cuotas', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cobrado_entrada', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('proyeccion_cuotas', models.PositiveIntegerField(default=0)),
+                ('proyeccion_deuda', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('mora_cuotas', models.PositiveIntegerField(default=0)),
+                ('mora_deuda', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('saldo_pendiente', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cierre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contratos', to='sbr_app.cierremensual')),
+                ('contrato', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sbr_app.contrato')),
+                ('vendedor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Contrato en Cierre Mensual',
+                'verbose_name_plural': 'Contratos en Cierre Mensual',
+                'ordering': ['cierre', 'id'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_app', '0034_cierre_mensual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='configuracionsistema',
+            name='comision_porcentaje',
+            field=models.DecimalField(decimal_places=2, default=0.0, help_text='Porcentaje de comisión del vendedor sobre lo cobrado (Ej: 5.00 = 5%)', max_digits=5),
+        ),
+    ]
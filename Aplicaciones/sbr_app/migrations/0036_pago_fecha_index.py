@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_app', '0035_configuracion_comision'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['fecha_pago', 'id'], name='sbr_app_pag_fecha_p_9f6835_idx'),
+        ),
+    ]
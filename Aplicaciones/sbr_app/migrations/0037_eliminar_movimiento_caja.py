@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:25
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_app', '0036_pago_fecha_index'),
+        ('sbr_gestor', '0004_unificar_movimientos_caja'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='MovimientoCaja',
+        ),
+    ]
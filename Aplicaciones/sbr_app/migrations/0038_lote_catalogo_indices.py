@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_app', '0037_eliminar_movimiento_caja'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(fields=['estado', 'manzana', 'numero_lote'], name='sbr_app_lot_estado_25ae80_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(fields=['estado', 'precio_contado'], name='sbr_app_lot_estado_f87b2a_idx'),
+        ),
+    ]
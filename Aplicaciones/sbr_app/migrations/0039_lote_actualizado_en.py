@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_app', '0038_lote_catalogo_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lote',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_app', '0039_lote_actualizado_en'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['cedula'], name='sbr_app_cli_cedula_cb33e8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['apellidos', 'nombres'], name='sbr_app_cli_apellid_3b5cd2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['nombres'], name='sbr_app_cli_nombres_1ee6fe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contrato',
+            index=models.Index(fields=['estado', 'fecha_contrato'], name='sbr_app_con_estado_5d6309_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:39
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Min, Q, Sum
+
+
+def calcular_saldos_contratos(apps, schema_editor):
+    """Llena los saldos de los contratos existentes desde sus cuotas (una consulta agrupada)."""
+    Contrato = apps.get_model('sbr_app', 'Contrato')
+    Cuota = apps.get_model('sbr_app', 'Cuota')
+
+    def dinero(valor):
+        return Decimal(valor or 0).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    filas = Cuota.objects.values('contrato_id').annotate(
+        saldo=Sum(ExpressionWrapper(
+            F('valor_capital') + F('valor_mora') - F('valor_pagado'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )),
+        pagado=Sum('valor_pagado'),
+        proximo=Min('fecha_vencimiento', filter=Q(estado__in=['PENDIENTE', 'PARCIAL'])),
+        vencidas=Count('id', filter=Q(estado='VENCIDO')),
+    )
+    for fila in filas.iterator():
+        Contrato.objects.filter(pk=fila['contrato_id']).update(
+            saldo_pendiente=dinero(fila['saldo']),
+            total_pagado=dinero(fila['pagado']),
+            proximo_vencimiento=fila['proximo'],
+            cuotas_vencidas=fila['vencidas'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_app', '0040_listado_clientes_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contrato',
+            name='cuotas_vencidas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='contrato',
+            name='proximo_vencimiento',
+            field=models.DateField(blank=True, help_text='Vencimiento más cercano de las cuotas pendientes o parciales', null=True),
+        ),
+        migrations.AddField(
+            model_name='contrato',
+            name='saldo_pendiente',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Capital + mora - pagado de las cuotas', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='contrato',
+            name='total_pagado',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Abonado a las cuotas (sin la entrada)', max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='contrato',
+            index=models.Index(fields=['estado', 'saldo_pendiente'], name='sbr_app_con_estado_d2f275_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contrato',
+            index=models.Index(fields=['estado', 'proximo_vencimiento'], name='sbr_app_con_estado_39422a_idx'),
+        ),
+        migrations.RunPython(calcular_saldos_contratos, migrations.RunPython.noop),
+    ]
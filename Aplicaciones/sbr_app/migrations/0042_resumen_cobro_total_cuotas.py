@@ -0,0 +1,71 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:04
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def reconstruir_resumen_cobros(apps, schema_editor):
+    """
+    Regenera el rollup con total_cuotas y la regla de entrada del reporte general
+    (en contratos legacy el primer pago por id es la entrada, tenga o no detalles).
+    """
+    Contrato = apps.get_model('sbr_app', 'Contrato')
+    Pago = apps.get_model('sbr_app', 'Pago')
+    DetallePago = apps.get_model('sbr_app', 'DetallePago')
+    ResumenCobroMensual = apps.get_model('sbr_app', 'ResumenCobroMensual')
+
+    aplicado_por_pago = dict(
+        DetallePago.objects.order_by().values('pago_id').annotate(t=Sum('monto_aplicado')).values_list('pago_id', 't')
+    )
+    valor_entrada = dict(Contrato.objects.values_list('id', 'valor_entrada'))
+    con_entrada_marcada = set(Pago.objects.filter(es_entrada=True).values_list('contrato_id', flat=True))
+
+    filas = {}
+    primeros = set()
+    for pago in Pago.objects.order_by('contrato_id', 'id').iterator():
+        es_primero = pago.contrato_id not in primeros
+        primeros.add(pago.contrato_id)
+        legacy = valor_entrada[pago.contrato_id] > 0 and pago.contrato_id not in con_entrada_marcada
+
+        fila = filas.setdefault((pago.contrato_id, pago.fecha_pago.year, pago.fecha_pago.month), {
+            'total_entrada': Decimal('0.00'),
+            'total_cuotas': Decimal('0.00'),
+            'total_cobrado': Decimal('0.00'),
+        })
+        fila['total_cobrado'] += pago.monto
+        if pago.es_entrada or (legacy and es_primero):
+            fila['total_entrada'] += pago.monto
+        else:
+            fila['total_cuotas'] += aplicado_por_pago.get(pago.id, pago.monto)
+
+    ResumenCobroMensual.objects.all().delete()
+    ResumenCobroMensual.objects.bulk_create([
+        ResumenCobroMensual(contrato_id=contrato_id, anio=anio, mes=mes, **totales)
+        for (contrato_id, anio, mes), totales in filas.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_app', '0041_contrato_saldos'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='resumencobromensual',
+            name='total_capital',
+        ),
+        migrations.RemoveField(
+            model_name='resumencobromensual',
+            name='total_mora',
+        ),
+        migrations.AddField(
+            model_name='resumencobromensual',
+            name='total_cuotas',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Aplicado a cuotas (capital y mora); pagos legacy sin detalle por su monto', max_digits=12),
+        ),
+        migrations.RunPython(reconstruir_resumen_cobros, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:14
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def calcular_numero_lote_orden(apps, schema_editor):
+    """Mismo cálculo que Lote.save() (parte numérica inicial de numero_lote)."""
+    Lote = apps.get_model('sbr_app', 'Lote')
+    lotes = []
+    for lote in Lote.objects.only('id', 'numero_lote').iterator():
+        coincidencia = re.match(r'\s*(\d+)', lote.numero_lote or '')
+        lote.numero_lote_orden = min(int(coincidencia.group(1)), 2147483647) if coincidencia else 0
+        lotes.append(lote)
+    Lote.objects.bulk_update(lotes, ['numero_lote_orden'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_app', '0042_resumen_cobro_total_cuotas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='lote',
+            name='sbr_app_lot_estado_25ae80_idx',
+        ),
+        migrations.AddField(
+            model_name='lote',
+            name='numero_lote_orden',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_numero_lote_orden, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(fields=['estado', 'manzana', 'numero_lote_orden', 'numero_lote'], name='sbr_app_lot_estado_622d30_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:17
+
+import os
+
+from django.db import migrations, models
+
+
+def marcar_derivados_existentes(apps, schema_editor):
+    """
+    Marca las imágenes cuyos derivados ya se generaron (se comprueba una sola vez el
+    derivado 'full' en JPEG; desde aquí las URLs ya no consultan el storage).
+    """
+    for modelo, campos in (('Lote', ('plano', 'foto_lista')), ('ConfiguracionSistema', ('logo',))):
+        Modelo = apps.get_model('sbr_app', modelo)
+        for campo in campos:
+            storage = Modelo._meta.get_field(campo).storage
+            con_derivados = []
+            for pk, nombre in Modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True}).values_list('pk', campo):
+                base, _ = os.path.splitext(nombre)
+                if storage.exists(f'{base}_full.jpg'):
+                    con_derivados.append(pk)
+            Modelo.objects.filter(pk__in=con_derivados).update(**{f'{campo}_derivados': True})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_app', '0043_lote_numero_lote_orden'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='configuracionsistema',
+            name='logo_derivados',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lote',
+            name='foto_lista_derivados',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lote',
+            name='plano_derivados',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(marcar_derivados_existentes, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,16 @@ from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from .validators import validar_archivo_seguro
 import bleach
+import re
+
+# Mayor valor de un PositiveIntegerField en todas las bases soportadas
+MAX_NUMERO_LOTE_ORDEN = 2147483647
+
+
+def orden_numero_lote(numero_lote):
+    """Parte numérica inicial de numero_lote ('10' -> 10, '3A' -> 3); 0 si no empieza con dígitos."""
+    coincidencia = re.match(r'\s*(\d+)', numero_lote or '')
+    return min(int(coincidencia.group(1)), MAX_NUMERO_LOTE_ORDEN) if coincidencia else 0
 
 class ConfiguracionSistema(models.Model):
     # Mora Porcentual (Nueva Lógica)
@@ -12,11 +22,20 @@ class ConfiguracionSistema(models.Model):
         default=3.00, 
         help_text="Porcentaje de mora sobre el capital de la cuota (Ej: 3.00 = 3%)"
     )
+    # Comisión de vendedores (sobre lo cobrado en el mes)
+    comision_porcentaje = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        default=0.00,
+        help_text="Porcentaje de comisión del vendedor sobre lo cobrado (Ej: 5.00 = 5%)"
+    )
 
     # Datos para el Contrato PDF
     nombre_empresa = models.CharField(max_length=100)
     ruc_empresa = models.CharField(max_length=13)
     logo = models.ImageField(upload_to='config/logos/', blank=True, null=True, validators=[validar_archivo_seguro])
+    # Versiones reducidas generadas (ver imagenes.py)
+    logo_derivados = models.BooleanField(default=False, editable=False)
 
     def __str__(self):
         return "Configuración General del Sistema"
@@ -44,6 +63,8 @@ class Lote(models.Model):
 
     manzana = models.CharField(max_length=10)
     numero_lote = models.CharField(max_length=30)
+    # Orden numérico de numero_lote (texto: '10' iría antes que '2'); lo calcula save()
+    numero_lote_orden = models.PositiveIntegerField(default=0, editable=False)
     dimensiones = models.CharField(max_length=50, help_text="Ej: 10x20m")
     precio_contado = models.DecimalField(max_digits=12, decimal_places=2)
     estado = models.CharField(max_length=20, choices=ESTADOS, default='DISPONIBLE')
@@ -52,6 +73,9 @@ class Lote(models.Model):
     plano = models.ImageField(upload_to='lotes/planos/', blank=True, null=True, help_text="Imagen del plano/mapa del lote", validators=[validar_archivo_seguro])
     # Nueva foto específica para listados (Portada)
     foto_lista = models.ImageField(upload_to='lotes/portadas/', blank=True, null=True, help_text="Foto para mostrar en el listado (opcional)", validators=[validar_archivo_seguro])
+    # Versiones reducidas generadas (ver imagenes.py): las URLs se arman sin consultar el storage
+    plano_derivados = models.BooleanField(default=False, editable=False)
+    foto_lista_derivados = models.BooleanField(default=False, editable=False)
     
     # Ubicación (Opcionales)
     ciudad = models.CharField(max_length=100, blank=True, null=True)
@@ -63,13 +87,28 @@ class Lote(models.Model):
     
     # Usuario que creó el lote (para control de permisos de edición)
     creado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='lotes_creados')
+
+    # Última modificación (feed público de disponibilidad: ETag y consultas ?since=)
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True)
     
     # Para saber si está ocupado rápido
     class Meta:
         unique_together = [('manzana', 'numero_lote')]
+        indexes = [
+            # Catálogo público: filtro por estado y cursor por ubicación o por precio
+            models.Index(fields=['estado', 'manzana', 'numero_lote_orden', 'numero_lote']),
+            models.Index(fields=['estado', 'precio_contado']),
+        ]
         verbose_name = "Lote"
         verbose_name_plural = "Lotes"
 
+    def save(self, *args, **kwargs):
+        self.numero_lote_orden = orden_numero_lote(self.numero_lote)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'numero_lote' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'numero_lote_orden'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Mz. {self.manzana} - Lote {self.numero_lote} ({self.estado})"
 
@@ -86,6 +125,14 @@ class Cliente(models.Model):
     direccion = models.TextField()
     fecha_registro = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Búsqueda por prefijo en el listado de clientes
+            models.Index(fields=['cedula']),
+            models.Index(fields=['apellidos', 'nombres']),
+            models.Index(fields=['nombres']),
+        ]
+
     def save(self, *args, **kwargs):
         # Sanitización de Inputs (Bleach) - Punto 3.1
         if self.direccion:
@@ -132,24 +179,46 @@ class Contrato(models.Model):
     # Bandera para saber si está en mora actualmente (calculado)
     esta_en_mora = models.BooleanField(default=False)
 
+    # Totales de las cuotas guardados en el contrato (calculados). Los mantienen los
+    # servicios que escriben cuotas (ver services.actualizar_saldos_contratos);
+    # se verifican con: python manage.py verificar_saldos_contratos
+    saldo_pendiente = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Capital + mora - pagado de las cuotas")
+    total_pagado = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Abonado a las cuotas (sin la entrada)")
+    proximo_vencimiento = models.DateField(null=True, blank=True, help_text="Vencimiento más cercano de las cuotas pendientes o parciales")
+    cuotas_vencidas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Listado de clientes: filtro por estado y orden/rango por fecha de contrato
+            models.Index(fields=['estado', 'fecha_contrato']),
+            # Listado de clientes: orden por saldo y por próximo vencimiento
+            models.Index(fields=['estado', 'saldo_pendiente']),
+            models.Index(fields=['estado', 'proximo_vencimiento']),
+        ]
+
     def __str__(self):
         return f"Contrato #{self.id} - {self.cliente}"
 
+    def _lotes_lista(self):
+        """Lotes M2M como lista: usa el prefetch_related('lotes') si existe (sin consultas extra)."""
+        return list(self.lotes.all())
+
     @property
     def lote_principal(self):
         """Devuelve el primer lote asociado para compatibilidad."""
-        return self.lotes.first() or self.lote
+        lotes = self._lotes_lista()
+        return min(lotes, key=lambda l: l.pk) if lotes else self.lote
 
     @property
     def lotes_display(self):
         """String concatenado de los lotes: 'Mz A - 1, 2'"""
-        lotes_qs = self.lotes.all()
-        if not lotes_qs.exists() and self.lote:
+        lotes = self._lotes_lista()
+        if not lotes and self.lote:
             return f"Mz {self.lote.manzana} - Lote {self.lote.numero_lote}"
             
         # Agrupar por Manzana
         grupos = {}
-        for l in lotes_qs:
+        for l in lotes:
             if l.manzana not in grupos:
                 grupos[l.manzana] = []
             grupos[l.manzana].append(str(l.numero_lote))
@@ -164,24 +233,24 @@ class Contrato(models.Model):
     @property
     def manzanas_str(self):
         """Devuelve string de manzanas unicas: 'A, B'"""
-        lotes_qs = self.lotes.all()
-        if not lotes_qs.exists() and self.lote:
+        lotes = self._lotes_lista()
+        if not lotes and self.lote:
             return str(self.lote.manzana)
-        mzs = sorted(list(set(l.manzana for l in lotes_qs)))
+        mzs = sorted(list(set(l.manzana for l in lotes)))
         return ", ".join(mzs)
 
     @property
     def numeros_lotes_str(self):
         """Devuelve string de numeros de lote: '1, 2, 5'"""
-        lotes_qs = self.lotes.all()
-        if not lotes_qs.exists() and self.lote:
+        lotes = self._lotes_lista()
+        if not lotes and self.lote:
             return str(self.lote.numero_lote)
         
         # Opcional: mostrar 'Mz A: 1, 2 / Mz B: 5' si hay mezcla compleja
         # Para simplificar en columnas separadas, solo listamos números
         # Si queremos ser precisos cuando hay multiple manzanas, lo mejor es el lotes_display general.
         # Pero intentaremos listar todos los números.
-        nums = sorted([str(l.numero_lote) for l in lotes_qs], key=lambda x: int(x) if x.isdigit() else x)
+        nums = sorted([str(l.numero_lote) for l in lotes], key=lambda x: int(x) if x.isdigit() else x)
         return ", ".join(nums)
 
 
@@ -212,6 +281,10 @@ class Cuota(models.Model):
 
     class Meta:
         ordering = ['numero_cuota'] # Ordenar cronológicamente
+        indexes = [
+            # Cuotas impagas por fecha (moras, proyección y cartera por tramos)
+            models.Index(fields=['estado', 'fecha_vencimiento']),
+        ]
 
     def __str__(self):
         return f"Cuota {self.numero_cuota} - {self.contrato}"
@@ -257,6 +330,10 @@ class Pago(models.Model):
     es_entrada = models.BooleanField(default=False, help_text="Indica si este pago corresponde a la cuota de entrada no amortizable")
     cuota_origen = models.ForeignKey('Cuota', on_delete=models.SET_NULL, null=True, blank=True, help_text="Si seleccionó una cuota intencionalmente al pagar, este campo la guarda para recordarlo")
 
+    class Meta:
+        # Historial de movimientos del gestor: orden y cursor por (fecha_pago, id)
+        indexes = [models.Index(fields=['fecha_pago', 'id'])]
+
     def save(self, *args, **kwargs):
         # Sanitización de Inputs (Bleach)
         if self.observacion:
@@ -292,23 +369,122 @@ class LogActividad(models.Model):
         verbose_name_plural = "Logs de Actividad"
         ordering = ['-fecha']
 
-class MovimientoCaja(models.Model):
-    TIPO_CHOICES = [
-        ('INGRESO', 'Ingreso'),
-        ('GASTO', 'Gasto'),
-    ]
-    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+
+class ResumenCobroMensual(models.Model):
+    """
+    Rollup de lo cobrado por contrato y mes (según fecha_pago). El reporte general lo lee
+    en vez de recorrer Pago/DetallePago.
+    Lo mantienen registrar_pago_cliente y recalcular_deuda_contrato;
+    se reconstruye con: python manage.py reconstruir_resumen_cobros
+    """
+    contrato = models.ForeignKey(Contrato, on_delete=models.CASCADE, related_name='resumenes_cobro')
+    anio = models.PositiveSmallIntegerField()
+    mes = models.PositiveSmallIntegerField()
+
+    # Desglose de lo cobrado en el mes
+    total_entrada = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_cuotas = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Aplicado a cuotas (capital y mora); pagos legacy sin detalle por su monto")
+    # Suma de Pago.monto del mes (incluye saldo a favor no aplicado a cuotas)
+    total_cobrado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [('contrato', 'anio', 'mes')]
+        indexes = [models.Index(fields=['anio', 'mes'])]
+        verbose_name = "Resumen de Cobro Mensual"
+        verbose_name_plural = "Resúmenes de Cobro Mensual"
+
+    def __str__(self):
+        return f"Contrato #{self.contrato_id} - {self.mes:02d}/{self.anio}: ${self.total_cobrado}"
+
+
+class CierreMensual(models.Model):
+    """
+    Cierre de un mes ya terminado: congela cobros, mora, proyección y saldos
+    (ver CierreMensualCobro y CierreMensualContrato) para que los reportes de
+    meses pasados no se recalculen ni cambien si luego se edita un pago.
+    Se genera con: python manage.py cierre_mensual (a inicio de cada mes, para el mes
+    recién terminado: el cierre toma el estado de las cuotas de ese momento).
+    """
+    anio = models.PositiveSmallIntegerField()
+    mes = models.PositiveSmallIntegerField()
+    fecha_cierre = models.DateTimeField(auto_now_add=True)
+
+    # Totales de toda la cartera al cierre
+    total_cobrado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_entradas = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_ingresos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_mora_historica = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Cobrado en el mes sin contratos en devolución (ingresos de lotes del dashboard gestor)
+    ingresos_lotes = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [('anio', 'mes')]
+        ordering = ['-anio', '-mes']
+        verbose_name = "Cierre Mensual"
+        verbose_name_plural = "Cierres Mensuales"
+
+    def __str__(self):
+        return f"Cierre {self.mes:02d}/{self.anio}"
+
+
+class CierreMensualCobro(models.Model):
+    """Un pago recibido en el mes cerrado, con los datos que muestra el reporte mensual."""
+    cierre = models.ForeignKey(CierreMensual, on_delete=models.CASCADE, related_name='cobros')
+    orden = models.PositiveIntegerField()
+    contrato = models.ForeignKey(Contrato, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    vendedor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    # Datos copiados al cierre (no cambian aunque se edite el cliente o el lote)
+    apellidos = models.CharField(max_length=100)
+    nombres = models.CharField(max_length=100)
+    cedula = models.CharField(max_length=10)
+    manzana = models.CharField(max_length=10, blank=True)
+    numero_lote = models.CharField(max_length=30, blank=True)
+
+    fecha_pago = models.DateField()
+    metodo_pago = models.CharField(max_length=20)
+    cuotas_cubiertas = models.CharField(max_length=255)
+    es_entrada = models.BooleanField(default=False)
     monto = models.DecimalField(max_digits=12, decimal_places=2)
-    fecha = models.DateField()
-    descripcion = models.TextField(blank=True, null=True)
-    
-    registrado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
-    fecha_registro = models.DateTimeField(auto_now_add=True)
 
-    def save(self, *args, **kwargs):
-        if self.descripcion:
-            self.descripcion = bleach.clean(self.descripcion, tags=[], attributes={}, strip=True)
-        super().save(*args, **kwargs)
+    class Meta:
+        ordering = ['cierre', 'orden']
+        verbose_name = "Cobro de Cierre Mensual"
+        verbose_name_plural = "Cobros de Cierre Mensual"
+
+    def __str__(self):
+        return f"{self.cierre} - {self.apellidos} ${self.monto}"
+
+
+class CierreMensualContrato(models.Model):
+    """Situación de un contrato al cierre del mes (activos y contratos con cobros en el mes)."""
+    cierre = models.ForeignKey(CierreMensual, on_delete=models.CASCADE, related_name='contratos')
+    contrato = models.ForeignKey(Contrato, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    vendedor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    apellidos = models.CharField(max_length=100)
+    nombres = models.CharField(max_length=100)
+    cedula = models.CharField(max_length=10)
+    manzana = models.CharField(max_length=10, blank=True)
+    numero_lote = models.CharField(max_length=30, blank=True)
+    estado_contrato = models.CharField(max_length=20)
+
+    # Cobros del mes
+    cobrado_cuotas = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cobrado_entrada = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Cuotas que vencían en el mes y seguían impagas al cierre
+    proyeccion_cuotas = models.PositiveIntegerField(default=0)
+    proyeccion_deuda = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Cuotas vencidas hasta el fin del mes e impagas al cierre (solo contratos activos)
+    mora_cuotas = models.PositiveIntegerField(default=0)
+    mora_deuda = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Saldo pendiente total del contrato al cierre
+    saldo_pendiente = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['cierre', 'id']
+        verbose_name = "Contrato en Cierre Mensual"
+        verbose_name_plural = "Contratos en Cierre Mensual"
 
     def __str__(self):
-        return f"{self.tipo} - ${self.monto} ({self.fecha})"
+        return f"{self.cierre} - {self.apellidos} {self.nombres}"
@@ -0,0 +1,117 @@
+"""
+Caché de resultados de reportes (mensual y general).
+
+Cada resultado se guarda con una clave que incluye el reporte, el alcance del
+usuario (todos o un vendedor), el período, los filtros y las "generaciones" de
+los meses involucrados. Las señales de Pago, DetallePago, Cuota y Contrato
+cambian la generación de los meses desde la fecha que tocan hasta hoy (y una
+generación global), así las entradas viejas quedan huérfanas sin tener que borrarlas.
+
+- Períodos cerrados (ya terminaron): dependen solo de sus meses, se guardan sin expiración.
+- Períodos abiertos: dependen además de la generación global y del día de hoy,
+  así solo se recalculan cuando hay un cambio (o cambia el día y corren las moras).
+"""
+import hashlib
+import threading
+import uuid
+from datetime import date
+
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIJO = 'reportes'
+CLAVE_GLOBAL = f'{PREFIJO}:gen:global'
+TIMEOUT_ABIERTO = 60 * 60 * 24
+
+_local = threading.local()
+
+
+def _clave_mes(anio, mes):
+    return f'{PREFIJO}:gen:{anio:04d}-{mes:02d}'
+
+
+def _alcance(user):
+    return 'todos' if user.is_superuser else f'vendedor-{user.id}'
+
+
+def meses_entre(desde, hasta):
+    """Lista de (anio, mes) desde el mes de `desde` hasta el mes de `hasta` (inclusive)."""
+    meses = []
+    anio, mes = desde.year, desde.month
+    while (anio, mes) <= (hasta.year, hasta.month):
+        meses.append((anio, mes))
+        mes += 1
+        if mes > 12:
+            anio, mes = anio + 1, 1
+    return meses
+
+
+# ==========================================
+# INVALIDACIÓN (llamada desde signals.py)
+# ==========================================
+def invalidar_reportes(*fechas):
+    """
+    Marca como modificados los meses desde la fecha más antigua dada hasta el mes
+    actual (y la generación global). Los meses posteriores también cambian: la mora
+    histórica de cada mes incluye las cuotas vencidas antes y su saldo de hoy.
+    El cambio se aplica al confirmar la transacción, una sola vez por clave.
+    """
+    pendientes = getattr(_local, 'pendientes', None)
+    if pendientes is None:
+        pendientes = _local.pendientes = set()
+
+    pendientes.add(CLAVE_GLOBAL)
+    fechas = [f for f in fechas if f]
+    if fechas:
+        hasta = max(max(fechas), date.today())
+        pendientes.update(_clave_mes(anio, mes) for anio, mes in meses_entre(min(fechas), hasta))
+
+    transaction.on_commit(_aplicar_invalidaciones)
+
+
+def _aplicar_invalidaciones():
+    pendientes = getattr(_local, 'pendientes', None)
+    if not pendientes:
+        return
+    _local.pendientes = set()
+    generacion = uuid.uuid4().hex
+    cache.set_many(dict.fromkeys(pendientes, generacion), timeout=None)
+
+
+# ==========================================
+# LECTURA
+# ==========================================
+def _clave_reporte(nombre, user, meses, filtros, cerrado):
+    claves_gen = [_clave_mes(anio, mes) for anio, mes in meses]
+    if not cerrado:
+        claves_gen.append(CLAVE_GLOBAL)
+    generaciones = cache.get_many(claves_gen)
+
+    partes = [nombre, _alcance(user), repr(list(meses)), repr(filtros)]
+    partes += [str(generaciones.get(k, 0)) for k in claves_gen]
+    if not cerrado:
+        partes.append(date.today().isoformat())
+    return f'{PREFIJO}:{nombre}:' + hashlib.md5('|'.join(partes).encode()).hexdigest()
+
+
+def buscar_reporte(nombre, user, meses, filtros, cerrado=False):
+    """Devuelve el resultado vigente en caché, o None si no hay (no calcula nada)."""
+    return cache.get(_clave_reporte(nombre, user, meses, filtros, cerrado))
+
+
+def obtener_reporte(nombre, user, meses, filtros, calcular, cerrado=False, timeout=None):
+    """
+    Devuelve el resultado cacheado del reporte o lo calcula con `calcular()`.
+    - meses: lista de (anio, mes) que cubre el reporte.
+    - filtros: valores adicionales que cambian el resultado (se incluyen en la clave).
+    - cerrado: True si el período ya terminó y el resultado solo depende de esos meses.
+    - timeout: segundos en caché (por defecto: sin expiración si está cerrado, un día si no).
+    """
+    clave = _clave_reporte(nombre, user, meses, filtros, cerrado)
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular()
+        if timeout is None:
+            timeout = None if cerrado else TIMEOUT_ABIERTO
+        cache.set(clave, resultado, timeout=timeout)
+    return resultado
@@ -3,6 +3,7 @@ from decimal import Decimal
 from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
 from django.db import transaction
+from django.db.models import F
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.core.files.base import ContentFile
@@ -10,7 +11,7 @@ from django.core.files.base import ContentFile
 from django.contrib.staticfiles import finders 
 
 from xhtml2pdf import pisa
-from .models import Contrato, Cuota, Pago, ConfiguracionSistema, DetallePago
+from .models import Contrato, Cuota, Pago, ConfiguracionSistema, DetallePago, ResumenCobroMensual
 
 # ==========================================
 # UTILIDAD: CALLBACK UNIVERSAL (WINDOWS/LINUX)
@@ -64,7 +65,9 @@ def generar_tabla_amortizacion(contrato_id, fecha_inicio_pago_str=None):
     saldo_actual = contrato.saldo_a_financiar
     plazo_meses = contrato.numero_cuotas
     
-    if plazo_meses <= 0: return False
+    if plazo_meses <= 0:
+        actualizar_saldos_contrato(contrato.id)
+        return False
         
     cuota_base = round(saldo_actual / plazo_meses, 2)
     lista_cuotas_a_crear = []
@@ -105,6 +108,10 @@ def generar_tabla_amortizacion(contrato_id, fecha_inicio_pago_str=None):
         lista_cuotas_a_crear.append(cuota)
 
     Cuota.objects.bulk_create(lista_cuotas_a_crear)
+    # bulk_create no dispara señales: invalidar los reportes a mano
+    from .reportes_cache import invalidar_reportes
+    invalidar_reportes(fecha_base)
+    actualizar_saldos_contrato(contrato.id)
     return True
 
 # ==========================================
@@ -159,6 +166,10 @@ def actualizar_moras_masivo(contratos_qs):
                 
     if cuotas_a_actualizar:
         Cuota.objects.bulk_update(cuotas_a_actualizar, ['estado', 'valor_mora'])
+        # bulk_update no dispara señales: invalidar los reportes a mano
+        from .reportes_cache import invalidar_reportes
+        invalidar_reportes(*{c.fecha_vencimiento for c in cuotas_a_actualizar})
+        actualizar_saldos_contratos(Contrato.objects.filter(id__in={c.contrato_id for c in cuotas_a_actualizar}))
 
     # Actualizar bandera global de los contratos
     contratos_con_mora = set(Cuota.objects.filter(
@@ -188,6 +199,7 @@ def actualizar_moras_contrato(contrato_id):
         contrato_id=contrato_id,
         estado__in=['PENDIENTE', 'PARCIAL', 'VENCIDO']
     )
+    hubo_cambios = False
 
     for cuota in cuotas_no_pagadas:
         # Si la fecha de vencimiento es MENOR a hoy, YA VENCIÓ.
@@ -198,29 +210,36 @@ def actualizar_moras_contrato(contrato_id):
             # Respetar exención manual de mora
             if cuota.mora_exenta:
                 # Si está exenta, NO se cobra mora
-                cuota.estado = 'PENDIENTE' if cuota.saldo_pendiente > 0 else 'PAGADO'
-                cuota.valor_mora = Decimal('0.00')
-                cuota.save()
-                continue
-            
-            # Calcular Mora Única (Porcentual)
-            mora_calcular = (cuota.valor_capital * porcentaje_mora) / Decimal('100.00')
-            mora_calcular = mora_calcular.quantize(Decimal('0.01'), rounding='ROUND_HALF_UP')
-            
-            # Asegurar mínimo de $0.01 si el porcentaje dio 0 por ser cuota muy pequeña
-            if mora_calcular < Decimal('0.01') and porcentaje_mora > 0:
-                mora_calcular = Decimal('0.01')
+                nuevo_estado = 'PENDIENTE' if cuota.saldo_pendiente > 0 else 'PAGADO'
+            else:
+                # Calcular Mora Única (Porcentual)
+                mora_calcular = (cuota.valor_capital * porcentaje_mora) / Decimal('100.00')
+                mora_calcular = mora_calcular.quantize(Decimal('0.01'), rounding='ROUND_HALF_UP')
+                
+                # Asegurar mínimo de $0.01 si el porcentaje dio 0 por ser cuota muy pequeña
+                if mora_calcular < Decimal('0.01') and porcentaje_mora > 0:
+                    mora_calcular = Decimal('0.01')
 
-            # Actualizar estado y mora - VENCIDO tiene prioridad sobre PARCIAL
-            cuota.estado = 'VENCIDO'
-            cuota.valor_mora = mora_calcular
-            cuota.save()
+                # VENCIDO tiene prioridad sobre PARCIAL
+                nuevo_estado = 'VENCIDO'
+
+            # Solo se guarda si cambió: el detalle del contrato llama a esta función en
+            # cada visita y un save() sin cambios invalida los reportes (signals)
+            if cuota.estado != nuevo_estado or cuota.valor_mora != mora_calcular:
+                cuota.estado = nuevo_estado
+                cuota.valor_mora = mora_calcular
+                cuota.save(update_fields=['estado', 'valor_mora'])
+                hubo_cambios = True
+
+    if hubo_cambios:
+        actualizar_saldos_contrato(contrato_id)
 
     # Actualizar bandera global del contrato
     tiene_mora = Cuota.objects.filter(contrato_id=contrato_id, estado='VENCIDO').exists()
     if contrato.esta_en_mora != tiene_mora:
         contrato.esta_en_mora = tiene_mora
-        contrato.save()
+        # Solo la bandera: `contrato` se leyó antes de actualizar los saldos guardados
+        contrato.save(update_fields=['esta_en_mora'])
 
 # ==========================================
 # 3. PROCESADOR DE PAGOS
@@ -302,7 +321,7 @@ def registrar_pago_cliente(contrato_id, monto, metodo_pago, evidencia_img, usuar
         if falta_por_pagar < Decimal('0.01'):
             cuota.estado = 'PAGADO'
             cuota.fecha_ultimo_pago = fecha_real
-            cuota.save()
+            cuota.save(update_fields=['estado', 'fecha_ultimo_pago'])
             continue
 
         monto_aplicado_a_esta_cuota = Decimal('0.00')
@@ -329,7 +348,7 @@ def registrar_pago_cliente(contrato_id, monto, metodo_pago, evidencia_img, usuar
             cuota.fecha_ultimo_pago = fecha_real 
             dinero_disponible = Decimal('0') 
         
-        cuota.save()
+        cuota.save(update_fields=['valor_pagado', 'estado', 'fecha_ultimo_pago'])
 
         # Registrar detalle del pago
         if monto_aplicado_a_esta_cuota > 0:
@@ -383,7 +402,7 @@ def registrar_pago_cliente(contrato_id, monto, metodo_pago, evidencia_img, usuar
                  cuota_futura.fecha_ultimo_pago = fecha_real
                  dinero_disponible = Decimal('0')
              
-             cuota_futura.save()
+             cuota_futura.save(update_fields=['valor_pagado', 'estado', 'fecha_ultimo_pago'])
              
              if monto_aplicado > 0:
                 DetallePago.objects.create(
@@ -402,6 +421,8 @@ def registrar_pago_cliente(contrato_id, monto, metodo_pago, evidencia_img, usuar
         nuevo_pago.save()
     
     actualizar_moras_contrato(contrato.id)
+    actualizar_saldos_contrato(contrato.id)
+    actualizar_resumen_cobros_contrato(contrato.id)
     return nuevo_pago
 
 @transaction.atomic
@@ -525,8 +546,12 @@ def recalcular_deuda_contrato(contrato_id):
         
         cuota.save(update_fields=['estado'])
             
-    # 5. Actualizar moras (respetando mora_exenta)
+    # 5. Actualizar moras (respetando mora_exenta) y los saldos guardados en el contrato
     actualizar_moras_contrato(contrato.id)
+    actualizar_saldos_contrato(contrato.id)
+
+    # 6. Regenerar el resumen mensual de cobros con las nuevas distribuciones
+    actualizar_resumen_cobros_contrato(contrato.id)
 
 # ==========================================
 # 4. GENERADOR DE PDF
@@ -704,8 +729,8 @@ def generar_recibo_pago_buffer(cuota_id):
     fecha_pago = cuota.fecha_vencimiento
     monto_pagado = cuota.valor_pagado
     
-    # Saldo pendiente global del contrato
-    saldo_pendiente = sum(c.total_a_pagar - c.valor_pagado for c in contrato.cuotas.all())
+    # Saldo pendiente global del contrato (guardado en el contrato)
+    saldo_pendiente = contrato.saldo_pendiente
     
     # Determinar método de pago buscando en pagos recientes
     # Buscamos un pago que coincida con la fecha (aproximación razonable)
@@ -766,8 +791,8 @@ def generar_recibo_transaccion_buffer(pago_id):
     fecha_pago = pago.fecha_pago
     monto_pagado = pago.monto
     
-    # Saldo pendiente global del contrato (al momento actual)
-    saldo_pendiente = sum(c.total_a_pagar - c.valor_pagado for c in contrato.cuotas.all())
+    # Saldo pendiente global del contrato (al momento actual, guardado en el contrato)
+    saldo_pendiente = contrato.saldo_pendiente
     
     # Determinar método de pago y detalles
     metodo_real = 'EFECTIVO'
@@ -818,4 +843,621 @@ def generar_recibo_transaccion_buffer(pago_id):
     HTML(string=html_string, base_url=base_url).write_pdf(result_file)
         
     result_file.seek(0)
-    return result_file
\ No newline at end of file
+    return result_file
+# ==========================================
+# 7. RENDERIZADO DE PDF POR PARTES (REPORTES GRANDES)
+# ==========================================
+def renderizar_pdf_por_partes(template_name, contextos, destino):
+    """
+    Renderiza cada contexto como una parte PDF independiente (xhtml2pdf) en un
+    archivo temporal en disco, y al final une las partes con pypdf escribiendo
+    el resultado en `destino`.
+    Mientras se renderiza solo hay una parte en memoria; la unión lee las partes
+    ya comprimidas desde disco y se borran al terminar.
+    Retorna False si alguna parte no se pudo generar.
+    """
+    import os
+    import tempfile
+    from contextlib import ExitStack
+    from pypdf import PdfWriter
+
+    with tempfile.TemporaryDirectory(prefix='pdf_partes_') as carpeta:
+        rutas = []
+        for numero, contexto in enumerate(contextos):
+            html_string = render_to_string(template_name, contexto)
+            ruta = os.path.join(carpeta, f'parte_{numero:05d}.pdf')
+            with open(ruta, 'wb') as parte:
+                pisa_status = pisa.CreatePDF(html_string, dest=parte, link_callback=link_callback)
+            del html_string
+            if pisa_status.err:
+                return False
+            rutas.append(ruta)
+
+        # Las partes se abren como archivos (no por ruta, que pypdf carga completa en
+        # memoria) y quedan abiertas hasta escribir: el writer lee sus objetos de disco
+        with ExitStack() as abiertos:
+            writer = PdfWriter()
+            for ruta in rutas:
+                writer.append(abiertos.enter_context(open(ruta, 'rb')))
+            writer.write(destino)
+            writer.close()
+    return True
+
+# ==========================================
+# 8. RESUMEN MENSUAL DE COBROS (ROLLUP)
+# ==========================================
+def calcular_resumen_cobros_contrato(contrato):
+    """
+    Agrupa lo cobrado de un contrato por (anio, mes) de fecha_pago, con las mismas
+    reglas que el reporte general:
+    - Entrada: pagos es_entrada; en contratos legacy (valor_entrada > 0 sin pago marcado)
+      el primer pago por id.
+    - Cuotas: de los demás pagos, lo aplicado en sus DetallePago; los pagos legacy sin
+      detalles, por su monto. Capital y mora no se separan: el pago se aplica al total
+      de la cuota.
+    - Cobrado: Pago.monto (incluye saldo a favor no aplicado a cuotas).
+    """
+    from django.db.models import Sum
+
+    pagos = list(Pago.objects.filter(contrato_id=contrato.id).order_by('id'))
+    aplicado_por_pago = dict(
+        DetallePago.objects.filter(pago__contrato_id=contrato.id)
+        .order_by().values('pago_id').annotate(t=Sum('monto_aplicado'))
+        .values_list('pago_id', 't')
+    )
+
+    ids_entradas = {p.id for p in pagos if p.es_entrada}
+    if contrato.valor_entrada > 0 and not ids_entradas and pagos:
+        # Fallback legacy: el primer pago es la entrada
+        ids_entradas.add(pagos[0].id)
+
+    resumen = {}
+    for pago in pagos:
+        fila = resumen.setdefault((pago.fecha_pago.year, pago.fecha_pago.month), {
+            'total_entrada': Decimal('0.00'),
+            'total_cuotas': Decimal('0.00'),
+            'total_cobrado': Decimal('0.00'),
+        })
+        fila['total_cobrado'] += pago.monto
+        if pago.id in ids_entradas:
+            fila['total_entrada'] += pago.monto
+        else:
+            fila['total_cuotas'] += aplicado_por_pago.get(pago.id, pago.monto)
+
+    return resumen
+
+@transaction.atomic
+def actualizar_resumen_cobros_contrato(contrato_id):
+    """
+    Regenera las filas de ResumenCobroMensual del contrato.
+    Se llama dentro de la misma transacción que escribe los pagos.
+    """
+    contrato = Contrato.objects.get(id=contrato_id)
+    resumen = calcular_resumen_cobros_contrato(contrato)
+
+    ResumenCobroMensual.objects.filter(contrato_id=contrato_id).delete()
+    ResumenCobroMensual.objects.bulk_create([
+        ResumenCobroMensual(contrato_id=contrato_id, anio=anio, mes=mes, **totales)
+        for (anio, mes), totales in resumen.items()
+    ])
+
+
+# ==========================================
+# 9. EXPORTACIÓN A HOJAS DE CÁLCULO (STREAMING)
+# ==========================================
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, valor):
+        return valor
+
+
+class _BufferZip:
+    """
+    Destino de escritura no 'seekable' para zipfile.
+    Acumula lo escrito hasta que el generador lo entrega con vaciar().
+    """
+    def __init__(self):
+        self.partes = []
+
+    def write(self, data):
+        self.partes.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        data = b''.join(self.partes)
+        self.partes = []
+        return data
+
+
+def iterar_csv(filas):
+    """Genera el CSV línea por línea a partir de un iterable de listas."""
+    import csv
+    writer = csv.writer(_Eco())
+    yield '\ufeff'  # BOM para que Excel lea los acentos en UTF-8
+    for fila in filas:
+        yield writer.writerow(fila)
+
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_XLSX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{nombre}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _celda_xlsx(valor):
+    import re
+    from xml.sax.saxutils import escape
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    # Quitar caracteres de control que XML no admite
+    texto = escape(re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f]', '', str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def iterar_xlsx(filas, nombre_hoja='Reporte', filas_por_envio=200):
+    """
+    Genera un archivo XLSX (una hoja) a partir de un iterable de listas, sin
+    cargarlo en memoria: el ZIP se escribe a un buffer que se vacía cada
+    `filas_por_envio` filas. Solo usa la librería estándar (zipfile).
+    """
+    import zipfile
+    from xml.sax.saxutils import escape
+
+    buffer = _BufferZip()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _XLSX_CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _XLSX_RELS)
+        zf.writestr('xl/workbook.xml', _XLSX_WORKBOOK.format(nombre=escape(nombre_hoja[:31], {'"': '&quot;'})))
+        zf.writestr('xl/_rels/workbook.xml.rels', _XLSX_WORKBOOK_RELS)
+        yield buffer.vaciar()
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja:
+            hoja.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for i, fila in enumerate(filas, 1):
+                hoja.write(('<row>' + ''.join(_celda_xlsx(v) for v in fila) + '</row>').encode('utf-8'))
+                if i % filas_por_envio == 0:
+                    data = buffer.vaciar()
+                    if data:
+                        yield data
+            hoja.write(b'</sheetData></worksheet>')
+    yield buffer.vaciar()
+
+
+# ==========================================
+# 10. CIERRE MENSUAL (SNAPSHOTS)
+# ==========================================
+@transaction.atomic
+def cerrar_mes(anio, mes, rehacer=False):
+    """
+    Congela el mes (ya terminado) en CierreMensual + CierreMensualCobro + CierreMensualContrato.
+    Si el mes ya estaba cerrado lo devuelve tal cual, salvo que se pida `rehacer`.
+    Retorna (cierre, creado).
+
+    Mora, proyección, saldos y estado de los contratos se toman del estado actual
+    de las cuotas (no hay historial para reconstruirlos a una fecha pasada), por eso
+    solo se puede cerrar el mes recién terminado; los anteriores siguen en vivo.
+    """
+    from django.db.models import Q, F, Sum, DecimalField, ExpressionWrapper
+    from .models import CierreMensual, CierreMensualCobro, CierreMensualContrato
+    from .reportes import calcular_datos_mensuales, deuda_cuotas_por_contrato, dinero
+
+    primer_dia_mes = date(anio, mes, 1)
+    ultimo_dia_mes = primer_dia_mes + relativedelta(months=1) - relativedelta(days=1)
+    mes_anterior = date.today().replace(day=1) - relativedelta(months=1)
+    if ultimo_dia_mes >= date.today():
+        raise ValueError(f"El mes {mes:02d}/{anio} aún no termina; no se puede cerrar.")
+
+    existente = CierreMensual.objects.filter(anio=anio, mes=mes).first()
+    if existente and not rehacer:
+        return existente, False
+    if primer_dia_mes != mes_anterior:
+        raise ValueError(
+            f"Solo se puede cerrar el mes recién terminado ({mes_anterior.month:02d}/{mes_anterior.year}); "
+            f"el cierre de {mes:02d}/{anio} tomaría el estado actual de las cuotas."
+        )
+    if existente:
+        existente.delete()
+
+    # Moras al día antes de congelar los saldos
+    contratos_activos = Contrato.objects.filter(estado='ACTIVO')
+    actualizar_moras_masivo(contratos_activos)
+
+    # Mismo cálculo que el reporte mensual en vivo (toda la cartera)
+    datos = calcular_datos_mensuales(None, mes, anio, False, primer_dia_mes, ultimo_dia_mes)
+    mora = {m['contrato'].id: m for m in datos['mora_historica_lista']}
+    proyeccion = deuda_cuotas_por_contrato(
+        contratos_activos, fecha_vencimiento__gte=primer_dia_mes, fecha_vencimiento__lte=ultimo_dia_mes
+    )
+    saldos = {
+        fila['contrato_id']: dinero(fila['saldo'])
+        for fila in Cuota.objects.order_by().values('contrato_id').annotate(saldo=Sum(ExpressionWrapper(
+            F('valor_capital') + F('valor_mora') - F('valor_pagado'),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )))
+    }
+
+    cierre = CierreMensual.objects.create(
+        anio=anio,
+        mes=mes,
+        total_cobrado=datos['total_cobrado_mes'],
+        total_entradas=datos['total_entradas'],
+        total_ingresos=datos['total_ingresos'],
+        total_mora_historica=datos['total_mora_historica'],
+        ingresos_lotes=(
+            Pago.objects.filter(fecha_pago__gte=primer_dia_mes, fecha_pago__lte=ultimo_dia_mes)
+            .exclude(contrato__estado='DEVOLUCION')
+            .aggregate(t=Sum('monto'))['t'] or Decimal('0.00')
+        ),
+    )
+
+    def _datos_contrato(contrato):
+        lote = contrato.lote
+        return {
+            'contrato': contrato,
+            'vendedor_id': contrato.cliente.vendedor_id,
+            'apellidos': contrato.cliente.apellidos,
+            'nombres': contrato.cliente.nombres,
+            'cedula': contrato.cliente.cedula,
+            'manzana': lote.manzana if lote else '',
+            'numero_lote': lote.numero_lote if lote else '',
+        }
+
+    cobrado = {}
+    cobros = []
+    for orden, item in enumerate(datos['cobros_lista']):
+        contrato = item['contrato']
+        montos = cobrado.setdefault(contrato.id, {'cuotas': Decimal('0.00'), 'entrada': Decimal('0.00')})
+        montos['cuotas'] += item['monto_cuotas']
+        montos['entrada'] += item['monto_entrada']
+        cobros.append(CierreMensualCobro(
+            cierre=cierre,
+            orden=orden,
+            fecha_pago=item['fecha_pago'],
+            metodo_pago=item['metodo'],
+            cuotas_cubiertas=item['cuotas_cubiertas'],
+            es_entrada=item['es_entrada'],
+            monto=item['total_cobrado'],
+            **_datos_contrato(contrato),
+        ))
+    CierreMensualCobro.objects.bulk_create(cobros, batch_size=500)
+
+    contratos = (
+        Contrato.objects.filter(Q(estado='ACTIVO') | Q(id__in=list(cobrado)))
+        .select_related('cliente', 'lote')
+        .order_by('id')
+    )
+    CierreMensualContrato.objects.bulk_create([
+        CierreMensualContrato(
+            cierre=cierre,
+            estado_contrato=contrato.estado,
+            cobrado_cuotas=cobrado.get(contrato.id, {}).get('cuotas', Decimal('0.00')),
+            cobrado_entrada=cobrado.get(contrato.id, {}).get('entrada', Decimal('0.00')),
+            proyeccion_cuotas=proyeccion.get(contrato.id, {}).get('cuotas_count', 0),
+            proyeccion_deuda=proyeccion.get(contrato.id, {}).get('deuda_total', Decimal('0.00')),
+            mora_cuotas=mora.get(contrato.id, {}).get('cuotas_count', 0),
+            mora_deuda=mora.get(contrato.id, {}).get('deuda_total', Decimal('0.00')),
+            saldo_pendiente=saldos.get(contrato.id, Decimal('0.00')),
+            **_datos_contrato(contrato),
+        )
+        for contrato in contratos
+    ], batch_size=500)
+
+    return cierre, True
+
+
+# ==========================================
+# 11. LISTADO DE CONTRATOS (SIN N+1)
+# ==========================================
+def anotar_listado_contratos(contratos):
+    """
+    Prepara el queryset del listado de clientes/contratos para renderizarse con un
+    número fijo de consultas: cliente y lote en el JOIN, lotes M2M prefetch, y los
+    datos de la primera cuota y del pago de entrada como subconsultas (el detalle
+    de la entrada se pide bajo demanda, ver detalle_modal_contrato).
+    """
+    from django.db.models import OuterRef, Subquery
+
+    primera_cuota = Cuota.objects.filter(contrato=OuterRef('pk')).order_by('numero_cuota')
+    # El pago de entrada: el marcado como tal o, en contratos antiguos, el primero registrado
+    pago_entrada = Pago.objects.filter(contrato=OuterRef('pk')).order_by('-es_entrada', 'id')
+
+    return contratos.select_related('cliente', 'lote').prefetch_related('lotes').annotate(
+        primera_cuota_capital=Subquery(primera_cuota.values('valor_capital')[:1]),
+        pago_entrada_metodo=Subquery(pago_entrada.values('metodo_pago')[:1]),
+    )
+
+
+CLIENTES_POR_PAGINA = 25
+ESTADOS_LISTADO = [codigo for codigo, _ in Contrato.ESTADOS_CONTRATO]
+# Orden del listado -> campos (los saldos usan los índices de Contrato con estado)
+ORDENES_LISTADO = {
+    'fecha': ('fecha_contrato', 'id'),
+    'saldo': ('-saldo_pendiente', 'id'),
+    # Sin cuotas pendientes (contratos pagados) al final
+    'vencimiento': (F('proximo_vencimiento').asc(nulls_last=True), 'id'),
+}
+
+
+def filtros_listado_contratos(params, user):
+    """Lee los filtros del listado de clientes desde request.GET (valores inválidos se ignoran)."""
+    def fecha(valor):
+        try:
+            return date.fromisoformat(valor) if valor else None
+        except ValueError:
+            return None
+
+    vendedor = params.get('vendedor', '')
+    estado = params.get('estado', '')
+    mora = params.get('mora', '')
+    orden = params.get('orden', '')
+    return {
+        'q': params.get('q', '').strip()[:100],
+        'estado': estado if estado in ESTADOS_LISTADO else '',
+        'mora': mora if mora in ('en-mora', 'al-dia') else '',
+        # Solo el administrador filtra por vendedor: el resto ya ve únicamente lo suyo
+        'vendedor': int(vendedor) if user.is_superuser and vendedor.isdigit() else None,
+        'desde': fecha(params.get('desde', '')),
+        'hasta': fecha(params.get('hasta', '')),
+        'orden': orden if orden in ORDENES_LISTADO else 'fecha',
+    }
+
+
+def filtrar_listado_contratos(contratos, filtros):
+    """
+    Aplica los filtros del listado en la BD. La búsqueda de texto usa prefijos
+    (cédula, apellidos, nombres) para aprovechar los índices de Cliente: cada
+    palabra debe coincidir con el inicio de alguno de esos campos.
+    """
+    from django.db.models import Q
+
+    for palabra in filtros['q'].split():
+        contratos = contratos.filter(
+            Q(cliente__cedula__startswith=palabra)
+            | Q(cliente__apellidos__istartswith=palabra)
+            | Q(cliente__nombres__istartswith=palabra)
+        )
+    if filtros['estado']:
+        contratos = contratos.filter(estado=filtros['estado'])
+    en_mora = Q(estado='ACTIVO', esta_en_mora=True)
+    if filtros['mora'] == 'en-mora':
+        contratos = contratos.filter(en_mora)
+    elif filtros['mora'] == 'al-dia':
+        contratos = contratos.exclude(en_mora)
+    if filtros['vendedor']:
+        contratos = contratos.filter(cliente__vendedor_id=filtros['vendedor'])
+    if filtros['desde']:
+        contratos = contratos.filter(fecha_contrato__gte=filtros['desde'])
+    if filtros['hasta']:
+        contratos = contratos.filter(fecha_contrato__lte=filtros['hasta'])
+    return contratos.order_by(*ORDENES_LISTADO[filtros['orden']])
+
+
+def detalle_modal_contrato(contrato):
+    """
+    Datos de los modales del listado (foto del lote y pago de entrada), que se piden
+    bajo demanda en vez de renderizar un modal por contrato.
+    """
+    from .imagenes import url_derivado
+
+    lote = contrato.lote_principal
+    pago = Pago.objects.filter(contrato=contrato).order_by('-es_entrada', 'id').first()
+
+    entrada = None
+    if pago and pago.metodo_pago != 'EFECTIVO':
+        comprobante = pago.comprobante_imagen
+        entrada = {
+            'metodo': pago.get_metodo_pago_display(),
+            'monto': f"{pago.monto:.2f}",
+            'observacion': pago.observacion or '',
+            'comprobante_url': comprobante.url if comprobante else None,
+            'comprobante_es_pdf': bool(comprobante) and comprobante.name.lower().endswith('.pdf'),
+        }
+
+    return {
+        'id': contrato.id,
+        'lote': {
+            'titulo': f"Mz. {contrato.manzanas_str} - Lote {contrato.numeros_lotes_str}",
+            'imagen_url': url_derivado(lote.plano, 'full') if lote and lote.plano else None,
+        },
+        'entrada': entrada,
+    }
+
+
+# ==========================================
+# 12. DETALLE DE CONTRATO (UNA PASADA)
+# ==========================================
+def resumen_detalle_contrato(contrato):
+    """
+    Datos del panel de detalle de un contrato con un número fijo de consultas:
+    cuotas, pagos y DetallePago se leen una sola vez y se enlazan en memoria.
+
+    - cuota.detalles_pago: DetallePago aplicados a la cuota.
+    - pago.distribucion: DetallePago del pago (cuotas que cubrió).
+    - pago.cuota_inicial_numero: cuota de menor número que cubrió el pago; en esa
+      cuota el pago es "principal" y en las demás figura como excedente (origen).
+    """
+    cuotas = list(Cuota.objects.filter(contrato=contrato).order_by('numero_cuota'))
+    pagos = list(Pago.objects.filter(contrato=contrato).order_by('-fecha_pago', '-id'))
+
+    cuotas_por_id = {}
+    for cuota in cuotas:
+        cuota.detalles_pago = []
+        cuotas_por_id[cuota.id] = cuota
+    pagos_por_id = {}
+    for pago in pagos:
+        pago.distribucion = []
+        pago.cuota_inicial_numero = None
+        pagos_por_id[pago.id] = pago
+
+    for detalle in DetallePago.objects.filter(pago__contrato=contrato).order_by('id'):
+        cuota = cuotas_por_id.get(detalle.cuota_id)
+        if cuota is None:
+            continue
+        pago = pagos_por_id[detalle.pago_id]
+        # Se enlazan las instancias ya cargadas para que el template no consulte la BD
+        detalle.cuota = cuota
+        detalle.pago = pago
+        cuota.detalles_pago.append(detalle)
+        pago.distribucion.append(detalle)
+        if pago.cuota_inicial_numero is None or cuota.numero_cuota < pago.cuota_inicial_numero:
+            pago.cuota_inicial_numero = cuota.numero_cuota
+
+    total_mora = 0
+    saldo_pendiente_total = 0
+    hay_vencidas = False
+    proxima_cuota = None
+    for cuota in cuotas:
+        if cuota.estado == 'VENCIDO':
+            hay_vencidas = True
+            total_mora += cuota.valor_mora
+        saldo_pendiente_total += cuota.total_a_pagar - cuota.valor_pagado
+        # Próxima a pagar: la primera PENDIENTE o PARCIAL (las vencidas van en el indicador de mora)
+        if proxima_cuota is None and cuota.estado in ('PENDIENTE', 'PARCIAL'):
+            proxima_cuota = cuota
+
+        # "Cuota principal" vs "abastecida" por el excedente de un pago de otra cuota
+        cuota.es_principal_de_algun_pago = False
+        cuota.monto_real_abonado = Decimal('0.00')
+        origenes = set()
+        for detalle in cuota.detalles_pago:
+            if detalle.pago.cuota_inicial_numero == cuota.numero_cuota:
+                cuota.es_principal_de_algun_pago = True
+                cuota.monto_real_abonado += detalle.pago.monto
+            else:
+                origenes.add(detalle.pago.cuota_inicial_numero)
+        cuota.lista_origenes = sorted(origenes)
+
+        # Pagos antiguos sin DetallePago: se muestra lo pagado para no ver $0 en la tabla
+        if cuota.monto_real_abonado == 0 and cuota.valor_pagado > 0:
+            cuota.monto_real_abonado = cuota.valor_pagado
+
+    return {
+        'cuotas': cuotas,
+        'pagos_historial': pagos,
+        'total_mora': total_mora,
+        'hay_vencidas': hay_vencidas,
+        'proxima_cuota': proxima_cuota,
+        'saldo_pendiente_total': saldo_pendiente_total,
+    }
+
+
+# ==========================================
+# 13. SALDOS DEL CONTRATO (DESNORMALIZADOS)
+# ==========================================
+CAMPOS_SALDO_CONTRATO = ('saldo_pendiente', 'total_pagado', 'proximo_vencimiento', 'cuotas_vencidas')
+
+
+def calcular_saldos_contratos(contratos_qs):
+    """
+    {contrato_id: {campo: valor}} con los saldos calculados desde las cuotas, en una
+    consulta agrupada. Un contrato sin cuotas no aparece (saldos en cero).
+    """
+    from django.db.models import Sum, Count, Min, Q, DecimalField, ExpressionWrapper
+    from .reportes import dinero
+
+    filas = (
+        Cuota.objects.filter(contrato__in=contratos_qs.values('id'))
+        .values('contrato_id')
+        .annotate(
+            saldo=Sum(ExpressionWrapper(
+                F('valor_capital') + F('valor_mora') - F('valor_pagado'),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            )),
+            pagado=Sum('valor_pagado'),
+            proximo=Min('fecha_vencimiento', filter=Q(estado__in=['PENDIENTE', 'PARCIAL'])),
+            vencidas=Count('id', filter=Q(estado='VENCIDO')),
+        )
+    )
+    return {
+        fila['contrato_id']: {
+            'saldo_pendiente': dinero(fila['saldo']),
+            'total_pagado': dinero(fila['pagado']),
+            'proximo_vencimiento': fila['proximo'],
+            'cuotas_vencidas': fila['vencidas'],
+        }
+        for fila in filas
+    }
+
+
+def diferencias_saldos_contratos(contratos_qs):
+    """
+    Contratos cuyos saldos guardados no coinciden con sus cuotas:
+    [(contrato, {campo: (guardado, calculado)})].
+    """
+    calculados = calcular_saldos_contratos(contratos_qs)
+    sin_cuotas = {
+        'saldo_pendiente': Decimal('0.00'), 'total_pagado': Decimal('0.00'),
+        'proximo_vencimiento': None, 'cuotas_vencidas': 0,
+    }
+
+    diferencias = []
+    contratos = Contrato.objects.filter(id__in=contratos_qs.values('id')).only('id', *CAMPOS_SALDO_CONTRATO)
+    for contrato in contratos.order_by('id'):
+        valores = calculados.get(contrato.id, sin_cuotas)
+        distintos = {
+            campo: (getattr(contrato, campo), valor)
+            for campo, valor in valores.items()
+            if getattr(contrato, campo) != valor
+        }
+        if distintos:
+            diferencias.append((contrato, distintos))
+    return diferencias
+
+
+def guardar_saldos_contratos(diferencias):
+    """Escribe los valores calculados de diferencias_saldos_contratos()."""
+    contratos = []
+    for contrato, distintos in diferencias:
+        for campo, (_, calculado) in distintos.items():
+            setattr(contrato, campo, calculado)
+        contratos.append(contrato)
+    # bulk_update no dispara señales: los reportes ya se invalidan al cambiar las cuotas
+    Contrato.objects.bulk_update(contratos, CAMPOS_SALDO_CONTRATO, batch_size=500)
+
+
+def actualizar_saldos_contratos(contratos_qs):
+    """
+    Recalcula los saldos guardados en Contrato desde sus cuotas. Solo escribe los
+    contratos que cambiaron; devuelve cuántos fueron.
+    Se llama en la misma transacción que modifica las cuotas.
+    """
+    diferencias = diferencias_saldos_contratos(contratos_qs)
+    if diferencias:
+        guardar_saldos_contratos(diferencias)
+    return len(diferencias)
+
+
+def actualizar_saldos_contrato(contrato_id):
+    return actualizar_saldos_contratos(Contrato.objects.filter(id=contrato_id))
@@ -1,7 +1,10 @@
 
 from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import LogActividad
+from .models import LogActividad, Pago, DetallePago, Cuota, Contrato, Lote, ConfiguracionSistema
+from .reportes_cache import invalidar_reportes
+from .imagenes import marcar_imagenes_nuevas, procesar_imagenes_nuevas, borrar_derivados_eliminados
 
 def get_client_ip(request):
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -30,3 +33,79 @@ def log_user_login_failed(sender, credentials, request, **kwargs):
         detalle=f"Usuario intentado: {username}. IP: {ip}",
         ip_address=ip
     )
+
+
+# ==========================================
+# INVALIDACIÓN DE CACHÉ DE REPORTES
+# ==========================================
+@receiver(pre_save, sender=Pago)
+def recordar_fecha_pago_anterior(sender, instance, update_fields=None, **kwargs):
+    # Si se cambia la fecha de un pago, el mes anterior también debe invalidarse
+    instance._fecha_pago_anterior = None
+    if instance.pk and (update_fields is None or 'fecha_pago' in update_fields):
+        instance._fecha_pago_anterior = (
+            Pago.objects.filter(pk=instance.pk).values_list('fecha_pago', flat=True).first()
+        )
+
+@receiver(post_save, sender=Pago)
+@receiver(post_delete, sender=Pago)
+def invalidar_reportes_pago(sender, instance, **kwargs):
+    invalidar_reportes(instance.fecha_pago, getattr(instance, '_fecha_pago_anterior', None))
+
+@receiver(post_save, sender=DetallePago)
+@receiver(post_delete, sender=DetallePago)
+def invalidar_reportes_detalle_pago(sender, instance, **kwargs):
+    if DetallePago.pago.is_cached(instance):
+        fecha_pago = instance.pago.fecha_pago
+    else:
+        fecha_pago = Pago.objects.filter(pk=instance.pago_id).values_list('fecha_pago', flat=True).first()
+    invalidar_reportes(fecha_pago)
+
+@receiver(pre_save, sender=Cuota)
+def recordar_fecha_vencimiento_anterior(sender, instance, update_fields=None, **kwargs):
+    # Al reprogramar una cuota, el mes de su vencimiento anterior también debe invalidarse
+    instance._fecha_vencimiento_anterior = None
+    if instance.pk and (update_fields is None or 'fecha_vencimiento' in update_fields):
+        instance._fecha_vencimiento_anterior = (
+            Cuota.objects.filter(pk=instance.pk).values_list('fecha_vencimiento', flat=True).first()
+        )
+
+@receiver(post_save, sender=Cuota)
+@receiver(post_delete, sender=Cuota)
+def invalidar_reportes_cuota(sender, instance, **kwargs):
+    invalidar_reportes(instance.fecha_vencimiento, getattr(instance, '_fecha_vencimiento_anterior', None))
+
+@receiver(post_save, sender=Contrato)
+@receiver(post_delete, sender=Contrato)
+def invalidar_reportes_contrato(sender, instance, **kwargs):
+    invalidar_reportes(instance.fecha_contrato)
+
+@receiver(post_save, sender=Lote)
+@receiver(post_delete, sender=Lote)
+def invalidar_reportes_lote(sender, instance, **kwargs):
+    # Los lotes no tienen mes: solo afectan a los reportes abiertos (resumen por manzana)
+    invalidar_reportes()
+
+@receiver(m2m_changed, sender=Contrato.lotes.through)
+def invalidar_reportes_lotes_contrato(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidar_reportes()
+
+
+# ==========================================
+# DERIVADOS DE IMÁGENES (thumb / card / full)
+# ==========================================
+@receiver(pre_save, sender=Lote)
+@receiver(pre_save, sender=ConfiguracionSistema)
+def recordar_imagenes_nuevas(sender, instance, **kwargs):
+    marcar_imagenes_nuevas(instance)
+
+@receiver(post_save, sender=Lote)
+@receiver(post_save, sender=ConfiguracionSistema)
+def generar_derivados_imagenes(sender, instance, **kwargs):
+    procesar_imagenes_nuevas(instance)
+
+@receiver(post_delete, sender=Lote)
+@receiver(post_delete, sender=ConfiguracionSistema)
+def borrar_derivados_imagenes(sender, instance, **kwargs):
+    borrar_derivados_eliminados(instance)
@@ -0,0 +1,29 @@
+from django import template
+
+from Aplicaciones.sbr_app.imagenes import url_derivado, srcset_derivados
+
+register = template.Library()
+
+@register.filter
+def derivado(archivo, tamano='card'):
+    """
+    URL de un derivado JPEG de la imagen (thumb, card o full).
+    Ejemplo: {{ lote.foto_lista|derivado:"thumb" }}
+    """
+    return url_derivado(archivo, tamano, 'jpg')
+
+@register.filter
+def derivado_webp(archivo, tamano='card'):
+    """
+    URL de un derivado WebP de la imagen.
+    Ejemplo: {{ lote.foto_lista|derivado_webp:"card" }}
+    """
+    return url_derivado(archivo, tamano, 'webp')
+
+@register.simple_tag
+def srcset(archivo, formato='jpg'):
+    """
+    Atributo srcset con todos los derivados disponibles.
+    Ejemplo: <img src="{{ lote.foto_lista|derivado }}" srcset="{% srcset lote.foto_lista %}" sizes="...">
+    """
+    return srcset_derivados(archivo, formato)
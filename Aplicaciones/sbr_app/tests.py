@@ -0,0 +1,481 @@
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from .models import Cliente, Lote, Contrato, Cuota, Pago
+from .reportes import construir_reporte_general, iterar_filas_reporte_general, meses_reporte
+from .services import (
+    generar_tabla_amortizacion,
+    actualizar_moras_contrato,
+    calcular_saldos_contratos,
+    registrar_pago_cliente,
+    actualizar_resumen_cobros_contrato,
+    cerrar_mes,
+)
+
+
+# ==========================================
+# DATOS DE PRUEBA
+# ==========================================
+def crear_vendedor(username='vendedor'):
+    return User.objects.create_user(username=username, password='clave-de-prueba')
+
+
+def crear_contrato(vendedor, numero_lote, precio=Decimal('1200.00'), entrada=Decimal('200.00'),
+                   numero_cuotas=6, fecha_contrato=None, estado='ACTIVO'):
+    """Contrato con un lote y su cliente (sin cuotas: ver generar_tabla_amortizacion)."""
+    fecha_contrato = fecha_contrato or date.today() - relativedelta(months=3)
+    cliente = Cliente.objects.create(
+        vendedor=vendedor, cedula=f'09{numero_lote:08d}', nombres='Ana', apellidos=f'Prueba {numero_lote}',
+        celular='0999999999', direccion='Dirección de prueba',
+    )
+    lote = Lote.objects.create(
+        manzana='A', numero_lote=str(numero_lote), dimensiones='10x20m',
+        precio_contado=precio, estado='VENDIDO',
+    )
+    contrato = Contrato.objects.create(
+        cliente=cliente, lote=lote, fecha_contrato=fecha_contrato,
+        precio_venta_final=precio, valor_entrada=entrada, saldo_a_financiar=precio - entrada,
+        numero_cuotas=numero_cuotas, estado=estado,
+    )
+    contrato.lotes.add(lote)
+    return contrato
+
+
+# ==========================================
+# SALDOS GUARDADOS EN EL CONTRATO
+# ==========================================
+class SaldosContratoTests(TestCase):
+    def setUp(self):
+        self.vendedor = crear_vendedor()
+        self.contrato = crear_contrato(self.vendedor, 1)
+        # Cuotas 1 y 2 ya vencidas, el resto a futuro
+        inicio = date.today() - relativedelta(months=2)
+        generar_tabla_amortizacion(self.contrato.id, inicio.strftime('%Y-%m-%d'))
+
+    def assertSaldosAlDia(self, contrato_id):
+        contrato = Contrato.objects.get(pk=contrato_id)
+        calculados = calcular_saldos_contratos(Contrato.objects.filter(pk=contrato_id))[contrato_id]
+        for campo, valor in calculados.items():
+            self.assertEqual(getattr(contrato, campo), valor, campo)
+
+    def test_saldos_al_dia_tras_cambiar_la_mora(self):
+        self.assertSaldosAlDia(self.contrato.id)
+
+        # La bandera esta_en_mora cambia en la misma llamada que actualiza los saldos
+        actualizar_moras_contrato(self.contrato.id)
+
+        contrato = Contrato.objects.get(pk=self.contrato.id)
+        self.assertTrue(contrato.esta_en_mora)
+        self.assertEqual(contrato.cuotas_vencidas, 2)
+        self.assertGreater(contrato.saldo_pendiente, self.contrato.saldo_a_financiar)
+        self.assertSaldosAlDia(self.contrato.id)
+
+    def test_no_se_cierra_un_contrato_con_mora_aunque_el_saldo_guardado_este_viejo(self):
+        actualizar_moras_contrato(self.contrato.id)
+        # Pagar todo el capital a mano: queda solo la mora pendiente
+        for cuota in Cuota.objects.filter(contrato=self.contrato):
+            cuota.valor_pagado = cuota.valor_capital
+            cuota.save()
+        Contrato.objects.filter(pk=self.contrato.id).update(saldo_pendiente=0)
+
+        self.client.force_login(User.objects.create_superuser('admin', password='clave-de-prueba'))
+        self.client.post(f'/contrato/{self.contrato.id}/cerrar/')
+
+        contrato = Contrato.objects.get(pk=self.contrato.id)
+        self.assertEqual(contrato.estado, 'ACTIVO')
+        self.assertGreater(contrato.saldo_pendiente, 0)
+
+
+# ==========================================
+# REPORTE GENERAL (AGREGADOS SQL vs CÁLCULO POR CONTRATO)
+# ==========================================
+def reporte_general_por_contrato(user, desde, hasta, solo_activos):
+    """
+    Cálculo original del reporte general, contrato por contrato (antes de las
+    consultas agrupadas). Se conserva aquí como referencia de los resultados.
+    """
+    meses = meses_reporte(desde, hasta)
+    contratos_qs = Contrato.objects.order_by('id')
+    if not user.is_superuser:
+        contratos_qs = contratos_qs.filter(cliente__vendedor=user)
+    if solo_activos:
+        contratos_qs = contratos_qs.filter(estado='ACTIVO')
+
+    filas = {}
+    totales_mensuales = [Decimal('0.00') for _ in meses]
+    total_general = total_cuotas = total_vtotal = total_entrada = total_saldo = Decimal('0.00')
+
+    for contrato in contratos_qs:
+        actualizar_moras_contrato(contrato.id)
+        es_devolucion = contrato.estado == 'DEVOLUCION'
+        total_vtotal += contrato.precio_venta_final or Decimal('0.00')
+        total_entrada += contrato.valor_entrada or Decimal('0.00')
+
+        primera_cuota = contrato.cuotas.first()
+        if primera_cuota:
+            total_cuotas += primera_cuota.valor_capital
+
+        fila = {
+            'primera_cuota_capital': primera_cuota.valor_capital if primera_cuota else None,
+            'saldo_pendiente': sum((c.total_a_pagar - c.valor_pagado for c in contrato.cuotas.all()), Decimal('0.00')),
+            'total_pagado': contrato.valor_entrada or Decimal('0.00'),
+            'pagos_mensuales': [Decimal('0.00')] * len(meses),
+        }
+
+        ids_entradas = set(contrato.pago_set.filter(es_entrada=True).values_list('id', flat=True))
+        if contrato.valor_entrada > 0 and not ids_entradas:
+            primer_pago = contrato.pago_set.order_by('id').first()
+            if primer_pago:
+                ids_entradas.add(primer_pago.id)
+
+        for pago in contrato.pago_set.all():
+            if pago.id in ids_entradas:
+                continue
+            detalles = pago.detalles.all()
+            montos = [d.monto_aplicado for d in detalles] if detalles.exists() else [pago.monto]
+            for monto in montos:
+                for i, mes in enumerate(meses):
+                    mes_inicio = date(mes['year'], mes['month'], 1)
+                    mes_fin = mes_inicio + relativedelta(months=1) - relativedelta(days=1)
+                    if mes_inicio <= pago.fecha_pago <= mes_fin:
+                        fila['pagos_mensuales'][i] += monto
+                        totales_mensuales[i] += -monto if es_devolucion else monto
+                        break
+                fila['total_pagado'] += monto
+
+        total_general += -fila['total_pagado'] if es_devolucion else fila['total_pagado']
+        total_saldo += fila['saldo_pendiente']
+        filas[contrato.id] = fila
+
+    return {
+        'filas': filas,
+        'totales_mensuales': totales_mensuales,
+        'total_general': total_general,
+        'total_cuotas': total_cuotas,
+        'total_vtotal': total_vtotal,
+        'total_entrada': total_entrada,
+        'total_saldo': total_saldo,
+    }
+
+
+class ReporteGeneralTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='clave-de-prueba')
+        cls.vendedor = crear_vendedor()
+        otro_vendedor = crear_vendedor('otro')
+        inicio = '2025-02-10'
+
+        def pagar(contrato, fecha, monto):
+            registrar_pago_cliente(contrato.id, Decimal(monto), 'EFECTIVO', None, cls.vendedor, fecha_pago=fecha)
+
+        def pago_sin_detalles(contrato, fecha, monto, es_entrada=False):
+            Pago.objects.create(contrato=contrato, fecha_pago=fecha, monto=Decimal(monto),
+                                metodo_pago='EFECTIVO', es_entrada=es_entrada)
+            actualizar_resumen_cobros_contrato(contrato.id)
+
+        # Entrada marcada, pagos completos, que cubren varias cuotas y parciales
+        normal = crear_contrato(cls.vendedor, 1, fecha_contrato=date(2025, 1, 10))
+        generar_tabla_amortizacion(normal.id, inicio)
+        pago_sin_detalles(normal, date(2025, 1, 10), '200.00', es_entrada=True)
+        pagar(normal, date(2025, 2, 10), '166.67')
+        pagar(normal, date(2025, 3, 15), '400.00')
+        pagar(normal, date(2025, 5, 1), '50.00')
+
+        # Entrada legacy (sin marca): el primer pago, sin detalles, es la entrada;
+        # después un pago legacy de cuota sin DetallePago
+        legacy = crear_contrato(cls.vendedor, 2, entrada=Decimal('300.00'), fecha_contrato=date(2025, 1, 5))
+        generar_tabla_amortizacion(legacy.id, inicio)
+        pago_sin_detalles(legacy, date(2025, 1, 5), '300.00')
+        pago_sin_detalles(legacy, date(2025, 2, 20), '150.00')
+        pagar(legacy, date(2025, 4, 10), '200.00')
+
+        # Entrada legacy cuyo primer pago sí se distribuyó en cuotas (se descuenta igual)
+        legacy_detalles = crear_contrato(cls.vendedor, 3, entrada=Decimal('100.00'), fecha_contrato=date(2025, 1, 20))
+        generar_tabla_amortizacion(legacy_detalles.id, inicio)
+        pagar(legacy_detalles, date(2025, 1, 20), '250.00')
+        pagar(legacy_detalles, date(2025, 3, 20), '100.00')
+
+        # Devolución: resta en los totales
+        devolucion = crear_contrato(cls.vendedor, 4, fecha_contrato=date(2025, 1, 15))
+        generar_tabla_amortizacion(devolucion.id, inicio)
+        pago_sin_detalles(devolucion, date(2025, 1, 15), '200.00', es_entrada=True)
+        pagar(devolucion, date(2025, 2, 10), '300.00')
+        Contrato.objects.filter(pk=devolucion.id).update(estado='DEVOLUCION')
+
+        # Otro vendedor, cancelado, sin entrada y solo con un pago legacy
+        cancelado = crear_contrato(otro_vendedor, 5, entrada=Decimal('0.00'), fecha_contrato=date(2025, 2, 1))
+        generar_tabla_amortizacion(cancelado.id, inicio)
+        pago_sin_detalles(cancelado, date(2025, 3, 3), '80.00')
+        Contrato.objects.filter(pk=cancelado.id).update(estado='CANCELADO')
+
+    def assertReporteIgual(self, user, desde, hasta, solo_activos):
+        esperado = reporte_general_por_contrato(user, desde, hasta, solo_activos)
+        reporte = construir_reporte_general(user, desde, hasta, solo_activos)
+
+        self.assertEqual([f.contrato_id for f in reporte.filas], sorted(esperado['filas']))
+        for fila in reporte.filas:
+            original = esperado['filas'][fila.contrato_id]
+            for campo, valor in original.items():
+                self.assertEqual(getattr(fila, campo), valor, f"Contrato #{fila.contrato_id}: {campo}")
+        for campo in ('totales_mensuales', 'total_general', 'total_cuotas', 'total_vtotal',
+                      'total_entrada', 'total_saldo'):
+            self.assertEqual(getattr(reporte, campo), esperado[campo], campo)
+
+    def test_igual_al_calculo_por_contrato(self):
+        rangos = [
+            (date(2025, 1, 1), date(2025, 12, 31)),
+            (date(2025, 3, 1), date(2025, 4, 30)),
+        ]
+        for user in (self.admin, self.vendedor):
+            for desde, hasta in rangos:
+                for solo_activos in (False, True):
+                    with self.subTest(user=user.username, desde=desde, hasta=hasta, solo_activos=solo_activos):
+                        self.assertReporteIgual(user, desde, hasta, solo_activos)
+
+    def test_resumen_cobros_igual_al_reporte(self):
+        from .models import ResumenCobroMensual
+
+        desde, hasta = date(2025, 1, 1), date(2025, 12, 31)
+        meses = meses_reporte(desde, hasta)
+        esperado = reporte_general_por_contrato(self.admin, desde, hasta, False)
+        reporte = construir_reporte_general(self.admin, desde, hasta, False)
+
+        for fila in reporte.filas:
+            resumenes = ResumenCobroMensual.objects.filter(contrato_id=fila.contrato_id)
+            cuotas = {(r.anio, r.mes): r.total_cuotas for r in resumenes}
+            with self.subTest(contrato=fila.contrato_id):
+                self.assertEqual(
+                    [cuotas.get((m['year'], m['month']), Decimal('0.00')) for m in meses],
+                    esperado['filas'][fila.contrato_id]['pagos_mensuales'],
+                )
+                self.assertEqual(fila.valor_entrada + sum(cuotas.values(), Decimal('0.00')), fila.total_pagado)
+                self.assertEqual(
+                    sum((r.total_cobrado for r in resumenes), Decimal('0.00')),
+                    sum(Pago.objects.filter(contrato_id=fila.contrato_id).values_list('monto', flat=True), Decimal('0.00')),
+                )
+
+    def test_por_bloques_actualiza_moras_de_cada_bloque(self):
+        desde, hasta = date(2025, 1, 1), date(2025, 12, 31)
+        completo = construir_reporte_general(self.admin, desde, hasta, False).filas
+        Cuota.objects.filter(estado='VENCIDO').update(estado='PENDIENTE', valor_mora=Decimal('0.00'))
+
+        filas = iterar_filas_reporte_general(self.admin, desde, hasta, False, contratos_por_bloque=1)
+        primera = next(filas)
+        vencidas = Cuota.objects.filter(estado='VENCIDO')
+        self.assertTrue(vencidas.filter(contrato_id=primera.contrato_id).exists())
+        self.assertFalse(vencidas.exclude(contrato_id=primera.contrato_id).exists())
+
+        self.assertEqual([primera, *filas], completo)
+
+    def test_cubre_los_casos_legacy(self):
+        # Los datos de prueba deben incluir pagos sin DetallePago además de la entrada
+        sin_detalles = Pago.objects.filter(es_entrada=False, detalles__isnull=True)
+        self.assertGreaterEqual(sin_detalles.count(), 3)
+        self.assertTrue(Contrato.objects.filter(estado='DEVOLUCION').exists())
+
+
+# ==========================================
+# INVALIDACIÓN DE CACHÉ DE REPORTES
+# ==========================================
+class InvalidarReportesTests(TestCase):
+    def setUp(self):
+        self.vendedor = crear_vendedor()
+        # Los cambios pendientes se aplican antes de llenar la caché de la prueba
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contrato = crear_contrato(self.vendedor, 1, fecha_contrato=date(2025, 1, 10))
+            generar_tabla_amortizacion(self.contrato.id, '2025-02-10')
+            actualizar_moras_contrato(self.contrato.id)
+
+    def cachear(self, *meses):
+        from .reportes_cache import obtener_reporte
+        for mes in meses:
+            obtener_reporte('prueba', self.vendedor, [mes], (), lambda: 'calculado', cerrado=True)
+
+    def en_cache(self, mes):
+        from .reportes_cache import buscar_reporte
+        return buscar_reporte('prueba', self.vendedor, [mes], (), cerrado=True) is not None
+
+    def test_reprogramar_cuota_invalida_ambos_meses(self):
+        self.cachear((2025, 1), (2025, 2), (2025, 9))
+
+        cuota = self.contrato.cuotas.get(numero_cuota=1)
+        cuota.fecha_vencimiento = date(2025, 9, 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            cuota.save()
+
+        self.assertTrue(self.en_cache((2025, 1)))
+        self.assertFalse(self.en_cache((2025, 2)))
+        self.assertFalse(self.en_cache((2025, 9)))
+
+    def test_pago_de_cuota_antigua_invalida_los_meses_siguientes(self):
+        # La mora histórica de cada mes posterior incluye la cuota vencida en febrero
+        self.cachear((2025, 1), (2025, 3), (2025, 6))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_pago_cliente(self.contrato.id, Decimal('50.00'), 'EFECTIVO', None, self.vendedor)
+
+        self.assertTrue(self.en_cache((2025, 1)))
+        self.assertFalse(self.en_cache((2025, 3)))
+        self.assertFalse(self.en_cache((2025, 6)))
+
+    def test_devolucion_invalida_los_meses_desde_el_contrato(self):
+        self.cachear((2024, 12), (2025, 6))
+
+        self.contrato.estado = 'DEVOLUCION'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contrato.save(update_fields=['estado'])
+
+        self.assertTrue(self.en_cache((2024, 12)))
+        self.assertFalse(self.en_cache((2025, 6)))
+
+    def test_tabla_nueva_invalida_sus_meses(self):
+        # bulk_create no dispara señales
+        with self.captureOnCommitCallbacks(execute=True):
+            contrato = crear_contrato(self.vendedor, 2, fecha_contrato=date(2024, 12, 1))
+        self.cachear((2025, 1), (2025, 4))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            generar_tabla_amortizacion(contrato.id, '2025-04-10')
+
+        self.assertTrue(self.en_cache((2025, 1)))
+        self.assertFalse(self.en_cache((2025, 4)))
+
+
+# ==========================================
+# MOVIMIENTOS DE CAJA
+# ==========================================
+class RegistrarMovimientoTests(TestCase):
+    def setUp(self):
+        self.client.force_login(crear_vendedor())
+
+    def registrar(self, tipo, monto):
+        return self.client.post('/caja/registrar/', {
+            'tipo': tipo, 'monto': monto, 'fecha': date.today().isoformat(), 'descripcion': 'Prueba',
+        })
+
+    def test_gasto_sin_saldo_se_rechaza(self):
+        from Aplicaciones.sbr_gestor.models import Transaccion
+        from Aplicaciones.sbr_gestor.services import obtener_saldo_general
+
+        self.registrar('INGRESO', '100.00')
+        self.registrar('GASTO', '150.00')
+        self.registrar('GASTO', '60.00')
+
+        self.assertEqual(list(Transaccion.objects.order_by('id').values_list('tipo', 'valor')),
+                         [('INGRESO', Decimal('100.00')), ('GASTO', Decimal('60.00'))])
+        self.assertEqual(obtener_saldo_general().saldo, Decimal('40.00'))
+
+
+# ==========================================
+# CIERRE MENSUAL
+# ==========================================
+class CierreMensualTests(TestCase):
+    def setUp(self):
+        self.mes_anterior = date.today().replace(day=1) - relativedelta(months=1)
+        self.contrato = crear_contrato(crear_vendedor(), 1, fecha_contrato=self.mes_anterior - relativedelta(months=6))
+        generar_tabla_amortizacion(self.contrato.id, (self.mes_anterior - relativedelta(months=5)).strftime('%Y-%m-%d'))
+
+    def test_cierra_el_mes_recien_terminado(self):
+        cierre, creado = cerrar_mes(self.mes_anterior.year, self.mes_anterior.month)
+        self.assertTrue(creado)
+        self.assertTrue(cierre.contratos.filter(contrato=self.contrato).exists())
+
+        self.assertEqual(cerrar_mes(self.mes_anterior.year, self.mes_anterior.month), (cierre, False))
+
+    def test_no_cierra_meses_anteriores_con_el_estado_de_hoy(self):
+        from .models import CierreMensual
+
+        antiguo = self.mes_anterior - relativedelta(months=3)
+        with self.assertRaises(ValueError):
+            cerrar_mes(antiguo.year, antiguo.month)
+        self.assertFalse(CierreMensual.objects.exists())
+
+    def test_comando_sin_mes_no_rellena_el_historial(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from .models import CierreMensual
+
+        call_command('cierre_mensual', stdout=StringIO())
+        self.assertEqual(list(CierreMensual.objects.values_list('anio', 'mes')),
+                         [(self.mes_anterior.year, self.mes_anterior.month)])
+
+
+# ==========================================
+# DERIVADOS DE IMÁGENES
+# ==========================================
+def imagen_png(nombre, color):
+    from io import BytesIO
+    from PIL import Image
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    buffer = BytesIO()
+    Image.new('RGB', (40, 30), color).save(buffer, format='PNG')
+    return SimpleUploadedFile(nombre, buffer.getvalue(), content_type='image/png')
+
+
+class DerivadosImagenesTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        configuracion = override_settings(MEDIA_ROOT=self.media.name)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lote = Lote.objects.create(
+                manzana='A', numero_lote='1', dimensiones='10x20m', precio_contado=Decimal('10000.00'),
+                foto_lista=imagen_png('portada.png', 'red'),
+            )
+
+    def existe(self, nombre):
+        return self.lote.foto_lista.storage.exists(nombre)
+
+    def test_urls_sin_consultar_el_storage(self):
+        from unittest import mock
+        from .imagenes import ruta_derivado, srcset_derivados, url_derivado
+
+        lote = Lote.objects.get(pk=self.lote.pk)
+        self.assertTrue(lote.foto_lista_derivados)
+        with mock.patch('django.core.files.storage.FileSystemStorage.exists', side_effect=AssertionError):
+            self.assertTrue(url_derivado(lote.foto_lista, 'thumb', 'webp').endswith(
+                ruta_derivado(lote.foto_lista.name, 'thumb', 'webp')))
+            self.assertEqual(len(srcset_derivados(lote.foto_lista).split(', ')), 3)
+            # Sin derivados se usa el original
+            self.assertFalse(lote.plano_derivados)
+            lote.plano = lote.foto_lista.name
+            self.assertEqual(url_derivado(lote.plano), lote.plano.url)
+
+    def test_reemplazar_y_borrar_elimina_los_derivados(self):
+        from .imagenes import ruta_derivado
+
+        anterior = ruta_derivado(self.lote.foto_lista.name, 'card', 'jpg')
+        self.assertTrue(self.existe(anterior))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lote.foto_lista = imagen_png('portada.png', 'blue')
+            self.lote.save()
+        nuevo = ruta_derivado(self.lote.foto_lista.name, 'card', 'jpg')
+        self.assertFalse(self.existe(anterior))
+        self.assertTrue(self.existe(nuevo))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lote.delete()
+        self.assertFalse(self.existe(nuevo))
+
+    def test_quitar_la_imagen_elimina_los_derivados(self):
+        from .imagenes import ruta_derivado
+
+        derivado = ruta_derivado(self.lote.foto_lista.name, 'thumb', 'webp')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lote.foto_lista = None
+            self.lote.save()
+        self.assertFalse(self.existe(derivado))
+        self.assertFalse(Lote.objects.get(pk=self.lote.pk).foto_lista_derivados)
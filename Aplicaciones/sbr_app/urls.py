@@ -15,6 +15,7 @@ urlpatterns = [
     
     # Listado de mis clientes (Vendedor ve los suyos, Admin ve todos)
     path('clientes/', views.lista_clientes_view, name='lista_clientes'),
+    path('clientes/contrato/<int:pk>/modal/json/', views.contrato_modal_json_view, name='contrato_modal_json'),
     
     # Detalle profundo: Tabla de amortización, estado de cuenta
     path('contrato/<int:pk>/detalle/', views.detalle_contrato_view, name='detalle_contrato'),
@@ -54,6 +55,14 @@ urlpatterns = [
     path('reportes/mensual/pdf/', views.reporte_mensual_pdf_view, name='reporte_mensual_pdf'),
     path('reportes/general/', views.reporte_general_view, name='reporte_general'),
     path('reportes/general/pdf/', views.reporte_general_pdf_view, name='reporte_general_pdf'),
+    path('reportes/general/csv/', views.reporte_general_csv_view, name='reporte_general_csv'),
+    path('reportes/general/xlsx/', views.reporte_general_xlsx_view, name='reporte_general_xlsx'),
+    path('reportes/cartera/', views.reporte_cartera_view, name='reporte_cartera'),
+    path('reportes/cartera/json/', views.reporte_cartera_json_view, name='reporte_cartera_json'),
+    path('reportes/manzanas/', views.reporte_manzanas_view, name='reporte_manzanas'),
+    path('reportes/vendedores/', views.reporte_vendedores_view, name='reporte_vendedores'),
+    path('reportes/vendedores/csv/', views.reporte_vendedores_csv_view, name='reporte_vendedores_csv'),
+    path('reportes/proyeccion/json/', views.proyeccion_cobros_json_view, name='proyeccion_cobros_json'),
 
     path('lotes/', views.gestion_lotes_view, name='gestion_lotes'),
     path('lotes/crear/', views.crear_lote_view, name='crear_lote'),
@@ -1,7 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Q
+from django.db.models import Sum, Q, OuterRef, Subquery
 from django.http import FileResponse, HttpResponse
 from datetime import date
 from decimal import Decimal, ROUND_HALF_UP
@@ -12,7 +12,7 @@ import base64
 import os
 from django.contrib.staticfiles import finders
 # Importamos Modelos
-from .models import Cliente, Lote, Contrato, Pago, Cuota, ConfiguracionSistema, DetallePago, MovimientoCaja
+from .models import Cliente, Lote, Contrato, Pago, Cuota, ConfiguracionSistema, DetallePago
 
 # Importamos Servicios (La lógica pesada)
 from .services import (
@@ -20,7 +20,14 @@ from .services import (
     registrar_pago_cliente, 
     generar_pdf_contrato,
     generar_recibo_entrada_buffer,
-    generar_recibo_pago_buffer
+    generar_recibo_pago_buffer,
+    actualizar_resumen_cobros_contrato
+)
+from .reportes import (
+    dinero,
+    parametros_reporte_general,
+    obtener_reporte_general,
+    filas_reporte_general,
 )
 
 # ==========================================
@@ -148,6 +155,7 @@ def crear_venta_view(request):
                         registrado_por=request.user,
                         es_entrada=True
                     )
+                    actualizar_resumen_cobros_contrato(contrato.id)
 
                 # Marcar lotes como vendidos
                 for l in lotes_objs:
@@ -184,142 +192,106 @@ def crear_venta_view(request):
 # ==========================================
 @login_required
 def lista_clientes_view(request):
+    from django.core.paginator import Paginator
+    from django.contrib.auth.models import User
+    from .services import (
+        actualizar_moras_masivo, anotar_listado_contratos, filtros_listado_contratos,
+        filtrar_listado_contratos, CLIENTES_POR_PAGINA,
+    )
+
     # Filtro de seguridad: Vendedor solo ve lo suyo
     if request.user.is_superuser:
-        clientes = Cliente.objects.all()
         contratos_activos = Contrato.objects.filter(estado='ACTIVO')
-        contratos = Contrato.objects.select_related('cliente').prefetch_related('lotes').order_by('fecha_contrato', 'id')
+        contratos = Contrato.objects.all()
     else:
-        clientes = Cliente.objects.filter(vendedor=request.user)
         contratos_activos = Contrato.objects.filter(estado='ACTIVO', cliente__vendedor=request.user)
-        contratos = Contrato.objects.filter(cliente__vendedor=request.user).select_related('cliente').prefetch_related('lotes').order_by('fecha_contrato', 'id')
+        contratos = Contrato.objects.filter(cliente__vendedor=request.user)
     
     # NUEVA LÓGICA: Forzar recálculo masivo de moras en tiempo real para todos los contratos listados
-    from .services import actualizar_moras_masivo
     actualizar_moras_masivo(contratos_activos)
-    
-    return render(request, 'ventas/lista_clientes.html', {'clientes': clientes, 'contratos': contratos})
+
+    # Filtros y paginación en el servidor: la página solo trae las filas visibles
+    filtros = filtros_listado_contratos(request.GET, request.user)
+    contratos = filtrar_listado_contratos(contratos, filtros)
+    pagina = Paginator(contratos, CLIENTES_POR_PAGINA).get_page(request.GET.get('page'))
+
+    # Primera cuota y método de entrada por subconsulta, lotes por prefetch: consultas constantes
+    pagina.object_list = list(anotar_listado_contratos(pagina.object_list))
+
+    # Query string de los filtros, para conservarlos al cambiar de página
+    params = request.GET.copy()
+    params.pop('page', None)
+
+    context = {
+        'contratos': pagina.object_list,
+        'pagina': pagina,
+        'filtros': filtros,
+        'estados': Contrato.ESTADOS_CONTRATO,
+        'vendedores': (
+            User.objects.filter(mis_clientes__isnull=False).distinct().order_by('username')
+            if request.user.is_superuser else []
+        ),
+        'query_filtros': params.urlencode(),
+    }
+    return render(request, 'ventas/lista_clientes.html', context)
+
+@login_required
+def contrato_modal_json_view(request, pk):
+    """Contenido de los modales del listado (foto del lote y pago de entrada) bajo demanda."""
+    from django.http import JsonResponse
+    from .services import detalle_modal_contrato
+
+    contrato = get_object_or_404(
+        Contrato.objects.select_related('cliente', 'lote').prefetch_related('lotes'), pk=pk
+    )
+    if not request.user.is_superuser and contrato.cliente.vendedor_id != request.user.id:
+        return JsonResponse({'error': 'No tiene permisos para acceder a esta información.'}, status=403)
+    return JsonResponse(detalle_modal_contrato(contrato))
 
 # ==========================================
 # 4. DETALLE CONTRATO (Panel Cliente)
 # ==========================================
 @login_required
 def detalle_contrato_view(request, pk):
-    contrato = get_object_or_404(Contrato, pk=pk)
+    from .services import resumen_detalle_contrato
+
+    contrato = get_object_or_404(
+        Contrato.objects.select_related('cliente', 'lote').prefetch_related('lotes'), pk=pk
+    )
     
-    if not request.user.is_superuser and contrato.cliente.vendedor != request.user:
+    if not request.user.is_superuser and contrato.cliente.vendedor_id != request.user.id:
         messages.error(request, "No tiene permisos para acceder a esta información.")
         return redirect('dashboard')
 
     # 1. Actualizar cálculo matemático al instante
     actualizar_moras_contrato(contrato.id)
 
-    from django.db.models import Sum
-
-    # IMPORTANTE: Usar Cuota.objects.filter para evitar caché del ORM de relaciones
-    # Se añade prefetch_related('pagos_asociados', 'pagos_asociados__pago') para acceder a los detalles en el template
-    # Se añade annotate(total_transaccion=Sum('pagos_asociados__pago__monto')) para mostrar el monto total de los pagos involucrados
-    cuotas = Cuota.objects.filter(contrato=contrato).order_by('numero_cuota').prefetch_related(
-        'pagos_asociados', 
-        'pagos_asociados__pago',
-        'pagos_asociados__pago__detalles',
-        'pagos_asociados__pago__detalles__cuota'
-    ).annotate(total_transaccion=Sum('pagos_asociados__pago__monto'))
-    
-    # 2. Filtrar las vencidas
-    cuotas_vencidas = cuotas.filter(estado='VENCIDO')
-    
-    # NUEVA LÓGICA:
-    # ¿Hay alguna fila roja? (True/False)
-    hay_vencidas = cuotas_vencidas.exists() 
-    
-    # Sumar dinero de mora
-    total_mora = sum(c.valor_mora for c in cuotas_vencidas)
-    
-    # Saldo pendiente real
-    saldo_pendiente_total = sum(c.total_a_pagar - c.valor_pagado for c in cuotas)
-
-    # Próxima a pagar (La primera PENDIENTE o PARCIAL, excluyendo VENCIDO para el indicador)
-    proxima_cuota = cuotas.filter(estado__in=['PENDIENTE', 'PARCIAL']).first()
-
-    # --- NUEVA LÓGICA: Historial de Pagos con Detalles ---
-    pagos_historial = contrato.pago_set.all().order_by('-fecha_pago', '-id').prefetch_related('detalles', 'detalles__cuota')
-
-    # Lógica para determinar "Cuota Principal" vs "Abastecida"
-    # 1. Mapear cada Pago ID a su Cuota Inicial (la del numero_cuota más bajo)
-    pago_inicio_map = {} # {pago_id: numero_cuota_minimo}
-    
-    # Usamos los detalles ya cargados en pagos_historial para mayor eficiencia
-    # O mejor, una query directa liviana a DetallePago
-    detalles_all = DetallePago.objects.filter(pago__contrato=contrato).select_related('cuota', 'pago')
-    
-    for d in detalles_all:
-        pid = d.pago_id
-        q_num = d.cuota.numero_cuota
-        if pid not in pago_inicio_map:
-            pago_inicio_map[pid] = q_num
-        else:
-            if q_num < pago_inicio_map[pid]:
-                pago_inicio_map[pid] = q_num
-                
-    # 2. Marcar cada cuota
-    for c in cuotas:
-        c.es_principal_de_algun_pago = False
-        c.monto_real_abonado = Decimal('0.00')
-        origenes = set()
-        
-        # Iterar sobre los pagos que afectaron a esta cuota
-        # Gracias al prefetch en 'cuotas', podemos iterar c.pagos_asociados.all()
-        for detalle in c.pagos_asociados.all():
-             pago_id = detalle.pago_id
-             inicio_num = pago_inicio_map.get(pago_id)
-             
-             # Annotate for template use
-             detalle.pago.cuota_inicial_numero = inicio_num
-             
-             if inicio_num == c.numero_cuota:
-                 c.es_principal_de_algun_pago = True
-                 # Sumar el monto total de la transacción original radicada en esta cuota
-                 c.monto_real_abonado += detalle.pago.monto
-             else:
-                 # Es secundario (surplus)
-                 origenes.add(inicio_num)
-        
-        c.lista_origenes = sorted(list(origenes))
-        
-        # Failsafe para pagos antiguos sin DetallePago:
-        # Si la cuota tiene dinero pagado pero no registraba pago_raiz,
-        # mostramos el dinero pagado directamente para evitar que salga $0 en la tabla.
-        if c.monto_real_abonado == 0 and c.valor_pagado > 0:
-            c.monto_real_abonado = c.valor_pagado
-
+    # 2. Cuotas, pagos y su distribución en una sola pasada (consultas fijas)
+    resumen = resumen_detalle_contrato(contrato)
 
     context = {
         'contrato': contrato,
-        'cuotas': cuotas,
-        'total_mora': total_mora,
-        'hay_vencidas': hay_vencidas, 
-        'proxima_cuota': proxima_cuota,
-        'saldo_pendiente_total': saldo_pendiente_total,
-        'puede_cerrar': saldo_pendiente_total <= 0 and contrato.estado == 'ACTIVO',
-        'pagos_historial': pagos_historial
+        **resumen,
+        'puede_cerrar': resumen['saldo_pendiente_total'] <= 0 and contrato.estado == 'ACTIVO',
     }
     return render(request, 'ventas/detalle_cliente.html', context)
 
 @login_required
 def cerrar_contrato_view(request, pk):
+    from .services import actualizar_saldos_contrato
+
     contrato = get_object_or_404(Contrato, pk=pk)
     
-    # Validaciones de seguridad
-    saldo_pendiente = sum((c.valor_capital + c.valor_mora) - c.valor_pagado for c in contrato.cuotas.all())
-    
-    if saldo_pendiente > 0:
+    # Validaciones de seguridad: el saldo guardado se recalcula desde las cuotas antes de decidir
+    actualizar_saldos_contrato(contrato.id)
+    contrato.refresh_from_db(fields=['saldo_pendiente'])
+    if contrato.saldo_pendiente > 0:
         messages.error(request, "Error: No se puede cerrar un contrato con deuda pendiente.")
         return redirect('detalle_contrato', pk=pk)
 
     if request.method == 'POST':
         contrato.estado = 'CERRADO'
-        contrato.save()
+        contrato.save(update_fields=['estado'])
         messages.success(request, f"¡Contrato #{contrato.id} finalizado exitosamente!")
     
     return redirect('detalle_contrato', pk=pk)
@@ -333,7 +305,7 @@ def cancelar_contrato_view(request, pk):
     if request.method == 'POST':
         contrato.estado = 'CANCELADO'
         contrato.fecha_fin_contrato = date.today()
-        contrato.save()
+        contrato.save(update_fields=['estado', 'fecha_fin_contrato'])
         
         # Liberar TODOS los lotes asociados al contrato
         for lote in contrato.lotes.all():
@@ -355,7 +327,7 @@ def devolucion_contrato_view(request, pk):
     if request.method == 'POST':
         contrato.estado = 'DEVOLUCION'
         contrato.fecha_fin_contrato = date.today()
-        contrato.save()
+        contrato.save(update_fields=['estado', 'fecha_fin_contrato'])
         
         # Liberar TODOS los lotes asociados al contrato
         for lote in contrato.lotes.all():
@@ -858,7 +830,6 @@ def editar_lote_view(request, pk):
 def _obtener_datos_mensuales(user, mes_str, anio_str):
     from datetime import date
     from dateutil.relativedelta import relativedelta
-    from decimal import Decimal
     
     hoy = date.today()
     es_anual = False
@@ -885,134 +856,22 @@ def _obtener_datos_mensuales(user, mes_str, anio_str):
             mes = hoy.month
         primer_dia_mes = date(anio, mes, 1)
         ultimo_dia_mes = primer_dia_mes + relativedelta(months=1) - relativedelta(days=1)
-    
-    if user.is_superuser:
-        contratos_todos = Contrato.objects.all().prefetch_related('pago_set__detalles__cuota', 'cliente', 'lote')
-        contratos_activos = Contrato.objects.filter(estado='ACTIVO').prefetch_related('pago_set__detalles__cuota', 'cliente', 'lote')
-    else:
-        contratos_todos = Contrato.objects.filter(cliente__vendedor=user).prefetch_related('pago_set__detalles__cuota', 'cliente', 'lote')
-        contratos_activos = Contrato.objects.filter(estado='ACTIVO', cliente__vendedor=user).prefetch_related('pago_set__detalles__cuota', 'cliente', 'lote')
-        
-    es_mes_pasado = ultimo_dia_mes < hoy
-
-    # 1. Ingresos Cash Flow: TODO pago recibido en el mes (incluyendo abono inicial y de contratos que ahora estén inactivos)
-    #    Una fila por TRANSACCION (no por cliente), con fecha y cuotas cubiertas
-    cobros_lista_raw = []   # lista de transacciones individuales
-    total_cobrado_mes = Decimal('0.00')
-    total_entradas    = Decimal('0.00')
-    total_ingresos    = Decimal('0.00')
-
-    for contrato in contratos_todos:
-        cliente = contrato.cliente
-        pago_entrada = contrato.pago_set.order_by('id').first()
-
-        for pago in contrato.pago_set.all().order_by('fecha_pago'):
-            # Solo pagos cuya fecha real de cobro cae en el período (Cash Flow)
-            if not (primer_dia_mes <= pago.fecha_pago <= ultimo_dia_mes):
-                continue
-
-            es_entrada = pago.es_entrada or (pago == pago_entrada and not pago.detalles.exists())
-
-            # Cuotas que cubre este pago (números de cuota)
-            if es_entrada:
-                cuotas_cubiertas = ['Entrada']
-            else:
-                numeros = list(
-                    pago.detalles.select_related('cuota')
-                    .values_list('cuota__numero_cuota', flat=True)
-                    .order_by('cuota__numero_cuota')
-                )
-                cuotas_cubiertas = [f'#{n}' for n in numeros] if numeros else ['—']
-
-            cobros_lista_raw.append({
-                'cliente':          cliente,
-                'contrato':         contrato,
-                'fecha_pago':       pago.fecha_pago,
-                'metodo':           pago.metodo_pago,
-                'cuotas_cubiertas': ', '.join(cuotas_cubiertas),
-                'es_entrada':       es_entrada,
-                'monto_cuotas':     Decimal('0.00') if es_entrada else pago.monto,
-                'monto_entrada':    pago.monto if es_entrada else Decimal('0.00'),
-                'total_cobrado':    pago.monto,
-            })
-
-            total_cobrado_mes += pago.monto
-            if es_entrada:
-                total_entradas += pago.monto
-            else:
-                total_ingresos += pago.monto
-
-    # Ordenar: por fecha_pago, luego por apellido
-    cobros_lista_raw.sort(key=lambda x: (x['fecha_pago'], x['cliente'].apellidos))
-
-    # 2. Proyección Restante (Cuotas venciendo este mes, aún no pagadas totalmente)
-    #    SOLO DE CONTRATOS ACTIVOS
-    proyeccion_por_cliente = {}
-    if not es_mes_pasado:
-        for contrato in contratos_activos:
-            cuotas_proyeccion = contrato.cuotas.filter(
-                fecha_vencimiento__gte=primer_dia_mes,
-                fecha_vencimiento__lte=ultimo_dia_mes,
-                estado__in=['PENDIENTE', 'PARCIAL', 'VENCIDO']
-            )
-            deuda = sum(c.saldo_pendiente for c in cuotas_proyeccion)
-            if deuda > 0:
-                proyeccion_por_cliente[contrato.id] = {
-                    'cliente': contrato.cliente,
-                    'contrato': contrato,
-                    'cuotas_count': cuotas_proyeccion.count(),
-                    'deuda_total': deuda
-                }
-    total_proyeccion = sum(p['deuda_total'] for p in proyeccion_por_cliente.values())
-
-    # 3. Mora Histórica (Cuotas vencidas ANTES de este mes, no pagadas)
-    #    SOLO DE CONTRATOS ACTIVOS
-    mora_historica = {}
-    for contrato in contratos_activos:
-        if es_mes_pasado:
-            # Si es mes pasado, TODO lo impago vencido hasta el fin de ESE mes se considera mora actual acumulada a la fecha de ese mes.
-            cuotas_mora = contrato.cuotas.filter(
-                fecha_vencimiento__lte=ultimo_dia_mes,
-                estado__in=['PENDIENTE', 'PARCIAL', 'VENCIDO']
-            )
-        else:
-            cuotas_mora = contrato.cuotas.filter(
-                fecha_vencimiento__lt=primer_dia_mes,
-                estado__in=['PENDIENTE', 'PARCIAL', 'VENCIDO']
-            )
-        deuda = sum(c.saldo_pendiente for c in cuotas_mora)
-        if deuda > 0:
-            mora_historica[contrato.id] = {
-                'cliente': contrato.cliente,
-                'contrato': contrato,
-                'cuotas_count': cuotas_mora.count(),
-                'deuda_total': deuda
-            }
-    total_mora_historica = sum(m['deuda_total'] for m in mora_historica.values())
-
-    # 4. Devoluciones del mes (REMOVIDO A PETICION DEL USUARIO)
-
-    return {
-        'fecha_inicio': primer_dia_mes,
-        'fecha_fin': ultimo_dia_mes,
-        'mes_actual': mes,
-        'anio_actual': anio,
-        'es_anual': es_anual,
-        'es_mes_pasado': es_mes_pasado,
-        # --- Cobros: una fila por transacción (fecha + cuota + monto) ---
-        'cobros_lista': cobros_lista_raw,
-        'total_cobrado_mes': total_cobrado_mes,
-        'total_entradas': total_entradas,
-        'total_ingresos': total_ingresos,
-        # --- Para backward-compat ---
-        'entradas_lista': [c for c in cobros_lista_raw if c['es_entrada']],
-        'ingresos_lista': [c for c in cobros_lista_raw if not c['es_entrada']],
-        # --- Proyeccion y mora ---
-        'proyeccion_lista': sorted(proyeccion_por_cliente.values(), key=lambda x: x['deuda_total'], reverse=True),
-        'total_proyeccion': total_proyeccion,
-        'mora_historica_lista': sorted(mora_historica.values(), key=lambda x: x['deuda_total'], reverse=True),
-        'total_mora_historica': total_mora_historica,
-    }
+
+    from .reportes import calcular_datos_mensuales, datos_mensuales_desde_cierre
+    from .reportes_cache import obtener_reporte, meses_entre
+
+    # Meses con cierre mensual: se leen del snapshot, sin recalcular
+    if ultimo_dia_mes < hoy:
+        datos = datos_mensuales_desde_cierre(user, mes, anio, es_anual, primer_dia_mes, ultimo_dia_mes)
+        if datos is not None:
+            return datos
+
+    # Meses sin cerrar se sirven desde caché hasta que un pago/cuota de ese mes cambie
+    return obtener_reporte(
+        'mensual', user, meses_entre(primer_dia_mes, ultimo_dia_mes), (mes,),
+        lambda: calcular_datos_mensuales(user, mes, anio, es_anual, primer_dia_mes, ultimo_dia_mes),
+        cerrado=ultimo_dia_mes < hoy,
+    )
 
 @login_required
 def reporte_mensual_view(request):
@@ -1024,398 +883,219 @@ def reporte_mensual_view(request):
 
 @login_required
 def reporte_general_view(request):
-    from datetime import date
-    from dateutil.relativedelta import relativedelta
-    from decimal import Decimal
-    
-    # Get date range from GET params
-    desde_str = request.GET.get('desde', None)  # Format: YYYY-MM
-    hasta_str = request.GET.get('hasta', None)
-    solo_activos = request.GET.get('solo_activos', None) == 'on'
-    
-    # Parse dates
-    if desde_str:
-        desde_year, desde_month = map(int, desde_str.split('-'))
-        desde = date(desde_year, desde_month, 1)
-    else:
-        desde = date.today().replace(day=1, month=1)  # Default to January this year
-    
-    if hasta_str:
-        hasta_year, hasta_month = map(int, hasta_str.split('-'))
-        # Last day of the month
-        hasta = date(hasta_year, hasta_month, 1) + relativedelta(months=1) - relativedelta(days=1)
-    else:
-        hasta = date.today()
-    
-    # Generate list of months between desde and hasta
-    meses_nombres = {
-        1: 'Ene', 2: 'Feb', 3: 'Mar', 4: 'Abr', 5: 'May', 6: 'Jun',
-        7: 'Jul', 8: 'Ago', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dic'
-    }
-    
-    meses = []
-    current = desde
-    while current <= hasta:
-        meses.append({
-            'year': current.year,
-            'month': current.month,
-            'label': f"{meses_nombres[current.month]} {current.year}"
-        })
-        current = current + relativedelta(months=1)
-    
-    # Get contracts
-    contratos_qs = Contrato.objects.select_related('cliente', 'lote').prefetch_related('cuotas', 'pago_set')
-    
-    if not request.user.is_superuser:
-        contratos_qs = contratos_qs.filter(cliente__vendedor=request.user)
-    
-    if solo_activos:
-        contratos_qs = contratos_qs.filter(estado='ACTIVO')
-    
-    # Build report data
-    reporte_data = []
-    
-    # Initialize totals for each month
-    totales_mensuales = [Decimal('0.00') for _ in meses]
-    total_general = Decimal('0.00')
-    total_cuotas = Decimal('0.00')  # Total de todas las cuotas mensuales
-    total_vtotal = Decimal('0.00')  # Suma de precio_venta_final
-    total_entrada = Decimal('0.00')  # Suma de valor_entrada
-    total_saldo = Decimal('0.00')  # Suma de saldos pendientes
-    
-    for contrato in contratos_qs:
-        # Actualizar moras para que el saldo pendiente sea exacto al del detalle_cliente
-        actualizar_moras_contrato(contrato.id)
-        
-        # Basic data
-        row = {
-            'contrato': contrato,
-            'cliente': contrato.cliente,
-            'lote': contrato.lote,
-            'pagos_mensuales': [],
-            'total_pagado': Decimal('0.00'),
-            'es_devolucion': contrato.estado == 'DEVOLUCION',
-            'saldo_pendiente': Decimal('0.00')  # Se calculará después
-        }
-        
-        # Sumar totales de VTotal y Entrada
-        total_vtotal += contrato.precio_venta_final or Decimal('0.00')
-        total_entrada += contrato.valor_entrada or Decimal('0.00')
-        
-        # Calculate cuota value for totals
-        primera_cuota = contrato.cuotas.first()
-        if primera_cuota:
-            total_cuotas += primera_cuota.valor_capital
-        
-        cuotas_en_rango = contrato.cuotas.filter(
-            fecha_vencimiento__gte=desde,
-            fecha_vencimiento__lte=hasta
-        )
-        
-        # Calcular saldo pendiente y Total Pagado desde las cuotas (fuente de verdad)
-        # Total Pagado = V.Entrada + sum(cuota.valor_pagado) → independiente del rango de fechas
-        todas_cuotas = list(contrato.cuotas.all())
-        row['saldo_pendiente'] = sum(
-            c.total_a_pagar - c.valor_pagado
-            for c in todas_cuotas
-        )
-        row['total_pagado'] = contrato.valor_entrada or Decimal('0.00')
-
-        # Inicializar columnas mensuales (se llenarán con pagos del rango seleccionado)
-        row['pagos_mensuales'] = [Decimal('0.00')] * len(meses)
-
-        # Ubicar la entrada en el mes correspondiente (COMENTADO: El usuario no quiere ver la entrada en la matriz de meses)
-        # Esto evita que aparezca como una "cuota gigante" en el reporte
-        """
-        pago_entrada_obj = contrato.pago_set.filter(es_entrada=True).order_by('id').first()
-        if not pago_entrada_obj:
-            pago_entrada_obj = contrato.pago_set.order_by('id').first()
-        if pago_entrada_obj:
-            fecha_entrada = pago_entrada_obj.fecha_pago
-            for i, mes in enumerate(meses):
-                mes_inicio = date(mes['year'], mes['month'], 1)
-                mes_fin = mes_inicio + relativedelta(months=1) - relativedelta(days=1)
-                if mes_inicio <= fecha_entrada <= mes_fin:
-                    monto_e = contrato.valor_entrada or Decimal('0.00')
-                    row['pagos_mensuales'][i] += monto_e
-                    if not row['es_devolucion']:
-                        totales_mensuales[i] += monto_e
-                    else:
-                        totales_mensuales[i] -= monto_e
-                    break
-        """
-        # IDs de pagos de entrada para excluirlos de la lógica "Legacy" (sin detalles)
-        ids_entradas = set(contrato.pago_set.filter(es_entrada=True).values_list('id', flat=True))
-        if contrato.valor_entrada > 0 and not ids_entradas:
-            # Fallback: Solo si hay deuda de entrada pero no hay flag, tomamos el primer pago como entrada
-            pago_entrada_obj_fallback = contrato.pago_set.order_by('id').first()
-            if pago_entrada_obj_fallback:
-                ids_entradas.add(pago_entrada_obj_fallback.id)
-
-        # Procesar cuotas
-        for pago in contrato.pago_set.all():
-            # Saltar el pago de entrada en ambas ramas: ya fue sumado en la línea de valor_entrada
-            if pago.id in ids_entradas:
-                continue
-
-            detalles = pago.detalles.select_related('cuota')
-            
-            if detalles.exists():
-                # SIEMPRE procesar detalles (son cuotas/mora reales)
-                for detalle in detalles:
+    desde, hasta, solo_activos = parametros_reporte_general(request.GET)
+    reporte = obtener_reporte_general(request.user, desde, hasta, solo_activos)
+    return render(request, 'reportes/reporte_general.html', reporte.como_contexto())
 
-                    fecha_pago_real = pago.fecha_pago
-                    monto = detalle.monto_aplicado
-                    
-                    # Distribuir en meses (Cash Flow: usando fecha_pago_real)
-                    for i, mes in enumerate(meses):
-                        mes_inicio = date(mes['year'], mes['month'], 1)
-                        mes_fin = mes_inicio + relativedelta(months=1) - relativedelta(days=1)
-                        if mes_inicio <= fecha_pago_real <= mes_fin:
-                            row['pagos_mensuales'][i] += monto
-                            if not row['es_devolucion']:
-                                totales_mensuales[i] += monto
-                            else:
-                                totales_mensuales[i] -= monto
-                            break # Ya lo encontró
-                            
-                    # Sumar SIEMPRE al histórico de Total Pagado
-                    row['total_pagado'] += monto
-            else:
-                # Pago legacy sin detalles
-
-                fecha_ref = pago.fecha_pago
-                monto = pago.monto
-                
-                # Distribuir en meses
-                for i, mes in enumerate(meses):
-                    mes_inicio = date(mes['year'], mes['month'], 1)
-                    mes_fin = mes_inicio + relativedelta(months=1) - relativedelta(days=1)
-                    if mes_inicio <= fecha_ref <= mes_fin:
-                        row['pagos_mensuales'][i] += monto
-                        if not row['es_devolucion']:
-                            totales_mensuales[i] += monto
-                        else:
-                            totales_mensuales[i] -= monto
-                        break
-                        
-                # Sumar SIEMPRE al histórico de Total Pagado
-                row['total_pagado'] += monto
-        # Add to general total
-        if row['es_devolucion']:
-            total_general -= row['total_pagado']
-        else:
-            total_general += row['total_pagado']
-        
-        total_saldo += row['saldo_pendiente']
-        reporte_data.append(row)
-    
-    context = {
-        'desde': desde,
-        'hasta': hasta,
-        'meses': meses,
-        'reporte_data': reporte_data,
-        'solo_activos': solo_activos,
-        'totales_mensuales': totales_mensuales,
-        'total_general': total_general,
-        'total_cuotas': total_cuotas,
-        'total_vtotal': total_vtotal,
-        'total_entrada': total_entrada,
-        'total_saldo': total_saldo,
-    }
-    return render(request, 'reportes/reporte_general.html', context)
+# Cantidad de contratos que se renderizan en cada parte del PDF general.
+# Cada parte se convierte a PDF por separado y luego se unen con pypdf.
+REPORTE_GENERAL_PDF_CONTRATOS_POR_PARTE = 200
 
-@login_required
-def reporte_general_pdf_view(request):
-    from datetime import datetime, date
+def _partes_reporte_general_pdf(filas, desde, hasta, meses, contratos_por_parte):
+    """
+    Generador de contextos para el PDF general: un contexto por bloque de filas.
+    `filas` se consume de a un bloque (más el siguiente, para saber cuál es la
+    última parte), así el reporte completo nunca está en memoria.
+    Los totales se arrastran entre partes; cada parte muestra el acumulado
+    y la última muestra los TOTALES finales.
+    """
     from decimal import Decimal
-    from dateutil.relativedelta import relativedelta
-    from io import BytesIO
-    from django.template.loader import render_to_string
-    from xhtml2pdf import pisa
-    from .services import link_callback
-    
-    # Get filter parameters
-    desde_str = request.GET.get('desde')
-    hasta_str = request.GET.get('hasta')
-    solo_activos = request.GET.get('solo_activos') == 'on'
-    
-    # Parse dates
-    desde = datetime.strptime(desde_str, '%Y-%m').date() if desde_str else date.today().replace(day=1)
-    hasta = datetime.strptime(hasta_str, '%Y-%m').date() if hasta_str else date.today()
-    
-    # Generate month list
-    meses = []
-    current_date = desde.replace(day=1)
-    hasta_mes = hasta.replace(day=1)
-    
-    while current_date <= hasta_mes:
-        meses.append({
-            'year': current_date.year,
-            'month': current_date.month,
-            'label': current_date.strftime('%b %y').upper()
-        })
-        current_date += relativedelta(months=1)
-    
-    # Get contracts
-    contratos_qs = Contrato.objects.select_related('cliente', 'lote').all()
-    
-    if not request.user.is_superuser:
-        contratos_qs = contratos_qs.filter(cliente__vendedor=request.user)
-    
-    if solo_activos:
-        contratos_qs = contratos_qs.filter(estado='ACTIVO')
-    
-    # Build report data (same logic as reporte_general_view)
-    reporte_data = []
+    from itertools import islice
+
+    filas = iter(filas)
+    bloque = list(islice(filas, contratos_por_parte))
+
     totales_mensuales = [Decimal('0.00') for _ in meses]
     total_general = Decimal('0.00')
     total_cuotas = Decimal('0.00')
     total_vtotal = Decimal('0.00')
     total_entrada = Decimal('0.00')
     total_saldo = Decimal('0.00')
+    filas_previas = 0
+    numero_parte = 0
+
+    while True:
+        siguiente = list(islice(filas, contratos_por_parte))
+        for fila in bloque:
+            signo = -1 if fila.es_devolucion else 1
+            total_vtotal += fila.precio_venta_final or Decimal('0.00')
+            total_entrada += fila.valor_entrada or Decimal('0.00')
+            if fila.primera_cuota_capital is not None:
+                total_cuotas += fila.primera_cuota_capital
+            for i, monto in enumerate(fila.pagos_mensuales):
+                totales_mensuales[i] += signo * monto
+            total_general += signo * fila.total_pagado
+            total_saldo += fila.saldo_pendiente
+
+        yield {
+            'desde': desde,
+            'hasta': hasta,
+            'meses': meses,
+            'reporte_data': bloque,
+            'offset': filas_previas,
+            'es_primera_parte': numero_parte == 0,
+            'es_ultima_parte': not siguiente,
+            'totales_mensuales': list(totales_mensuales),
+            'total_general': total_general,
+            'total_cuotas': total_cuotas,
+            'total_entrada': total_entrada,
+            'total_vtotal': total_vtotal,
+            'total_saldo': total_saldo,
+        }
+        if not siguiente:
+            break
+        filas_previas += len(bloque)
+        bloque = siguiente
+        numero_parte += 1
 
-    
-    for contrato in contratos_qs:
-        # Actualizar moras para exactitud financiera
-        actualizar_moras_contrato(contrato.id)
-        
-        hasta_fin_de_mes = hasta.replace(day=1) + relativedelta(months=1) - relativedelta(days=1)
-        cuotas_en_rango = contrato.cuotas.filter(
-            fecha_vencimiento__gte=desde.replace(day=1),
-            fecha_vencimiento__lte=hasta_fin_de_mes
+@login_required
+def reporte_general_pdf_view(request):
+    from tempfile import SpooledTemporaryFile
+    from .reportes import meses_reporte
+    from .services import renderizar_pdf_por_partes
+
+    # Mismas filas que la vista HTML: del dataset en caché si existe; si no, se
+    # calculan por bloques de contratos a medida que se renderiza cada parte
+    desde, hasta, solo_activos = parametros_reporte_general(request.GET)
+    filas = filas_reporte_general(
+        request.user, desde, hasta, solo_activos, REPORTE_GENERAL_PDF_CONTRATOS_POR_PARTE
+    )
+
+    # Renderizar por bloques de contratos y unir las partes (memoria acotada)
+    contextos = _partes_reporte_general_pdf(
+        filas, desde, hasta, meses_reporte(desde, hasta), REPORTE_GENERAL_PDF_CONTRATOS_POR_PARTE
+    )
+    result_file = SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+    if not renderizar_pdf_por_partes('reportes/reporte_general_pdf.html', contextos, result_file):
+        result_file.close()
+        return HttpResponse('Error al generar el PDF del reporte general.', status=500)
+    result_file.seek(0)
+    
+    filename = f"Reporte_General_{desde.strftime('%Y-%m')}_to_{hasta.strftime('%Y-%m')}.pdf"
+    return FileResponse(result_file, as_attachment=True, filename=filename, content_type='application/pdf')
+
+# Contratos por bloque al exportar el reporte general (CSV / XLSX en streaming)
+REPORTE_GENERAL_EXPORTACION_CONTRATOS_POR_BLOQUE = 500
+
+def _filas_exportacion_reporte_general(user, desde, hasta, solo_activos):
+    """Encabezado + una lista de valores por contrato, en el orden de columnas del reporte HTML."""
+    from .reportes import meses_reporte
+
+    yield (
+        ['#', 'Estado', 'Apellidos / Nombres', 'Cédula', 'Email', 'Celular', 'Mz', 'Lote',
+         'V/Total', 'Entrada', 'Saldo', 'Cuota']
+        + [m['label'] for m in meses_reporte(desde, hasta)]
+        + ['Total Pagado']
+    )
+
+    filas = filas_reporte_general(
+        user, desde, hasta, solo_activos, REPORTE_GENERAL_EXPORTACION_CONTRATOS_POR_BLOQUE
+    )
+    for numero, fila in enumerate(filas, 1):
+        # Las devoluciones se exportan en negativo (en el HTML se muestran con "-")
+        def _con_signo(monto):
+            return -monto if fila.es_devolucion and monto else monto
+
+        yield (
+            [numero, fila.estado_display, f'{fila.apellidos} {fila.nombres}', fila.cedula, fila.email,
+             fila.celular, fila.manzana, fila.numero_lote, fila.precio_venta_final, fila.valor_entrada,
+             fila.saldo_pendiente, fila.primera_cuota_capital]
+            + [_con_signo(pago) for pago in fila.pagos_mensuales]
+            + [_con_signo(fila.total_pagado)]
         )
-        
-        total_vtotal += contrato.precio_venta_final or Decimal('0.00')
-        total_entrada += contrato.valor_entrada or Decimal('0.00')
-        
-        row = {
-
-            'contrato': contrato,
-            'cliente': contrato.cliente,
-            'lote': contrato.lote,
-            'pagos_mensuales': [],
-            'total_pagado': Decimal('0.00'),
-            'es_devolucion': contrato.estado == 'DEVOLUCION',
-            # Deuda pendiente TOTAL del contrato (igual que "Deuda Pendiente" en detalle_cliente)
-            'saldo_pendiente': sum(
-                c.total_a_pagar - c.valor_pagado
-                for c in contrato.cuotas.all()
-            )
-        }
-        
-        primera_cuota = contrato.cuotas.first()
-        if primera_cuota:
-            total_cuotas += primera_cuota.valor_capital
-        
-        # Inicializar los totales de este contrato
-        row['pagos_mensuales'] = [Decimal('0.00')] * len(meses)
-        # Sumar el valor de entrada siempre, sin importar el rango de fechas
-        row['total_pagado'] = contrato.valor_entrada or Decimal('0.00')
-        hasta_fin_de_mes_range = hasta.replace(day=1) + relativedelta(months=1) - relativedelta(days=1)
-
-        # Ubicar la entrada en el mes correspondiente (COMENTADO: El usuario no quiere ver la entrada en la matriz de meses)
-        """
-        pago_entrada_obj = contrato.pago_set.filter(es_entrada=True).order_by('id').first()
-        if not pago_entrada_obj:
-            pago_entrada_obj = contrato.pago_set.order_by('id').first()
-        if pago_entrada_obj:
-            fecha_entrada = pago_entrada_obj.fecha_pago
-            for i, mes in enumerate(meses):
-                mes_inicio = date(mes['year'], mes['month'], 1)
-                mes_fin = mes_inicio + relativedelta(months=1) - relativedelta(days=1)
-                if mes_inicio <= fecha_entrada <= mes_fin:
-                    monto_e = contrato.valor_entrada or Decimal('0.00')
-                    row['pagos_mensuales'][i] += monto_e
-                    if not row['es_devolucion']:
-                        totales_mensuales[i] += monto_e
-                    else:
-                        totales_mensuales[i] -= monto_e
-                    break
-        """
-        # IDs de pagos de entrada para excluirlos de la lógica "Legacy"
-        ids_entradas = set(contrato.pago_set.filter(es_entrada=True).values_list('id', flat=True))
-        if contrato.valor_entrada > 0 and not ids_entradas:
-            pago_entrada_obj_fallback = contrato.pago_set.order_by('id').first()
-            if pago_entrada_obj_fallback:
-                ids_entradas.add(pago_entrada_obj_fallback.id)
-
-        # Procesar cuotas
-        for pago in contrato.pago_set.all():
-            detalles = pago.detalles.select_related('cuota')
-            
-            if detalles.exists():
-                # SIEMPRE procesar detalles
-                for detalle in detalles:
-                    fecha_pago_real = pago.fecha_pago
-                    monto = detalle.monto_aplicado
-                    
-                    # Distribuir en meses
-                    for i, mes in enumerate(meses):
-                        mes_inicio = date(mes['year'], mes['month'], 1)
-                        mes_fin = mes_inicio + relativedelta(months=1) - relativedelta(days=1)
-                        if mes_inicio <= fecha_pago_real <= mes_fin:
-                            row['pagos_mensuales'][i] += monto
-                            if not row['es_devolucion']:
-                                totales_mensuales[i] += monto
-                            else:
-                                totales_mensuales[i] -= monto
-                            break
-                            
-                    # Sumar SIEMPRE al histórico de Total Pagado
-                    row['total_pagado'] += monto
-            elif pago.id not in ids_entradas:
-                # Pago legacy
-
-                fecha_ref = pago.fecha_pago
-                monto = pago.monto
-                
-                # Distribuir en meses
-                for i, mes in enumerate(meses):
-                    mes_inicio = date(mes['year'], mes['month'], 1)
-                    mes_fin = mes_inicio + relativedelta(months=1) - relativedelta(days=1)
-                    if mes_inicio <= fecha_ref <= mes_fin:
-                        row['pagos_mensuales'][i] += monto
-                        if not row['es_devolucion']:
-                            totales_mensuales[i] += monto
-                        else:
-                            totales_mensuales[i] -= monto
-                        break
-                        
-                # Sumar SIEMPRE al histórico de Total Pagado
-                row['total_pagado'] += monto
-        
-        if row['es_devolucion']:
-            total_general -= row['total_pagado']
-        else:
-            total_general += row['total_pagado']
-            
-        total_saldo += row['saldo_pendiente']
-        
-        reporte_data.append(row)
-    
-    context = {
-        'desde': desde,
-        'hasta': hasta,
-        'meses': meses,
-        'reporte_data': reporte_data,
-        'totales_mensuales': totales_mensuales,
-        'total_general': total_general,
-        'total_cuotas': total_cuotas,
-        'total_entrada': total_entrada,
-        'total_vtotal': total_vtotal,
-        'total_saldo': total_saldo,
-    }
 
-    
-    html_string = render_to_string('reportes/reporte_general_pdf.html', context)
-    result_file = BytesIO()
-    pisa.CreatePDF(html_string, dest=result_file, link_callback=link_callback)
-    
-    response = HttpResponse(result_file.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Reporte_General_{desde.strftime("%Y-%m")}_to_{hasta.strftime("%Y-%m")}.pdf"'
+@login_required
+def reporte_general_csv_view(request):
+    from django.http import StreamingHttpResponse
+    from .services import iterar_csv
+
+    desde, hasta, solo_activos = parametros_reporte_general(request.GET)
+    filas = _filas_exportacion_reporte_general(request.user, desde, hasta, solo_activos)
+
+    response = StreamingHttpResponse(iterar_csv(filas), content_type='text/csv; charset=utf-8')
+    filename = f"Reporte_General_{desde.strftime('%Y-%m')}_to_{hasta.strftime('%Y-%m')}.csv"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@login_required
+def reporte_general_xlsx_view(request):
+    from django.http import StreamingHttpResponse
+    from .services import iterar_xlsx
+
+    desde, hasta, solo_activos = parametros_reporte_general(request.GET)
+    filas = _filas_exportacion_reporte_general(request.user, desde, hasta, solo_activos)
+
+    response = StreamingHttpResponse(
+        iterar_xlsx(filas, nombre_hoja='Reporte General'),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+    filename = f"Reporte_General_{desde.strftime('%Y-%m')}_to_{hasta.strftime('%Y-%m')}.xlsx"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
+@login_required
+def reporte_cartera_view(request):
+    from .reportes import obtener_cartera_por_tramos
+    context = obtener_cartera_por_tramos(request.user)
+    return render(request, 'reportes/reporte_cartera.html', context)
+
+@login_required
+def reporte_cartera_json_view(request):
+    from django.http import JsonResponse
+    from .reportes import obtener_cartera_por_tramos
+    return JsonResponse(obtener_cartera_por_tramos(request.user))
+
+@login_required
+def reporte_manzanas_view(request):
+    from .reportes import obtener_resumen_manzanas
+    context = obtener_resumen_manzanas(request.user)
+    return render(request, 'reportes/reporte_manzanas.html', context)
+
+def _anio_reporte(params):
+    """?anio=YYYY (por defecto el actual)."""
+    from datetime import date
+    hoy = date.today()
+    try:
+        anio = int(params.get('anio', hoy.year))
+    except ValueError:
+        anio = hoy.year
+    return anio if 2000 <= anio <= hoy.year + 1 else hoy.year
+
+@login_required
+def reporte_vendedores_view(request):
+    from .reportes import obtener_desempeno_vendedores
+
+    context = obtener_desempeno_vendedores(request.user, _anio_reporte(request.GET))
+    return render(request, 'reportes/reporte_vendedores.html', context)
+
+@login_required
+def reporte_vendedores_csv_view(request):
+    from django.http import StreamingHttpResponse
+    from .services import iterar_csv
+    from .reportes import obtener_desempeno_vendedores, filas_desempeno_vendedores
+
+    anio = _anio_reporte(request.GET)
+    reporte = obtener_desempeno_vendedores(request.user, anio)
+
+    response = StreamingHttpResponse(iterar_csv(filas_desempeno_vendedores(reporte)), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="Desempeno_Vendedores_{anio}.csv"'
+    return response
+
+@login_required
+def proyeccion_cobros_json_view(request):
+    """?meses=N (1-36, por defecto 6) y ?ajustada=1 para ponderar por puntualidad histórica."""
+    from django.http import JsonResponse
+    from .reportes import obtener_proyeccion_cobros, PROYECCION_MESES_MAXIMO
+
+    try:
+        meses = int(request.GET.get('meses', 6))
+    except ValueError:
+        meses = 6
+    meses = min(max(meses, 1), PROYECCION_MESES_MAXIMO)
+    ajustada = request.GET.get('ajustada') in ('1', 'true', 'on')
+
+    return JsonResponse(obtener_proyeccion_cobros(request.user, meses, ajustada))
+
 @login_required
 def reporte_mensual_pdf_view(request):
     from io import BytesIO
@@ -1455,7 +1135,7 @@ def toggle_mora_cuota(request, cuota_id):
     if request.method == 'POST':
         # Cambiar el estado de exención
         cuota.mora_exenta = not cuota.mora_exenta
-        cuota.save()
+        cuota.save(update_fields=['mora_exenta'])
         
         # Recalcular moras del contrato
         actualizar_moras_contrato(contrato.id)
@@ -1547,7 +1227,7 @@ def preview_recibo_transaccion(request, pago_id):
     cuotas_cubiertas = [str(d.cuota.numero_cuota) for d in pago.detalles.all().order_by('cuota__numero_cuota')]
     cuotas_str = ", ".join(cuotas_cubiertas) if cuotas_cubiertas else "Abono General"
     
-    saldo_pendiente = sum(c.total_a_pagar - c.valor_pagado for c in contrato.cuotas.all())
+    saldo_pendiente = contrato.saldo_pendiente
 
     # Determinar método de pago y detalles
     metodo_real = 'EFECTIVO'
@@ -1603,21 +1283,26 @@ def gestor_gastos_view(request):
     """
     Vista principal del dashboard del gestor de gastos.
     Muestra los KPIs (Saldo, Ingresos, Gastos) e historial.
+    Los movimientos de caja viven en sbr_gestor.Transaccion (el mismo libro del gestor).
     """
-    # Obtener todos los movimientos ordenados por fecha de registro (más reciente primero)
-    movimientos = MovimientoCaja.objects.all().order_by('-fecha_registro', '-id')
-    
-    # Calcular KPIs
-    total_ingresos = sum(m.monto for m in movimientos if m.tipo == 'INGRESO')
-    total_gastos = sum(m.monto for m in movimientos if m.tipo == 'GASTO')
+    from Aplicaciones.sbr_gestor.services import totales_caja, pagina_movimientos
+
+    # KPIs con una consulta agregada
+    total_ingresos, total_gastos = totales_caja()
     saldo_actual = total_ingresos - total_gastos
+
+    # Historial paginado por cursor (más reciente primero)
+    cursor = request.GET.get('desde')
+    movimientos, siguiente = pagina_movimientos(incluir_lotes=False, cursor=cursor)
     
     context = {
         'movimientos': movimientos,
         'total_ingresos': total_ingresos,
         'total_gastos': total_gastos,
         'saldo_actual': saldo_actual,
-        'hoy': date.today()
+        'hoy': date.today(),
+        'es_primera_pagina': not cursor,
+        'cursor_siguiente': siguiente,
     }
     return render(request, 'gestion/gestor_gastos.html', context)
 
@@ -1644,21 +1329,25 @@ def registrar_movimiento_view(request):
                 messages.error(request, "Tipo de movimiento no válido.")
                 return redirect('gestor_gastos')
                 
-            # Validar que si es un GASTO, no deje la caja en negativo (opcional/regla de negocio)
-            # if tipo == 'GASTO':
-            #    ingresos = sum(m.monto for m in MovimientoCaja.objects.filter(tipo='INGRESO'))
-            #    gastos = sum(m.monto for m in MovimientoCaja.objects.filter(tipo='GASTO'))
-            #    if (ingresos - gastos) < monto:
-            #        messages.error(request, "⚠️ No hay suficientes fondos en caja para este gasto.")
-            #        return redirect('gestor_gastos')
-
-            MovimientoCaja.objects.create(
-                tipo=tipo,
-                monto=monto,
-                fecha=fecha,
-                descripcion=descripcion,
-                registrado_por=request.user
-            )
+            from Aplicaciones.sbr_gestor.models import Transaccion
+            from Aplicaciones.sbr_gestor.services import obtener_saldo_general
+
+            # Igual que en el gestor: el libro de saldo queda bloqueado hasta guardar,
+            # así dos gastos simultáneos no pueden pasar ambos la validación
+            with transaction.atomic():
+                if tipo == 'GASTO':
+                    saldo_actual = obtener_saldo_general(bloquear=True).saldo
+                    if monto > saldo_actual:
+                        messages.error(request, f"Transacción denegada. El gasto (${monto:.2f}) supera tu saldo general disponible (${saldo_actual:.2f}).")
+                        return redirect('gestor_gastos')
+
+                Transaccion.objects.create(
+                    tipo=tipo,
+                    valor=monto,
+                    fecha=fecha,
+                    descripcion=descripcion,
+                    registrado_por=request.user
+                )
             
             messages.success(request, f"¡{tipo.capitalize()} por ${monto:.2f} registrado con éxito!")
             
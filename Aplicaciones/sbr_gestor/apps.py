@@ -3,3 +3,5 @@ from django.apps import AppConfig
 
 class SbrGestorConfig(AppConfig):
     name = 'Aplicaciones.sbr_gestor'
+    def ready(self):
+        import Aplicaciones.sbr_gestor.signals
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from Aplicaciones.sbr_gestor.models import SaldoGeneral
+from Aplicaciones.sbr_gestor.services import PK_SALDO_GENERAL, reconstruir_saldo_general
+
+class Command(BaseCommand):
+    help = 'Reconstruye el libro de saldo general (ingresos de lotes, ingresos de caja y gastos)'
+
+    def handle(self, *args, **options):
+        anterior = SaldoGeneral.objects.filter(pk=PK_SALDO_GENERAL).first()
+        libro = reconstruir_saldo_general()
+
+        self.stdout.write(f"  Ingresos lotes: ${libro.ingresos_lotes}")
+        self.stdout.write(f"  Ingresos caja:  ${libro.ingresos_caja}")
+        self.stdout.write(f"  Gastos caja:    ${libro.gastos_caja}")
+        if anterior and anterior.saldo != libro.saldo:
+            self.stdout.write(self.style.WARNING(f"  El saldo guardado era ${anterior.saldo} (diferencia ${libro.saldo - anterior.saldo})"))
+        self.stdout.write(self.style.SUCCESS(f"Saldo general reconstruido: ${libro.saldo}"))
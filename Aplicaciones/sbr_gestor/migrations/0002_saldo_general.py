@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_gestor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoGeneral',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ingresos_lotes', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('ingresos_caja', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gastos_caja', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('saldo', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Saldo General',
+                'verbose_name_plural': 'Saldo General',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_gestor', '0002_saldo_general'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(fields=['fecha', 'id'], name='sbr_gestor__fecha_f11a47_idx'),
+        ),
+    ]
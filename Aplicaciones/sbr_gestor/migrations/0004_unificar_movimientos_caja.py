@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:40
+
+from django.db import migrations
+
+
+def unificar_movimientos_caja(apps, schema_editor):
+    """Copia cada MovimientoCaja (caja chica) como Transaccion, el único libro de caja."""
+    MovimientoCaja = apps.get_model('sbr_app', 'MovimientoCaja')
+    Transaccion = apps.get_model('sbr_gestor', 'Transaccion')
+    SaldoGeneral = apps.get_model('sbr_gestor', 'SaldoGeneral')
+
+    for movimiento in MovimientoCaja.objects.order_by('id').iterator():
+        transaccion = Transaccion.objects.create(
+            tipo=movimiento.tipo,
+            valor=movimiento.monto,
+            fecha=movimiento.fecha,
+            descripcion=movimiento.descripcion or '',
+            registrado_por_id=movimiento.registrado_por_id,
+        )
+        # auto_now_add pisa la fecha al crear: se conserva la original
+        Transaccion.objects.filter(pk=transaccion.pk).update(fecha_registro=movimiento.fecha_registro)
+
+    # Las señales no corren en migraciones: el libro de saldo se reconstruye al leerlo
+    SaldoGeneral.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_gestor', '0003_transaccion_fecha_index'),
+        ('sbr_app', '0036_pago_fecha_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(unificar_movimientos_caja, migrations.RunPython.noop),
+    ]
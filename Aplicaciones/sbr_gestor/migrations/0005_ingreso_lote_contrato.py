@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:08
+
+from django.db import migrations, models
+
+
+def reiniciar_saldo_general(apps, schema_editor):
+    """
+    El libro y los aportes por contrato tienen que partir juntos: se borra el libro
+    y se reconstruye completo (con IngresoLoteContrato) al leerlo.
+    """
+    SaldoGeneral = apps.get_model('sbr_gestor', 'SaldoGeneral')
+    SaldoGeneral.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbr_gestor', '0004_unificar_movimientos_caja'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngresoLoteContrato',
+            fields=[
+                ('contrato_id', models.PositiveBigIntegerField(primary_key=True, serialize=False)),
+                ('monto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Ingreso de Lote por Contrato',
+                'verbose_name_plural': 'Ingresos de Lotes por Contrato',
+            },
+        ),
+        migrations.RunPython(reiniciar_saldo_general, migrations.RunPython.noop),
+    ]
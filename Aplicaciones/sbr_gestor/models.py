@@ -30,6 +30,10 @@ class Transaccion(models.Model):
     registrado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Historial del dashboard: orden y cursor por (fecha, id)
+        indexes = [models.Index(fields=['fecha', 'id'])]
+
     def save(self, *args, **kwargs):
         if self.descripcion:
             self.descripcion = bleach.clean(self.descripcion, tags=[], attributes={}, strip=True)
@@ -37,3 +41,46 @@ class Transaccion(models.Model):
 
     def __str__(self):
         return f"{self.tipo} - ${self.valor} ({self.fecha})"
+
+
+class SaldoGeneral(models.Model):
+    """
+    Libro del saldo general (una sola fila, pk=1): ingresos de lotes + ingresos de caja - gastos.
+    Lo mantienen las señales de Pago, Contrato y Transaccion (ver services.py), así validar
+    un gasto es una lectura de una fila en vez de recalcular todo el histórico.
+    Se reconstruye con: python manage.py reconstruir_saldo_general
+    """
+    ingresos_lotes = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    ingresos_caja = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gastos_caja = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    saldo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    # Sube en cada cambio del libro
+    version = models.PositiveBigIntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Saldo General"
+        verbose_name_plural = "Saldo General"
+
+    def __str__(self):
+        return f"Saldo general: ${self.saldo} (v{self.version})"
+
+
+class IngresoLoteContrato(models.Model):
+    """
+    Lo que cada contrato aporta a SaldoGeneral.ingresos_lotes (negativo en DEVOLUCION).
+    Al cambiar un pago o un contrato se aplica al libro solo la diferencia de ese
+    contrato contra el valor guardado aquí, sin recalcular el histórico.
+    Sin clave foránea: el aporte tiene que seguir aquí cuando se borra el contrato
+    para poder restarlo.
+    """
+    contrato_id = models.PositiveBigIntegerField(primary_key=True)
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Ingreso de Lote por Contrato"
+        verbose_name_plural = "Ingresos de Lotes por Contrato"
+
+    def __str__(self):
+        return f"Contrato {self.contrato_id}: ${self.monto}"
@@ -0,0 +1,441 @@
+"""
+Saldo general del gestor: ingresos de lotes + ingresos de caja - gastos.
+
+El saldo vive en una sola fila (SaldoGeneral) que mantienen las señales de
+Pago, Contrato y Transaccion dentro de la misma transacción del cambio.
+Los movimientos de caja se aplican como diferencias exactas. Los ingresos de
+lotes también: la entrada legacy y las devoluciones dependen de todo el
+contrato, así que se recalcula el aporte del contrato que cambió y se aplica
+su diferencia contra el guardado en IngresoLoteContrato.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Sum, Value, IntegerField, Exists, OuterRef
+from django.utils import timezone
+
+from .models import IngresoLoteContrato, SaldoGeneral, Transaccion
+
+PK_SALDO_GENERAL = 1
+
+# Versión del libro en caché (la consultan los pedidos condicionales de api_totales)
+CLAVE_VERSION_SALDO = 'gestor:saldo:version'
+# Una versión leída de la base se guarda poco tiempo: podría perder la carrera con un commit
+TIMEOUT_VERSION_LEIDA = 60
+TIMEOUT_TOTALES = 60 * 60 * 24
+
+
+# ==========================================
+# INGRESOS DE LOTES
+# ==========================================
+def calcular_ganancias_lotes_rapido(mes=None, anio=None):
+    """
+    Calcula el total cobrado de lotes usando la misma lógica que
+    reporte_general columna 'Total Pagado':
+      - Sin filtro de mes: valor_entrada (campo contrato) + pagos de cuotas
+      - Con filtro de mes:  cash-flow → suma de Pago.monto recibido ese mes
+    Contratos DEVOLUCION se restan; CANCELADO/CERRADO se suman normalmente.
+    """
+    from Aplicaciones.sbr_app.models import Pago, Contrato
+
+    if mes and anio:
+        # ── Modo cash-flow (mes específico) ─────────────────────────────────
+        # Mes con cierre mensual: valor congelado al cierre
+        from Aplicaciones.sbr_app.models import CierreMensual
+        cierre = CierreMensual.objects.filter(anio=int(anio), mes=int(mes)).only('ingresos_lotes').first()
+        if cierre:
+            return cierre.ingresos_lotes
+
+        # Solo el dinero realmente recibido en ese mes
+        total = (
+            Pago.objects
+            .filter(fecha_pago__year=int(anio), fecha_pago__month=int(mes))
+            .exclude(contrato__estado='DEVOLUCION')
+            .aggregate(t=Sum('monto'))['t'] or Decimal('0.00')
+        )
+        return total
+
+    # ── Modo total histórico (sin filtro de mes) ─────────────────────────────
+    # Replica exactamente: reporte_general → total_general
+    # Por contrato: valor_entrada + pagos que no son de entrada. En contratos legacy
+    # (valor_entrada > 0 sin pagos marcados es_entrada) el primer pago es la entrada
+    # y se descuenta. Se resuelve con 2 consultas agregadas en vez de recorrer contratos.
+    from django.db.models import Exists, OuterRef, Subquery
+
+    devolucion = Q(estado='DEVOLUCION')
+    primer_pago = Pago.objects.filter(contrato=OuterRef('pk')).order_by('id').values('monto')[:1]
+    legacy = Q(valor_entrada__gt=0) & ~Q(tiene_entrada=True)
+
+    contratos = (
+        Contrato.objects
+        .annotate(
+            tiene_entrada=Exists(Pago.objects.filter(contrato=OuterRef('pk'), es_entrada=True)),
+            primer_monto=Subquery(primer_pago),
+        )
+        .aggregate(
+            entradas=Sum('valor_entrada', filter=~devolucion),
+            entradas_dev=Sum('valor_entrada', filter=devolucion),
+            legacy=Sum('primer_monto', filter=legacy & ~devolucion),
+            legacy_dev=Sum('primer_monto', filter=legacy & devolucion),
+        )
+    )
+    pagos = (
+        Pago.objects
+        .filter(es_entrada=False)
+        .aggregate(
+            cuotas=Sum('monto', filter=~Q(contrato__estado='DEVOLUCION')),
+            cuotas_dev=Sum('monto', filter=Q(contrato__estado='DEVOLUCION')),
+        )
+    )
+    valores = {k: v or Decimal('0.00') for k, v in {**contratos, **pagos}.items()}
+
+    # DEVOLUCION resta; todo lo demás suma
+    total = valores['entradas'] + valores['cuotas'] - valores['legacy']
+    total_devoluciones = valores['entradas_dev'] + valores['cuotas_dev'] - valores['legacy_dev']
+    return (total - total_devoluciones).quantize(Decimal('0.01'))
+
+
+def totales_caja(mes=None, anio=None):
+    """(ingresos, gastos) de caja en una consulta; con mes y anio, solo de ese mes."""
+    transacciones = Transaccion.objects.all()
+    if mes and anio:
+        transacciones = transacciones.filter(fecha__year=int(anio), fecha__month=int(mes))
+    totales = transacciones.aggregate(
+        ingresos=Sum('valor', filter=Q(tipo='INGRESO')),
+        gastos=Sum('valor', filter=Q(tipo='GASTO')),
+    )
+    return totales['ingresos'] or Decimal('0.00'), totales['gastos'] or Decimal('0.00')
+
+
+# ==========================================
+# LIBRO DE SALDO GENERAL
+# ==========================================
+@transaction.atomic
+def reconstruir_saldo_general():
+    """Recalcula el libro desde cero (pagos, contratos y transacciones)."""
+    libro, _ = SaldoGeneral.objects.select_for_update().get_or_create(pk=PK_SALDO_GENERAL)
+
+    # Aporte por contrato: base de las diferencias que aplican las señales
+    aportes = aportes_contratos()
+    IngresoLoteContrato.objects.all().delete()
+    IngresoLoteContrato.objects.bulk_create(
+        [IngresoLoteContrato(contrato_id=contrato_id, monto=monto) for contrato_id, monto in aportes.items()],
+        batch_size=500,
+    )
+
+    libro.ingresos_lotes = sum(aportes.values(), Decimal('0.00'))
+    libro.ingresos_caja, libro.gastos_caja = totales_caja()
+    libro.saldo = libro.ingresos_lotes + libro.ingresos_caja - libro.gastos_caja
+    libro.version += 1
+    libro.save()
+    transaction.on_commit(_olvidar_version)
+    return libro
+
+
+def obtener_saldo_general(bloquear=False):
+    """
+    Fila del libro (se crea con una reconstrucción si todavía no existe).
+    - bloquear: select_for_update; usar dentro de transaction.atomic para que
+      los gastos concurrentes se validen uno detrás de otro.
+    """
+    libros = SaldoGeneral.objects.select_for_update() if bloquear else SaldoGeneral.objects
+    libro = libros.filter(pk=PK_SALDO_GENERAL).first()
+    if libro is None:
+        libro = reconstruir_saldo_general()
+    return libro
+
+
+def _actualizar_libro(**cambios):
+    # Si el libro todavía no existe no hay nada que actualizar: se construirá completo al leerlo
+    SaldoGeneral.objects.filter(pk=PK_SALDO_GENERAL).update(
+        version=F('version') + 1,
+        actualizado_en=timezone.now(),
+        **cambios,
+    )
+    transaction.on_commit(_olvidar_version)
+
+
+def marcar_saldo_modificado():
+    """Sube la versión sin cambiar montos (p. ej. un cierre mensual rehecho cambia los totales del mes)."""
+    _actualizar_libro()
+
+
+def _olvidar_version():
+    cache.delete(CLAVE_VERSION_SALDO)
+
+
+def version_saldo_general():
+    """(version, actualizado_en) del libro: de caché si está, si no de la base."""
+    version = cache.get(CLAVE_VERSION_SALDO)
+    if version is None:
+        libro = obtener_saldo_general()
+        version = (libro.version, libro.actualizado_en)
+        cache.set(CLAVE_VERSION_SALDO, version, timeout=TIMEOUT_VERSION_LEIDA)
+    return version
+
+
+def aplicar_movimiento_caja(tipo, valor, signo=1):
+    """Suma (signo=1) o resta (signo=-1) una transacción de caja al libro."""
+    delta = Decimal(valor) * signo
+    if tipo == 'INGRESO':
+        _actualizar_libro(ingresos_caja=F('ingresos_caja') + delta, saldo=F('saldo') + delta)
+    elif tipo == 'GASTO':
+        _actualizar_libro(gastos_caja=F('gastos_caja') + delta, saldo=F('saldo') - delta)
+
+
+def _aporte_contrato(estado, valor_entrada, cuotas, primer_monto, tiene_entrada):
+    # Misma regla que calcular_ganancias_lotes_rapido: entrada + cuotas, sin el primer
+    # pago en contratos legacy; DEVOLUCION resta
+    aporte = (valor_entrada or Decimal('0.00')) + (cuotas or Decimal('0.00'))
+    if valor_entrada > 0 and not tiene_entrada:
+        aporte -= primer_monto or Decimal('0.00')
+    aporte = aporte.quantize(Decimal('0.01'))
+    return -aporte if estado == 'DEVOLUCION' else aporte
+
+
+def aportes_contratos(contratos=None):
+    """{contrato_id: aporte a ingresos_lotes} en una consulta (todos los contratos o los dados)."""
+    from django.db.models import Subquery
+    from django.db.models.functions import Coalesce
+    from Aplicaciones.sbr_app.models import Pago, Contrato
+
+    if contratos is None:
+        contratos = Contrato.objects.all()
+    cuotas = (
+        Pago.objects.filter(contrato=OuterRef('pk'), es_entrada=False)
+        .order_by().values('contrato').annotate(t=Sum('monto')).values('t')
+    )
+    primer_pago = Pago.objects.filter(contrato=OuterRef('pk')).order_by('id').values('monto')[:1]
+    filas = (
+        contratos
+        .annotate(
+            tiene_entrada=Exists(Pago.objects.filter(contrato=OuterRef('pk'), es_entrada=True)),
+            primer_monto=Subquery(primer_pago),
+            pagado_cuotas=Coalesce(Subquery(cuotas), Value(Decimal('0.00'))),
+        )
+        .values_list('id', 'estado', 'valor_entrada', 'pagado_cuotas', 'primer_monto', 'tiene_entrada')
+    )
+    return {fila[0]: _aporte_contrato(*fila[1:]) for fila in filas}
+
+
+def actualizar_ingresos_contrato(contrato_id):
+    """
+    Aplica al libro la diferencia del aporte de un contrato (tras un cambio de uno
+    de sus pagos o del contrato). Solo consulta ese contrato: no recorre el histórico.
+    Seguro en borrados por lote o en cascada: cada llamada compara contra el aporte
+    guardado en la base, así las siguientes del mismo contrato no cambian nada.
+    """
+    from Aplicaciones.sbr_app.models import Contrato
+
+    with transaction.atomic():
+        # El bloqueo de la fila del contrato ordena dos cambios simultáneos del mismo contrato
+        registro, _ = IngresoLoteContrato.objects.select_for_update().get_or_create(contrato_id=contrato_id)
+        aportes = aportes_contratos(Contrato.objects.filter(pk=contrato_id))
+        anterior = registro.monto
+        if contrato_id in aportes:
+            nuevo = aportes[contrato_id]
+            if nuevo != anterior:
+                IngresoLoteContrato.objects.filter(pk=contrato_id).update(monto=nuevo)
+        else:
+            # Contrato borrado: se resta todo lo que aportaba
+            registro.delete()
+            nuevo = Decimal('0.00')
+
+        delta = nuevo - anterior
+        if not delta:
+            # Sin cambio en el total histórico, pero los totales por mes (fecha_pago)
+            # se cachean por versión del libro
+            marcar_saldo_modificado()
+            return
+        _actualizar_libro(ingresos_lotes=F('ingresos_lotes') + delta, saldo=F('saldo') + delta)
+
+
+# ==========================================
+# DASHBOARD: TOTALES Y MOVIMIENTOS
+# ==========================================
+def calcular_totales(mes=None, anio=None):
+    """KPIs del dashboard: ingresos (caja + lotes), gastos y saldo; con mes y anio, solo de ese mes."""
+    if mes and anio:
+        ingresos_lotes = calcular_ganancias_lotes_rapido(mes=mes, anio=anio)
+    else:
+        ingresos_lotes = obtener_saldo_general().ingresos_lotes
+
+    ingresos_caja, total_gastos = totales_caja(mes, anio)
+    total_ingresos = ingresos_caja + ingresos_lotes
+    return {
+        'ingresos_lotes': ingresos_lotes,
+        'total_ingresos': total_ingresos,
+        'total_gastos': total_gastos,
+        'saldo_actual': total_ingresos - total_gastos,
+    }
+
+
+def obtener_totales(mes=None, anio=None):
+    """calcular_totales en caché por versión del libro y mes."""
+    version, _ = version_saldo_general()
+    clave = f'gestor:totales:{version}:{anio or ""}-{mes or ""}'
+    totales = cache.get(clave)
+    if totales is None:
+        totales = calcular_totales(mes, anio)
+        cache.set(clave, totales, timeout=TIMEOUT_TOTALES)
+    return totales
+
+
+MOVIMIENTOS_POR_PAGINA = 25
+
+# Orden dentro del mismo día: transacciones de caja, pagos de lotes, entradas automáticas
+ORIGEN_TRANSACCION = 2
+ORIGEN_PAGO = 1
+ORIGEN_CONTRATO = 0
+
+
+def totales_por_categoria(mes=None, anio=None):
+    """{'INGRESO': {categoria: total}, 'GASTO': {...}} con una consulta agrupada."""
+    transacciones = Transaccion.objects.all()
+    if mes and anio:
+        transacciones = transacciones.filter(fecha__year=int(anio), fecha__month=int(mes))
+
+    totales = {'INGRESO': {}, 'GASTO': {}}
+    sin_categoria = {'INGRESO': 'Otros Ingresos', 'GASTO': 'Sin Categoría'}
+    for fila in (
+        transacciones.order_by()
+        .values('tipo', 'categoria__nombre')
+        .annotate(total=Sum('valor'))
+        .order_by('-total')
+    ):
+        if fila['tipo'] not in totales:
+            continue
+        nombre = fila['categoria__nombre'] or sin_categoria[fila['tipo']]
+        por_tipo = totales[fila['tipo']]
+        por_tipo[nombre] = por_tipo.get(nombre, Decimal('0.00')) + fila['total']
+    return totales
+
+
+def _cursor_movimientos(cursor):
+    """'YYYY-MM-DD.origen.id' → (fecha, origen, id), o None si no es válido."""
+    try:
+        fecha, origen, pk = cursor.split('.')
+        return date.fromisoformat(fecha), int(origen), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _despues_del_cursor(campo_fecha, origen, cursor):
+    """Filas estrictamente posteriores al cursor en el orden (fecha, origen, id) descendente."""
+    fecha, origen_cursor, pk = cursor
+    dias_anteriores = Q(**{f'{campo_fecha}__lt': fecha})
+    if origen > origen_cursor:
+        # Este origen va antes que el del cursor en el mismo día: ese día ya se mostró
+        return dias_anteriores
+    mismo_dia = Q(**{campo_fecha: fecha})
+    if origen == origen_cursor:
+        mismo_dia &= Q(pk__lt=pk)
+    return dias_anteriores | mismo_dia
+
+
+def pagina_movimientos(mes=None, anio=None, incluir_lotes=True, cursor=None, por_pagina=MOVIMIENTOS_POR_PAGINA):
+    """
+    Una página del historial (transacciones de caja y, salvo incluir_lotes=False, pagos
+    de lotes y entradas sin pago registrado) ordenada por fecha descendente, con paginación por cursor:
+    una consulta UNION sobre (fecha, origen, id) que usa los índices por fecha, más una
+    consulta por origen para traer solo las filas de la página.
+    Devuelve (filas, cursor_siguiente).
+    """
+    from Aplicaciones.sbr_app.models import Pago, Contrato
+
+    cursor = _cursor_movimientos(cursor) if cursor else None
+
+    partes = [
+        (Transaccion.objects.all(), 'fecha', ORIGEN_TRANSACCION),
+    ]
+    if incluir_lotes:
+        partes += [
+            (Pago.objects.exclude(contrato__estado='DEVOLUCION'), 'fecha_pago', ORIGEN_PAGO),
+            (
+                Contrato.objects.filter(valor_entrada__gt=0)
+                .exclude(estado='DEVOLUCION')
+                .filter(~Exists(Pago.objects.filter(contrato=OuterRef('pk')))),
+                'fecha_contrato',
+                ORIGEN_CONTRATO,
+            ),
+        ]
+
+    consultas = []
+    for qs, campo_fecha, origen in partes:
+        if mes and anio:
+            qs = qs.filter(**{f'{campo_fecha}__year': int(anio), f'{campo_fecha}__month': int(mes)})
+        if cursor:
+            qs = qs.filter(_despues_del_cursor(campo_fecha, origen, cursor))
+        consultas.append(
+            qs.order_by()
+            .annotate(f=F(campo_fecha), origen=Value(origen, output_field=IntegerField()))
+            .values_list('f', 'origen', 'id')
+        )
+
+    union = consultas[0].union(*consultas[1:], all=True) if len(consultas) > 1 else consultas[0]
+    claves = list(union.order_by('-f', '-origen', '-id')[:por_pagina + 1])
+
+    siguiente = None
+    if len(claves) > por_pagina:
+        claves = claves[:por_pagina]
+        fecha, origen, pk = claves[-1]
+        siguiente = f"{fecha.isoformat()}.{origen}.{pk}"
+
+    ids = {ORIGEN_TRANSACCION: [], ORIGEN_PAGO: [], ORIGEN_CONTRATO: []}
+    for _, origen, pk in claves:
+        ids[origen].append(pk)
+
+    transacciones = Transaccion.objects.select_related('categoria', 'registrado_por').in_bulk(ids[ORIGEN_TRANSACCION]) if ids[ORIGEN_TRANSACCION] else {}
+    pagos = Pago.objects.select_related('contrato__cliente').in_bulk(ids[ORIGEN_PAGO]) if ids[ORIGEN_PAGO] else {}
+    contratos = Contrato.objects.select_related('cliente').in_bulk(ids[ORIGEN_CONTRATO]) if ids[ORIGEN_CONTRATO] else {}
+
+    filas = []
+    for _, origen, pk in claves:
+        if origen == ORIGEN_TRANSACCION:
+            m = transacciones[pk]
+            filas.append({
+                'id': m.id,
+                'is_lote': False,
+                'fecha': m.fecha,
+                'tipo': m.tipo,
+                'categoria_nombre': m.categoria.nombre if m.categoria else 'SN Categoría',
+                'valor': m.valor,
+                'descripcion': m.descripcion,
+                'numero_recibo': m.numero_recibo,
+                'foto_url': m.foto_recibo.url if m.foto_recibo else None,
+                'registrado_por': m.registrado_por,
+                'mov_obj': m
+            })
+        elif origen == ORIGEN_PAGO:
+            p = pagos[pk]
+            desc = f"Entrada Lote - Contrato #{p.contrato.id} ({p.contrato.cliente})" if p.es_entrada else f"Cuota Lote - Contrato #{p.contrato.id} ({p.contrato.cliente})"
+            if p.observacion: desc += f" | {p.observacion[:40]}"
+            filas.append({
+                'id': p.id,
+                'is_lote': True,
+                'fecha': p.fecha_pago,
+                'tipo': 'INGRESO',
+                'categoria_nombre': 'Venta de Lotes',
+                'valor': p.monto,
+                'descripcion': desc,
+                'numero_recibo': f"PGO-{p.id}",
+                'foto_url': p.comprobante_imagen.url if p.comprobante_imagen else None,
+                'contrato_id': p.contrato.id
+            })
+        else:
+            c = contratos[pk]
+            filas.append({
+                'id': c.id,
+                'is_lote': True,
+                'fecha': c.fecha_contrato,
+                'tipo': 'INGRESO',
+                'categoria_nombre': 'Venta de Lotes',
+                'valor': c.valor_entrada,
+                'descripcion': f"Entrada Automática - Contrato #{c.id} ({c.cliente})",
+                'numero_recibo': f"CTR-{c.id}",
+                'foto_url': None,
+                'contrato_id': c.id
+            })
+    return filas, siguiente
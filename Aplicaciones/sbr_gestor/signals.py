@@ -0,0 +1,70 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from Aplicaciones.sbr_app.models import Pago, Contrato, CierreMensual
+from .models import Transaccion
+from .services import aplicar_movimiento_caja, actualizar_ingresos_contrato, marcar_saldo_modificado
+
+# ==========================================
+# LIBRO DE SALDO GENERAL
+# ==========================================
+# Campos de Contrato que cambian los ingresos de lotes
+CAMPOS_CONTRATO_SALDO = {'estado', 'valor_entrada'}
+# Campos de Pago que cambian los ingresos de lotes
+CAMPOS_PAGO_SALDO = {'monto', 'es_entrada', 'contrato', 'contrato_id', 'fecha_pago'}
+
+@receiver(pre_save, sender=Transaccion)
+def recordar_transaccion_anterior(sender, instance, **kwargs):
+    instance._valores_anteriores = None
+    if instance.pk:
+        instance._valores_anteriores = (
+            Transaccion.objects.filter(pk=instance.pk).values_list('tipo', 'valor').first()
+        )
+
+@receiver(post_save, sender=Transaccion)
+def actualizar_saldo_transaccion(sender, instance, **kwargs):
+    anteriores = getattr(instance, '_valores_anteriores', None)
+    if anteriores:
+        aplicar_movimiento_caja(*anteriores, signo=-1)
+    aplicar_movimiento_caja(instance.tipo, instance.valor)
+
+@receiver(post_delete, sender=Transaccion)
+def descontar_saldo_transaccion(sender, instance, **kwargs):
+    aplicar_movimiento_caja(instance.tipo, instance.valor, signo=-1)
+
+@receiver(pre_save, sender=Pago)
+def recordar_contrato_anterior_pago(sender, instance, update_fields=None, **kwargs):
+    # Un pago movido a otro contrato cambia el aporte de los dos
+    instance._contrato_anterior_id = None
+    if instance.pk and (update_fields is None or {'contrato', 'contrato_id'} & set(update_fields)):
+        instance._contrato_anterior_id = (
+            Pago.objects.filter(pk=instance.pk).values_list('contrato_id', flat=True).first()
+        )
+
+@receiver(post_save, sender=Pago)
+def actualizar_saldo_pago(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not CAMPOS_PAGO_SALDO & set(update_fields):
+        return
+    anterior = getattr(instance, '_contrato_anterior_id', None)
+    if anterior and anterior != instance.contrato_id:
+        actualizar_ingresos_contrato(anterior)
+    actualizar_ingresos_contrato(instance.contrato_id)
+
+@receiver(post_delete, sender=Pago)
+def actualizar_saldo_pago_eliminado(sender, instance, **kwargs):
+    actualizar_ingresos_contrato(instance.contrato_id)
+
+@receiver(post_save, sender=Contrato)
+def actualizar_saldo_contrato(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not CAMPOS_CONTRATO_SALDO & set(update_fields):
+        return
+    actualizar_ingresos_contrato(instance.id)
+
+@receiver(post_delete, sender=Contrato)
+def actualizar_saldo_contrato_eliminado(sender, instance, **kwargs):
+    actualizar_ingresos_contrato(instance.id)
+
+@receiver(post_save, sender=CierreMensual)
+@receiver(post_delete, sender=CierreMensual)
+def actualizar_version_cierre(sender, instance, **kwargs):
+    # Los totales de un mes cerrado salen del cierre (ver calcular_ganancias_lotes_rapido)
+    marcar_saldo_modificado()
@@ -0,0 +1,220 @@
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase
+
+from Aplicaciones.sbr_app.models import Contrato, Pago
+from Aplicaciones.sbr_app.services import generar_tabla_amortizacion, registrar_pago_cliente
+from Aplicaciones.sbr_app.tests import crear_vendedor, crear_contrato
+from .models import Transaccion
+from .services import (
+    calcular_ganancias_lotes_rapido, obtener_saldo_general, reconstruir_saldo_general, pagina_movimientos,
+)
+
+
+# ==========================================
+# INGRESOS DE LOTES (AGREGADOS SQL vs CÁLCULO POR CONTRATO)
+# ==========================================
+def ganancias_lotes_por_contrato():
+    """
+    Cálculo original del total histórico, contrato por contrato (antes de las
+    consultas agregadas). Se conserva aquí como referencia de los resultados.
+    """
+    total = Decimal('0.00')
+    for contrato in Contrato.objects.prefetch_related('pago_set').all():
+        ids_entradas = set(contrato.pago_set.filter(es_entrada=True).values_list('id', flat=True))
+        if contrato.valor_entrada > 0 and not ids_entradas:
+            primer_pago = contrato.pago_set.order_by('id').first()
+            if primer_pago:
+                ids_entradas.add(primer_pago.id)
+
+        contrato_total = contrato.valor_entrada or Decimal('0.00')
+        for pago in contrato.pago_set.exclude(id__in=ids_entradas):
+            contrato_total += pago.monto
+
+        if contrato.estado == 'DEVOLUCION':
+            total -= contrato_total
+        else:
+            total += contrato_total
+    return total
+
+
+class GananciasLotesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor = crear_vendedor()
+        inicio = '2025-02-10'
+
+        def pagar(contrato, fecha, monto):
+            registrar_pago_cliente(contrato.id, Decimal(monto), 'EFECTIVO', None, cls.vendedor, fecha_pago=fecha)
+
+        def pago_sin_detalles(contrato, fecha, monto, es_entrada=False):
+            Pago.objects.create(contrato=contrato, fecha_pago=fecha, monto=Decimal(monto),
+                                metodo_pago='EFECTIVO', es_entrada=es_entrada)
+
+        # Entrada marcada, cuotas completas y un pago parcial
+        normal = crear_contrato(cls.vendedor, 1, fecha_contrato=date(2025, 1, 10))
+        generar_tabla_amortizacion(normal.id, inicio)
+        pago_sin_detalles(normal, date(2025, 1, 10), '200.00', es_entrada=True)
+        pagar(normal, date(2025, 2, 10), '166.67')
+        pagar(normal, date(2025, 3, 15), '75.50')
+
+        # Entrada legacy: el primer pago (sin marca) es la entrada
+        legacy = crear_contrato(cls.vendedor, 2, entrada=Decimal('300.00'), fecha_contrato=date(2025, 1, 5))
+        generar_tabla_amortizacion(legacy.id, inicio)
+        pago_sin_detalles(legacy, date(2025, 1, 5), '280.00')
+        pago_sin_detalles(legacy, date(2025, 2, 20), '150.00')
+
+        # Entrada en el contrato pero todavía sin pagos
+        crear_contrato(cls.vendedor, 3, entrada=Decimal('150.00'), fecha_contrato=date(2025, 3, 1))
+
+        # Cancelado: suma igual que los activos
+        cancelado = crear_contrato(cls.vendedor, 4, entrada=Decimal('0.00'), fecha_contrato=date(2025, 2, 1))
+        generar_tabla_amortizacion(cancelado.id, inicio)
+        pagar(cancelado, date(2025, 3, 3), '80.00')
+        Contrato.objects.filter(pk=cancelado.id).update(estado='CANCELADO')
+
+        # Devolución con entrada legacy: resta todo lo cobrado
+        devolucion = crear_contrato(cls.vendedor, 5, entrada=Decimal('100.00'), fecha_contrato=date(2025, 1, 15))
+        generar_tabla_amortizacion(devolucion.id, inicio)
+        pago_sin_detalles(devolucion, date(2025, 1, 15), '100.00')
+        pagar(devolucion, date(2025, 2, 10), '300.00')
+        Contrato.objects.filter(pk=devolucion.id).update(estado='DEVOLUCION')
+
+    def test_total_historico_igual_al_calculo_por_contrato(self):
+        esperado = ganancias_lotes_por_contrato()
+        self.assertNotEqual(esperado, Decimal('0.00'))
+        self.assertEqual(calcular_ganancias_lotes_rapido(), esperado)
+
+    def test_total_mensual_excluye_devoluciones(self):
+        # Marzo 2025: pago parcial del contrato normal + pago del cancelado
+        self.assertEqual(calcular_ganancias_lotes_rapido(mes=3, anio=2025), Decimal('155.50'))
+
+
+# ==========================================
+# LIBRO DE SALDO GENERAL: SEÑALES DE PAGO
+# ==========================================
+class SaldoPagoSignalsTests(TestCase):
+    def setUp(self):
+        contrato = crear_contrato(crear_vendedor(), 1, entrada=Decimal('0.00'), fecha_contrato=date(2025, 1, 10))
+        self.pago = Pago.objects.create(contrato=contrato, fecha_pago=date(2025, 2, 10), monto=Decimal('100.00'),
+                                        metodo_pago='EFECTIVO')
+
+    def version(self):
+        return obtener_saldo_general().version
+
+    def test_guardar_campos_sin_efecto_no_recalcula(self):
+        version = self.version()
+        self.pago.observacion = 'Recibo reimpreso'
+        self.pago.save(update_fields=['observacion'])
+        self.assertEqual(self.version(), version)
+
+    def test_cambiar_monto_actualiza_el_libro(self):
+        self.pago.monto = Decimal('150.00')
+        self.pago.save(update_fields=['monto'])
+        self.assertEqual(obtener_saldo_general().ingresos_lotes, Decimal('150.00'))
+
+        self.pago.delete()
+        self.assertEqual(obtener_saldo_general().ingresos_lotes, Decimal('0.00'))
+
+    def test_cambiar_fecha_sube_la_version(self):
+        # El total histórico no cambia, pero sí los totales por mes en caché
+        version = self.version()
+        self.pago.fecha_pago = date(2025, 3, 10)
+        self.pago.save(update_fields=['fecha_pago'])
+        self.assertGreater(self.version(), version)
+
+
+class SaldoContratoSignalsTests(TestCase):
+    """Diferencias por contrato: el libro tiene que cuadrar con el cálculo completo."""
+
+    def setUp(self):
+        vendedor = crear_vendedor()
+        # Entrada legacy: el primer pago (sin marca) es la entrada
+        self.legacy = crear_contrato(vendedor, 1, entrada=Decimal('300.00'), fecha_contrato=date(2025, 1, 5))
+        self.primer_pago = Pago.objects.create(contrato=self.legacy, fecha_pago=date(2025, 1, 5),
+                                               monto=Decimal('280.00'), metodo_pago='EFECTIVO')
+        Pago.objects.create(contrato=self.legacy, fecha_pago=date(2025, 2, 20), monto=Decimal('150.00'),
+                            metodo_pago='EFECTIVO')
+        self.otro = crear_contrato(vendedor, 2, entrada=Decimal('100.00'), fecha_contrato=date(2025, 1, 10))
+        Pago.objects.create(contrato=self.otro, fecha_pago=date(2025, 2, 10), monto=Decimal('50.00'),
+                            metodo_pago='EFECTIVO')
+        obtener_saldo_general()
+
+    def assertLibroCuadra(self, esperado):
+        self.assertEqual(calcular_ganancias_lotes_rapido(), esperado)
+        libro = obtener_saldo_general()
+        self.assertEqual(libro.ingresos_lotes, esperado)
+        self.assertEqual(libro.saldo, esperado)
+
+    def test_borrar_primer_pago_legacy(self):
+        self.assertLibroCuadra(Decimal('550.00'))
+        # El siguiente pago pasa a ser la entrada
+        self.primer_pago.delete()
+        self.assertLibroCuadra(Decimal('400.00'))
+
+    def test_borrado_por_lote_y_en_cascada(self):
+        Pago.objects.filter(contrato=self.legacy).delete()
+        self.assertLibroCuadra(Decimal('400.00'))
+
+        # Borrar el contrato borra sus pagos en cascada
+        self.otro.delete()
+        self.assertLibroCuadra(Decimal('300.00'))
+
+    def test_devolucion_resta_el_contrato(self):
+        self.legacy.estado = 'DEVOLUCION'
+        self.legacy.save(update_fields=['estado'])
+        self.assertLibroCuadra(Decimal('-350.00'))
+
+        self.legacy.estado = 'ACTIVO'
+        self.legacy.save(update_fields=['estado'])
+        self.assertLibroCuadra(Decimal('550.00'))
+
+    def test_mover_pago_a_otro_contrato(self):
+        pago = Pago.objects.filter(contrato=self.otro).get()
+        pago.contrato = self.legacy
+        pago.save()
+        self.assertLibroCuadra(Decimal('600.00'))
+
+    def test_reconstruir_igual_que_las_diferencias(self):
+        self.primer_pago.delete()
+        antes = obtener_saldo_general().ingresos_lotes
+        self.assertEqual(reconstruir_saldo_general().ingresos_lotes, antes)
+
+
+# ==========================================
+# HISTORIAL DEL DASHBOARD (CURSOR)
+# ==========================================
+class PaginaMovimientosTests(TestCase):
+    def setUp(self):
+        vendedor = crear_vendedor()
+        dia = date(2025, 2, 10)
+        con_pago = crear_contrato(vendedor, 1, entrada=Decimal('0.00'), fecha_contrato=date(2025, 1, 10))
+        self.pago = Pago.objects.create(contrato=con_pago, fecha_pago=dia, monto=Decimal('100.00'),
+                                        metodo_pago='EFECTIVO')
+        # Entrada sin pago registrado: aparece como movimiento del contrato
+        self.sin_pago = crear_contrato(vendedor, 2, entrada=Decimal('150.00'), fecha_contrato=dia)
+        self.transaccion = Transaccion.objects.create(tipo='INGRESO', valor=Decimal('50.00'), fecha=dia)
+
+    def claves(self, filas):
+        return [(fila['is_lote'], fila['id']) for fila in filas]
+
+    def test_por_defecto_incluye_movimientos_de_lotes(self):
+        filas, siguiente = pagina_movimientos()
+        self.assertIsNone(siguiente)
+        self.assertEqual(self.claves(filas), [
+            (False, self.transaccion.id), (True, self.pago.id), (True, self.sin_pago.id),
+        ])
+
+    def test_sin_lotes_solo_caja(self):
+        filas, _ = pagina_movimientos(incluir_lotes=False)
+        self.assertEqual(self.claves(filas), [(False, self.transaccion.id)])
+
+    def test_cursor_recorre_los_origenes_del_mismo_dia(self):
+        vistos, cursor = [], None
+        while True:
+            filas, cursor = pagina_movimientos(cursor=cursor, por_pagina=1)
+            vistos += self.claves(filas)
+            if not cursor:
+                break
+        self.assertEqual(vistos, self.claves(pagina_movimientos()[0]))
@@ -121,6 +121,30 @@ DATABASES = {
 }
 
 
+# Cache
+# Por defecto en memoria de cada proceso (desarrollo). Con varios procesos definir
+# CACHE_LOCATION: caché en disco compartida, así las invalidaciones de reportes
+# hechas por las señales llegan a todos los workers.
+
+CACHE_OPTIONS = {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '5000'))}
+
+if os.getenv('CACHE_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION'),
+            'OPTIONS': CACHE_OPTIONS,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': CACHE_OPTIONS,
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 